@@ -0,0 +1,90 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from visa.entity.config_entity import AppConfig, ModelRegistryConfig
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.serving_utils import InvalidRecordError, MicroBatcher, init_serving_worker, predict_batch
+
+
+class VisaApplication(BaseModel):
+    continent: str
+    education_of_employee: str
+    has_job_experience: str
+    requires_job_training: str
+    no_of_employees: int
+    yr_of_estab: int
+    region_of_employment: str
+    prevailing_wage: float
+    unit_of_wage: str
+    full_time_position: str
+
+
+class VisaPrediction(BaseModel):
+    prediction: str
+    probability: float
+    model_version: str
+
+
+def create_app(app_config: AppConfig = AppConfig(),
+               model_registry_config: ModelRegistryConfig = ModelRegistryConfig()) -> FastAPI:
+    """
+    Creates the prediction service. Every request to /predict is one visa application; with micro_batching the
+    concurrent requests are pooled by a MicroBatcher and scored with the champion model of the registry in batches,
+    otherwise each request is scored on its own. Scoring runs in a thread or process executor, never on the event loop.
+    A record that can not be scored because of its values, such as an unknown category, is answered with 422.
+    The model registry is opened when the service starts, not when the app is created, so the module can be imported
+    without side effects; serve it with `uvicorn app:create_app --factory`.
+    """
+    try:
+        if app_config.executor == "process":
+            executor = ProcessPoolExecutor(max_workers=app_config.n_executor_workers, initializer=init_serving_worker,
+                                           initargs=(model_registry_config,))
+        elif app_config.executor == "thread":
+            executor = ThreadPoolExecutor(max_workers=app_config.n_executor_workers, thread_name_prefix="predictor")
+        else:
+            raise ValueError(f"App executor: {app_config.executor} is not one of thread, process")
+        batcher = MicroBatcher(partial(predict_batch, decision_threshold=app_config.decision_threshold), executor,
+                               max_batch_size=app_config.max_batch_size if app_config.micro_batching else 1,
+                               max_wait=app_config.max_wait_ms / 1000 if app_config.micro_batching else 0.0,
+                               n_flushers=app_config.n_executor_workers)
+
+        @asynccontextmanager
+        async def lifespan(app: FastAPI):
+            if app_config.executor == "thread":
+                init_serving_worker(model_registry_config)
+            batcher.start()
+            logging.info(f"Prediction service started with config: {app_config}")
+            yield
+            await batcher.stop()
+            executor.shutdown(cancel_futures=True)
+
+        app = FastAPI(title="US Visa Approval Prediction", lifespan=lifespan)
+
+        @app.post("/predict", response_model=VisaPrediction)
+        async def predict(application: VisaApplication) -> VisaPrediction:
+            try:
+                model_version, (prediction, probability) = await batcher.predict(application.dict())
+            except InvalidRecordError as e:
+                raise HTTPException(status_code=422, detail=str(e)) from e
+            except USVisaException as e:
+                raise HTTPException(status_code=500, detail=str(e)) from e
+            return VisaPrediction(prediction=prediction, probability=probability, model_version=model_version)
+
+        @app.get("/health")
+        async def health() -> dict:
+            return {"status": "ok", "micro_batching": app_config.micro_batching, **batcher.stats}
+
+        return app
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+if __name__ == "__main__":
+    uvicorn.run("app:create_app", factory=True, host=AppConfig.host, port=AppConfig.port)
@@ -0,0 +1,68 @@
+"""
+Time of DataValidation.detect_dataset_drift with the native engine against the evidently engine.
+
+Compares a synthetic reference frame of --rows visa applications with a current frame drawn from the same
+distribution, and with a current frame whose numerical columns are scaled by --shift and whose categorical columns
+are skewed to one category, so one comparison should not drift and one should. Both engines are checked to reach the
+same dataset_drift decision. The drift reports are written to a temporary directory.
+
+    python -m benchmarks.drift_engine --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic_data import make_visa_dataframe
+from visa.components.data_validation import DataValidation
+from visa.entity.config_entity import DataValidationConfig
+
+
+def shift_frame(dataframe: pd.DataFrame, shift: float) -> pd.DataFrame:
+    """
+    Scales the numerical columns by shift and moves a third of the rows of every categorical column with a domain to
+    its first category.
+    """
+    for column in ("no_of_employees", "yr_of_estab", "prevailing_wage"):
+        dataframe[column] = (dataframe[column].astype("float64") * shift).round()
+    n_moved = len(dataframe) // 3
+    for column in dataframe.columns:
+        if isinstance(dataframe[column].dtype, pd.CategoricalDtype) and column != "case_id":
+            codes = dataframe[column].cat.codes.to_numpy().copy()
+            codes[:n_moved] = 0
+            dataframe[column] = pd.Categorical.from_codes(codes, dtype=dataframe[column].dtype)
+    return dataframe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--shift", type=float, default=1.5, help="scale of the drifted numerical columns")
+    parser.add_argument("--engines", default="native,evidently", help="comma separated drift engines")
+    args = parser.parse_args()
+
+    reference_df = make_visa_dataframe(args.rows, seed=0)
+    current_dfs = {"same": make_visa_dataframe(args.rows, seed=1),
+                   "shifted": shift_frame(make_visa_dataframe(args.rows, seed=1), args.shift)}
+    print(f"{args.rows} rows per frame")
+    print(f"{'engine':>10} {'current':>8} {'seconds':>8} {'dataset drift':>14}")
+    decisions = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for engine in args.engines.split(","):
+            data_validation_config = DataValidationConfig(drift_engine=engine)
+            data_validation_config.drift_report_file_path = os.path.join(temp_dir, engine, "report.yaml")
+            data_validation = DataValidation(data_validation_config=data_validation_config, data_ingestion_artifact=None)
+            for name, current_df in current_dfs.items():
+                start_time = time.perf_counter()
+                decisions[engine, name] = bool(data_validation.detect_dataset_drift(reference_df, current_df))
+                print(f"{engine:>10} {name:>8} {time.perf_counter() - start_time:>8.2f} {decisions[engine, name]!s:>14}")
+
+    for name in current_dfs:
+        engine_decisions = {engine: decision for (engine, current), decision in decisions.items() if current == name}
+        assert len(set(engine_decisions.values())) == 1, f"the engines disagree on the {name} frame: {engine_decisions}"
+
+
+if __name__ == "__main__":
+    main()
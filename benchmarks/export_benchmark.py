@@ -0,0 +1,57 @@
+"""
+Export time of a MongoDB collection over one cursor against the partitioned export with several worker counts.
+
+Connects with MongoDBClient, so MONGODB_URL must point to the server holding the collection. The single cursor path
+is iter_collection_chunks, the path of DataIngestion with export_workers 1, and the partitioned path is
+iter_collection_partitions. Every export is checked to return the same rows as the single cursor.
+
+    python -m benchmarks.export_benchmark --collection visa_data --workers 2,4,8 --partition-size 5000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from visa.constants import DATA_INGESTION_BATCH_SIZE, DATA_INGESTION_COLLECTION_NAME
+from visa.data_access.visa_data import VisaData, concat_chunks
+
+
+def time_export(chunks) -> tuple:
+    start_time = time.perf_counter()
+    chunks = list(chunks)
+    dataframe = concat_chunks(chunks) if chunks else pd.DataFrame()
+    return time.perf_counter() - start_time, dataframe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=DATA_INGESTION_COLLECTION_NAME)
+    parser.add_argument("--workers", default="2,4,8", help="comma separated worker counts")
+    parser.add_argument("--partition-size", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=DATA_INGESTION_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    visa_data = VisaData()
+    results = []
+    expected = None
+    for _ in range(args.repeat):
+        seconds, expected = time_export(visa_data.iter_collection_chunks(args.collection, batch_size=args.batch_size))
+        results.append(("single cursor", 1, seconds))
+    for n_workers in map(int, args.workers.split(",")):
+        for _ in range(args.repeat):
+            seconds, dataframe = time_export(visa_data.iter_collection_partitions(
+                args.collection, n_workers=n_workers, partition_size=args.partition_size, batch_size=args.batch_size))
+            pd.testing.assert_frame_equal(dataframe, expected, check_categorical=False)
+            results.append(("partitioned", n_workers, seconds))
+
+    baseline = min(seconds for path, _, seconds in results if path == "single cursor")
+    print(f"{len(expected)} documents, partitions of {args.partition_size}, best of {args.repeat}")
+    print(f"{'path':>14} {'workers':>8} {'seconds':>8} {'speedup':>8}")
+    for path, n_workers in dict.fromkeys((path, n_workers) for path, n_workers, _ in results):
+        seconds = min(s for p, w, s in results if (p, w) == (path, n_workers))
+        print(f"{path:>14} {n_workers:>8} {seconds:>8.2f} {baseline / seconds:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Write time, read time and file size of the artifact file formats csv, parquet and feather.
+
+Writes a synthetic frame of --rows visa applications with write_dataframe and reads it back with read_dataframe and
+the schema config, as data ingestion and the later stages do, once for every file_format. Every timing is the median
+of --repeat calls, and every read is checked to return the written frame.
+
+    python -m benchmarks.file_format --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import make_visa_dataframe
+from visa.constants import SCHEMA_FILE_PATH
+from visa.utils.main_utils import read_dataframe, read_yaml_file, write_dataframe
+
+
+def get_median_seconds(func, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings)), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--formats", default="csv,parquet,feather", help="comma separated file formats")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+    dataframe = make_visa_dataframe(args.rows)
+    print(f"{args.rows} rows, {dataframe.memory_usage(deep=True).sum() / 1024 ** 2:.0f} MB in memory, "
+          f"median of {args.repeat}")
+    print(f"{'format':>8} {'write s':>8} {'read s':>8} {'size MB':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for file_format in args.formats.split(","):
+            file_path = os.path.join(temp_dir, f"visa_data.{file_format}")
+            write_seconds, _ = get_median_seconds(lambda: write_dataframe(dataframe, file_path), args.repeat)
+            read_seconds, read_back = get_median_seconds(lambda: read_dataframe(file_path, schema_config=schema_config),
+                                                         args.repeat)
+            pd.testing.assert_frame_equal(read_back, dataframe, check_dtype=False, check_categorical=False)
+            print(f"{file_format:>8} {write_seconds:>8.2f} {read_seconds:>8.2f} "
+                  f"{os.path.getsize(file_path) / 1024 ** 2:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
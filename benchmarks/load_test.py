@@ -0,0 +1,137 @@
+"""
+Load test of the prediction service with micro-batching off and on.
+
+For every mode a uvicorn server is started in a subprocess with create_app(AppConfig(micro_batching=...)) and the
+champion of the model registry, and a closed-loop client keeps `concurrency` keep-alive connections busy with
+POST /predict requests for `seconds` seconds per level. The requests and per-second rate are counted on the client,
+so run it on an idle machine and read the numbers relative to each other.
+
+    python -m benchmarks.load_test --data artifacts/<timestamp>/data_ingestion/ingested/test.parquet
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+from visa.constants import TARGET_COLUMN
+from visa.utils.main_utils import read_dataframe
+
+
+def run_server(micro_batching: bool, executor: str, max_wait_ms: float, host: str, port: int) -> None:
+    import uvicorn
+
+    from app import create_app
+    from visa.entity.config_entity import AppConfig
+
+    app_config = AppConfig(micro_batching=micro_batching, executor=executor, max_wait_ms=max_wait_ms)
+    uvicorn.run(create_app(app_config), host=host, port=port, log_level="warning")
+
+
+def get_requests(data_file_path: str, n_records: int, host: str) -> list:
+    """
+    Returns raw HTTP/1.1 POST /predict requests of the first n_records records of a data file.
+    """
+    dataframe = read_dataframe(data_file_path).head(n_records)
+    dataframe = dataframe.drop(columns=[column for column in ("case_id", TARGET_COLUMN) if column in dataframe.columns])
+    requests = []
+    for record in dataframe.to_dict("records"):
+        body = json.dumps({column: value.item() if hasattr(value, "item") else value
+                           for column, value in record.items()}).encode()
+        requests.append(f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                        f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    return requests
+
+
+async def call(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: bytes) -> bool:
+    writer.write(request)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    content_length = next(int(line.split(b":")[1]) for line in head.split(b"\r\n")
+                          if line.lower().startswith(b"content-length"))
+    await reader.readexactly(content_length)
+    return head.startswith(b"HTTP/1.1 200")
+
+
+async def wait_for_server(host: str, port: int, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f"GET /health HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            await writer.drain()
+            await reader.readuntil(b"\r\n\r\n")
+            writer.close()
+            return
+        except (OSError, asyncio.IncompleteReadError):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"The server at {host}:{port} did not start in {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+async def run_level(requests: list, concurrency: int, seconds: float, host: str, port: int) -> dict:
+    """
+    Keeps concurrency connections busy for seconds seconds and returns the requests per second and the latency
+    percentiles in milliseconds.
+    """
+    latencies, errors = [], 0
+    end_time = time.perf_counter() + seconds
+
+    async def worker(index: int) -> None:
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        await call(reader, writer, requests[index % len(requests)])
+        position = index
+        while time.perf_counter() < end_time:
+            start_time = time.perf_counter()
+            ok = await call(reader, writer, requests[position % len(requests)])
+            latencies.append(time.perf_counter() - start_time)
+            errors += not ok
+            position += concurrency
+        writer.close()
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[worker(index) for index in range(concurrency)])
+    elapsed = time.perf_counter() - start_time
+    latencies = np.array(latencies) * 1000
+    return {"requests": len(latencies), "rps": len(latencies) / elapsed, "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)), "errors": errors}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="csv, parquet or feather file of raw visa applications")
+    parser.add_argument("--concurrency", default="1,16,64", help="comma separated numbers of concurrent connections")
+    parser.add_argument("--seconds", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--executor", default="thread", choices=("thread", "process"))
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--n-records", type=int, default=2000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    requests = get_requests(args.data, args.n_records, args.host)
+    results = {}
+    for micro_batching in (False, True):
+        server = multiprocessing.Process(target=run_server, args=(micro_batching, args.executor, args.max_wait_ms,
+                                                                  args.host, args.port))
+        server.start()
+        try:
+            asyncio.run(wait_for_server(args.host, args.port))
+            for concurrency in map(int, args.concurrency.split(",")):
+                results[micro_batching, concurrency] = asyncio.run(
+                    run_level(requests, concurrency, args.seconds, args.host, args.port))
+        finally:
+            server.terminate()
+            server.join()
+
+    print(f"{'concurrency':>11} {'micro_batching':>14} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for (micro_batching, concurrency), result in sorted(results.items(), key=lambda item: (item[0][1], item[0][0])):
+        print(f"{concurrency:>11} {'on' if micro_batching else 'off':>14} {result['rps']:>8.0f} "
+              f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
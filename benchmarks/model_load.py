@@ -0,0 +1,95 @@
+"""
+Cold-start load time and memory of a VisaModel saved with dill (save_object) against its model package.
+
+Every measurement runs in a fresh Python process that imports the libraries, reads the data, then loads the model,
+scores one record and scores all records. It reports the load time, the load time plus the first prediction, the
+growth of the resident set from before the load to after the full scoring, and the unique set size (USS) at the
+end. The package is loaded with lazy=True, so its load time covers the manifest and the memory mapped arrays, and
+the learner is loaded by the first prediction. The predictions of both paths are compared. Reads /proc, so Linux only.
+
+    python -m benchmarks.model_load --model artifacts/<timestamp>/model_trainer/trained_model/model.pkl \
+        --package artifacts/<timestamp>/model_trainer/trained_model/model_package \
+        --data artifacts/<timestamp>/data_ingestion/ingested/test.parquet
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def get_memory_mb() -> dict:
+    """
+    Returns the resident set size and the unique set size, the private pages, of this process in MB.
+    """
+    memory = {}
+    with open("/proc/self/smaps_rollup") as file_obj:
+        for line in file_obj:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Private_Clean", "Private_Dirty"):
+                memory[key] = int(value.split()[0]) / 1024
+    return {"rss": memory["Rss"], "uss": memory["Private_Clean"] + memory["Private_Dirty"]}
+
+
+def measure(mode: str, model_path: str, data_path: str, predictions_path: str) -> dict:
+    """
+    Loads the model in this process with the dill or package path and returns the timings and memory.
+    """
+    from visa.constants import TARGET_COLUMN
+    from visa.utils.main_utils import load_object, read_dataframe
+    from visa.utils.model_package import load_model_package
+
+    dataframe = read_dataframe(data_path)
+    dataframe = dataframe.drop(columns=[column for column in (TARGET_COLUMN,) if column in dataframe.columns])
+    rss_before = get_memory_mb()["rss"]
+    start_time = time.perf_counter()
+    model = load_object(model_path) if mode == "dill" else load_model_package(model_path, lazy=True)
+    load_seconds = time.perf_counter() - start_time
+    model.predict_proba(dataframe.iloc[:1])
+    first_prediction_seconds = time.perf_counter() - start_time
+    np.save(predictions_path, model.predict_proba(dataframe))
+    memory = get_memory_mb()
+    return {"load_ms": load_seconds * 1000, "first_prediction_ms": first_prediction_seconds * 1000,
+            "rss_delta_mb": memory["rss"] - rss_before, "uss_mb": memory["uss"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="dill file of the VisaModel")
+    parser.add_argument("--package", required=True, help="model package directory of the same VisaModel")
+    parser.add_argument("--data", required=True, help="csv, parquet or feather file of raw visa applications")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=("dill", "package"), help=argparse.SUPPRESS)
+    parser.add_argument("--predictions", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.model if args.child == "dill" else args.package, args.data,
+                                 args.predictions)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for mode in ("dill", "package"):
+            predictions_path = os.path.join(temp_dir, f"{mode}.npy")
+            runs = [json.loads(subprocess.run(
+                [sys.executable, "-m", "benchmarks.model_load", "--model", args.model, "--package", args.package,
+                 "--data", args.data, "--child", mode, "--predictions", predictions_path],
+                check=True, capture_output=True, text=True).stdout.strip().splitlines()[-1]) for _ in range(args.repeat)]
+            results[mode] = {key: float(np.median([run[key] for run in runs])) for key in runs[0]}
+        max_abs_diff = float(np.abs(np.load(os.path.join(temp_dir, "dill.npy")) -
+                                    np.load(os.path.join(temp_dir, "package.npy"))).max())
+
+    print(f"median of {args.repeat} fresh processes, max abs difference of the predictions: {max_abs_diff:.2g}")
+    print(f"{'path':>8} {'load ms':>8} {'load + first prediction ms':>27} {'RSS delta MB':>13} {'USS MB':>7}")
+    for mode, result in results.items():
+        print(f"{mode:>8} {result['load_ms']:>8.0f} {result['first_prediction_ms']:>27.0f} "
+              f"{result['rss_delta_mb']:>13.0f} {result['uss_mb']:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
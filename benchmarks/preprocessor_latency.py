@@ -0,0 +1,58 @@
+"""
+Latency of the fitted preprocessor against its CompiledPreprocessor at batch sizes 1, 32 and 1024.
+
+The sklearn Pipeline transforms a DataFrame, with the ColumnTransformer set to n_jobs=1 as it is used for scoring.
+The compiled preprocessor transforms the same rows as record dicts, as the prediction service passes them, and as
+a DataFrame. Every timing is the median of --repeat calls.
+
+    python -m benchmarks.preprocessor_latency --preprocessor artifacts/<timestamp>/data_transformation/transformed_object/preprocessor.pkl \
+        --data artifacts/<timestamp>/data_ingestion/ingested/test.parquet
+"""
+import argparse
+import time
+
+import numpy as np
+
+from visa.entity.estimator import CompiledPreprocessor
+from visa.utils.main_utils import load_object, read_dataframe
+
+
+def get_median_seconds(func, records, repeat: int) -> float:
+    func(records)
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func(records)
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preprocessor", required=True, help="dill file of the fitted preprocessor")
+    parser.add_argument("--data", required=True, help="csv, parquet or feather file of raw visa applications")
+    parser.add_argument("--batch-sizes", default="1,32,1024", help="comma separated batch sizes")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    preprocessor = load_object(args.preprocessor)
+    preprocessor.named_steps["ColumnTransformer"].set_params(n_jobs=1)
+    compiled_preprocessor = CompiledPreprocessor(preprocessor)
+    dataframe = read_dataframe(args.data)
+
+    print(f"{'batch':>6} {'sklearn':>12} {'compiled dicts':>15} {'compiled frame':>15} {'max abs diff':>13}")
+    for batch_size in map(int, args.batch_sizes.split(",")):
+        batch = dataframe.iloc[:batch_size]
+        records = batch.to_dict("records")
+        if batch_size == 1:
+            records = records[0]
+        max_abs_diff = float(np.abs(compiled_preprocessor.transform(records) - preprocessor.transform(batch)).max())
+        sklearn_seconds = get_median_seconds(preprocessor.transform, batch, args.repeat)
+        dicts_seconds = get_median_seconds(compiled_preprocessor.transform, records, args.repeat)
+        frame_seconds = get_median_seconds(compiled_preprocessor.transform, batch, args.repeat)
+        print(f"{batch_size:>6} {sklearn_seconds * 1e6:>9.0f} us {dicts_seconds * 1e6:>12.0f} us "
+              f"{frame_seconds * 1e6:>12.0f} us {max_abs_diff:>13.2g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Time of the resampling strategies against the number of rows and the n_jobs of the neighbour searches.
+
+Transforms synthetic visa applications with a preprocessor fitted on them, as data transformation does, with about
+one third of the rows in the minority class. For every row count and n_jobs it prints the estimate of
+estimate_resampling_seconds, which the resampling time budget is checked against, and the time of resample itself.
+Resampling runs whose estimate exceeds --max-seconds are skipped and only estimated.
+
+    python -m benchmarks.resampling_scaling --rows 25000,100000,1000000,5000000 --n-jobs 1,2,4
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_data import make_visa_dataframe
+from visa.components.data_transformation import DataTransformation
+from visa.constants import DATA_TRANSFORMATION_RESAMPLING_PILOT_ROWS
+from visa.entity.config_entity import DataTransformationConfig
+from visa.utils.resampling_utils import estimate_resampling_seconds, resample
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="25000,100000,1000000,5000000", help="comma separated row counts")
+    parser.add_argument("--n-jobs", default="1,2,4", help="comma separated n_jobs of the neighbour searches")
+    parser.add_argument("--strategy", default="smoteenn")
+    parser.add_argument("--nn-algorithm", default="kd_tree")
+    parser.add_argument("--pilot-rows", type=int, default=DATA_TRANSFORMATION_RESAMPLING_PILOT_ROWS)
+    parser.add_argument("--max-seconds", type=float, default=600, help="estimate above which resampling is skipped")
+    args = parser.parse_args()
+
+    row_counts = list(map(int, args.rows.split(",")))
+    dataframe = make_visa_dataframe(max(row_counts))
+    preprocessor = DataTransformation(data_ingestion_artifact=None, data_validation_artifact=None,
+                                      data_transformation_config=DataTransformationConfig(preprocessor_n_jobs=1)
+                                      ).get_data_transformer_object().fit(dataframe.iloc[:100000])
+    features = np.asarray(preprocessor.transform(dataframe), dtype=np.float32)
+    target = (np.random.default_rng(0).random(len(features)) < 1 / 3).astype(np.int8)
+    del dataframe
+    print(f"{args.strategy} with {args.nn_algorithm} on {features.shape[1]} features")
+    print(f"{'rows':>9} {'n_jobs':>7} {'estimated s':>12} {'seconds':>9} {'rows after':>11}")
+    for n_rows in row_counts:
+        for n_jobs in map(int, args.n_jobs.split(",")):
+            estimated_seconds = estimate_resampling_seconds(args.strategy, features[:n_rows], target[:n_rows],
+                                                            pilot_rows=args.pilot_rows, n_jobs=n_jobs,
+                                                            nn_algorithm=args.nn_algorithm)
+            if estimated_seconds > args.max_seconds:
+                print(f"{n_rows:>9} {n_jobs:>7} {estimated_seconds:>12.1f} {'skipped':>9} {'':>11}")
+                continue
+            start_time = time.perf_counter()
+            _, resampled_target, _ = resample(args.strategy, features[:n_rows], target[:n_rows], n_jobs=n_jobs,
+                                              nn_algorithm=args.nn_algorithm)
+            print(f"{n_rows:>9} {n_jobs:>7} {estimated_seconds:>12.1f} {time.perf_counter() - start_time:>9.1f} "
+                  f"{len(resampled_target):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Synthetic visa applications of any size for the benchmarks, with the columns and category domains of
+config/schema.yaml. Categorical columns are built from category codes, so millions of rows are generated without
+materialising the labels as Python strings.
+"""
+import numpy as np
+import pandas as pd
+
+from visa.constants import SCHEMA_FILE_PATH
+from visa.utils.main_utils import apply_schema_dtypes, read_yaml_file
+
+
+def make_visa_dataframe(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Returns n_rows random visa applications compacted to the schema dtypes.
+    """
+    rng = np.random.default_rng(seed)
+    schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+    dataframe = pd.DataFrame({column: pd.Categorical.from_codes(rng.integers(0, len(categories), size=n_rows), categories=categories)
+                              for column, categories in schema_config["domains"].items()})
+    dataframe.insert(0, "case_id", pd.Series(np.arange(n_rows)).astype(str).radd("EZYV"))
+    dataframe["no_of_employees"] = rng.integers(1, 50000, size=n_rows)
+    dataframe["yr_of_estab"] = rng.integers(1850, 2016, size=n_rows)
+    dataframe["prevailing_wage"] = rng.uniform(10, 300000, size=n_rows).round(2)
+    return apply_schema_dtypes(dataframe, schema_config, log_report=False)
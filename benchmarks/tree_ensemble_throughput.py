@@ -0,0 +1,80 @@
+"""
+Time of CompiledTreeEnsemble.predict_proba against the predict_proba of the library per batch size, the evidence for
+COMPILED_TREE_ENSEMBLE_MAX_ROWS.
+
+Fits the tree ensemble candidates of config/model.yaml with one thread on --train-rows synthetic visa applications
+transformed by the data transformation preprocessor, compiles them with compile_tree_ensemble and scores batches of
+every --rows size with both. Every timing is the mean of as many calls as fit in --min-seconds, at least --min-calls.
+The compiled probabilities are checked against the library. For every library the last line is the largest batch
+where the compiled trees are faster, next to the batch size up to which COMPILED_TREE_ENSEMBLE_MAX_ROWS uses them.
+
+    python -m benchmarks.tree_ensemble_throughput --rows 1,10,100,1000,10000,100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_data import make_visa_dataframe
+from visa.components.data_transformation import DataTransformation
+from visa.constants import MODEL_TRAINER_MODEL_CONFIG_FILE_PATH
+from visa.entity.config_entity import DataTransformationConfig
+from visa.entity.tree_ensemble import compile_tree_ensemble
+from visa.utils.main_utils import read_yaml_file
+from visa.utils.training_utils import build_estimator, get_model_candidates
+
+
+def get_mean_seconds(func, min_seconds: float, min_calls: int) -> float:
+    n_calls = 0
+    start_time = time.perf_counter()
+    while n_calls < min_calls or time.perf_counter() - start_time < min_seconds:
+        func()
+        n_calls += 1
+    return (time.perf_counter() - start_time) / n_calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1,10,100,1000,10000,100000", help="comma separated batch sizes")
+    parser.add_argument("--train-rows", type=int, default=20000)
+    parser.add_argument("--min-seconds", type=float, default=1.0)
+    parser.add_argument("--min-calls", type=int, default=3)
+    args = parser.parse_args()
+
+    batch_sizes = list(map(int, args.rows.split(",")))
+    train_df = make_visa_dataframe(args.train_rows, seed=0)
+    preprocessor = DataTransformation(data_ingestion_artifact=None, data_validation_artifact=None,
+                                      data_transformation_config=DataTransformationConfig(preprocessor_n_jobs=1)
+                                      ).get_data_transformer_object().fit(train_df)
+    features = np.asarray(preprocessor.transform(train_df), dtype=np.float32)
+    target = (features[:, 0] + features[:, 1] * features[:, 2] > 0).astype(np.int64)
+    batch_features = np.asarray(preprocessor.transform(make_visa_dataframe(max(batch_sizes), seed=1)),
+                                dtype=np.float32)
+
+    candidates = get_model_candidates(read_yaml_file(MODEL_TRAINER_MODEL_CONFIG_FILE_PATH), time_budget=0,
+                                      early_stopping_rounds=0)
+    print(f"{len(features)} training rows, {features.shape[1]} features, one thread")
+    print(f"{'model':>28} {'rows':>7} {'native ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for candidate in candidates:
+        model = build_estimator(candidate, n_threads=1).fit(features, target)
+        compiled = compile_tree_ensemble(model)
+        if compiled is None:
+            continue
+        check_features = batch_features[:1000]
+        np.testing.assert_allclose(compiled.predict_proba(check_features), model.predict_proba(check_features),
+                                   atol=1e-5)
+        faster_rows = 0
+        for n_rows in batch_sizes:
+            batch = batch_features[:n_rows]
+            native_seconds = get_mean_seconds(lambda: model.predict_proba(batch), args.min_seconds, args.min_calls)
+            compiled_seconds = get_mean_seconds(lambda: compiled.predict_proba(batch), args.min_seconds, args.min_calls)
+            if compiled_seconds < native_seconds:
+                faster_rows = n_rows
+            print(f"{candidate['name']:>28} {n_rows:>7} {native_seconds * 1e3:>10.3f} {compiled_seconds * 1e3:>12.3f} "
+                  f"{native_seconds / compiled_seconds:>8.2f}")
+        print(f"{candidate['name']:>28} compiled faster up to {faster_rows} rows, "
+              f"used up to {compiled.max_rows} rows by COMPILED_TREE_ENSEMBLE_MAX_ROWS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Time of DataValidation.validate_dataframe against the number of rows, to check that it scales linearly.
+
+Runs the validation on synthetic frames of 1M, 5M and 10M rows compacted to the schema dtypes, as the pipeline loads
+them. Every timing is the median of --repeat calls; the last column is the time per row relative to the smallest
+frame, which stays near 1.0 when the validation is linear in the rows.
+
+    python -m benchmarks.validation_scaling --rows 1000000,5000000,10000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_data import make_visa_dataframe
+from visa.components.data_validation import DataValidation
+from visa.entity.config_entity import DataValidationConfig
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000000,5000000,10000000", help="comma separated row counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data_validation = DataValidation(data_validation_config=DataValidationConfig(), data_ingestion_artifact=None)
+    results = []
+    for n_rows in map(int, args.rows.split(",")):
+        dataframe = make_visa_dataframe(n_rows)
+        timings = []
+        for _ in range(args.repeat):
+            start_time = time.perf_counter()
+            report = data_validation.validate_dataframe(dataframe)
+            timings.append(time.perf_counter() - start_time)
+        assert report["n_rows"] == n_rows and report["status"], report["failed_columns"]
+        results.append((n_rows, float(np.median(timings))))
+        del dataframe
+
+    base_rows, base_seconds = results[0]
+    print(f"{'rows':>10} {'seconds':>8} {'M rows/s':>9} {'ns/row':>7} {'relative ns/row':>16}")
+    for n_rows, seconds in results:
+        print(f"{n_rows:>10} {seconds:>8.3f} {n_rows / seconds / 1e6:>9.1f} {seconds / n_rows * 1e9:>7.1f} "
+              f"{(seconds / n_rows) / (base_seconds / base_rows):>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,5 +9,6 @@ from visa.exception import USVisaException
 from visa.pipeline.training_pipeline import TrainingPipeline
 
 
-pipeline = TrainingPipeline()
-pipeline.run_pipeline()
+if __name__ == "__main__":
+    pipeline = TrainingPipeline()
+    pipeline.run_pipeline()
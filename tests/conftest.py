@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from visa.components.data_transformation import DataTransformation
+from visa.constants import SCHEMA_FILE_PATH, TARGET_COLUMN
+from visa.entity.config_entity import DataTransformationConfig
+from visa.entity.estimator import TargetValueMapping
+from visa.utils.main_utils import read_yaml_file
+
+
+def make_visa_dataframe(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Returns n_rows random visa applications with every category of the schema domains.
+    """
+    rng = np.random.default_rng(seed)
+    domains = read_yaml_file(SCHEMA_FILE_PATH)["domains"]
+    dataframe = pd.DataFrame({column: rng.choice(categories, size=n_rows) for column, categories in domains.items()})
+    dataframe["case_id"] = [f"EZYV{i}" for i in range(n_rows)]
+    dataframe["no_of_employees"] = rng.integers(1, 50000, size=n_rows)
+    dataframe["yr_of_estab"] = rng.integers(1850, 2016, size=n_rows)
+    dataframe["prevailing_wage"] = rng.uniform(10, 300000, size=n_rows).round(2)
+    return dataframe
+
+
+@pytest.fixture(scope="session")
+def visa_dataframe() -> pd.DataFrame:
+    return make_visa_dataframe(2000)
+
+
+@pytest.fixture(scope="session")
+def preprocessor(visa_dataframe):
+    data_transformation = DataTransformation(data_ingestion_artifact=None, data_validation_artifact=None,
+                                             data_transformation_config=DataTransformationConfig(preprocessor_n_jobs=1))
+    return data_transformation.get_data_transformer_object().fit(visa_dataframe)
+
+
+@pytest.fixture(scope="session")
+def visa_target(visa_dataframe) -> np.ndarray:
+    return TargetValueMapping().encode(visa_dataframe[TARGET_COLUMN])
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.ensemble import GradientBoostingClassifier
+
+from app import create_app
+from visa.entity.config_entity import AppConfig, ModelRegistryConfig
+from visa.entity.estimator import VisaModel
+from visa.entity.model_registry import get_model_registry
+from visa.utils.model_package import save_model_package
+
+
+@pytest.fixture(scope="module")
+def model_registry_config(tmp_path_factory, visa_dataframe, visa_target, preprocessor):
+    model_registry_config = ModelRegistryConfig(backend="local")
+    model_registry_config.registry_dir = str(tmp_path_factory.mktemp("model_registry"))
+    learner = GradientBoostingClassifier(n_estimators=20, random_state=0)
+    learner.fit(preprocessor.transform(visa_dataframe), visa_target)
+    package_dir = str(tmp_path_factory.mktemp("package") / "model")
+    save_model_package(VisaModel(preprocessor, learner), package_dir)
+    registry = get_model_registry(model_registry_config)
+    registry.promote(registry.publish(package_dir))
+    return model_registry_config
+
+
+@pytest.fixture(params=[True, False], ids=["micro_batching", "no_batching"])
+def client(request, model_registry_config):
+    app = create_app(AppConfig(micro_batching=request.param), model_registry_config)
+    with TestClient(app) as client:
+        yield client
+
+
+def get_application(visa_dataframe, row: int = 0) -> dict:
+    record = visa_dataframe.drop(columns=["case_id", "case_status"]).iloc[row].to_dict()
+    return {column: value.item() if hasattr(value, "item") else value for column, value in record.items()}
+
+
+def test_predict(client, visa_dataframe):
+    response = client.post("/predict", json=get_application(visa_dataframe))
+    assert response.status_code == 200
+    body = response.json()
+    assert body["prediction"] in ("Certified", "Denied")
+    assert 0.0 <= body["probability"] <= 1.0
+    assert body["model_version"] == "v1"
+
+
+def test_predict_unknown_category(client, visa_dataframe):
+    application = get_application(visa_dataframe)
+    application["continent"] = "Atlantis"
+    response = client.post("/predict", json=application)
+    assert response.status_code == 422
+    assert "Atlantis" in response.json()["detail"]
+    assert client.post("/predict", json=get_application(visa_dataframe, row=1)).status_code == 200
+
+
+def test_predict_invalid_type(client, visa_dataframe):
+    application = get_application(visa_dataframe)
+    application["no_of_employees"] = "many"
+    assert client.post("/predict", json=application).status_code == 422
+
+
+def test_import_opens_no_registry(tmp_path):
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", "import app"], cwd=tmp_path, check=True,
+                   env=dict(os.environ, PYTHONPATH=repo_dir))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from visa.entity.estimator import CompiledPreprocessor
+from visa.exception import USVisaException
+
+
+@pytest.fixture(scope="module")
+def compiled_preprocessor(preprocessor):
+    return CompiledPreprocessor(preprocessor)
+
+
+def test_dataframe(compiled_preprocessor, preprocessor, visa_dataframe):
+    np.testing.assert_allclose(compiled_preprocessor.transform(visa_dataframe), preprocessor.transform(visa_dataframe),
+                               rtol=1e-9, atol=1e-9)
+
+
+def test_records(compiled_preprocessor, preprocessor, visa_dataframe):
+    records = visa_dataframe.iloc[:64]
+    np.testing.assert_allclose(compiled_preprocessor.transform(records.to_dict("records")),
+                               preprocessor.transform(records), rtol=1e-9, atol=1e-9)
+
+
+def test_dict_of_columns(compiled_preprocessor, preprocessor, visa_dataframe):
+    records = visa_dataframe.iloc[:64]
+    np.testing.assert_allclose(compiled_preprocessor.transform(records.to_dict("list")),
+                               preprocessor.transform(records), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("row", [0, 1, 999])
+def test_single_record(compiled_preprocessor, preprocessor, visa_dataframe, row):
+    record = visa_dataframe.iloc[row].to_dict()
+    np.testing.assert_allclose(compiled_preprocessor.transform(record),
+                               preprocessor.transform(visa_dataframe.iloc[[row]]), rtol=1e-9, atol=1e-9)
+
+
+def test_from_state(compiled_preprocessor, visa_dataframe):
+    arrays, metadata = compiled_preprocessor.get_state()
+    restored = CompiledPreprocessor.from_state(arrays, metadata)
+    np.testing.assert_array_equal(restored.transform(visa_dataframe), compiled_preprocessor.transform(visa_dataframe))
+
+
+@pytest.mark.parametrize("column", ["continent", "education_of_employee"])
+def test_unknown_category(compiled_preprocessor, preprocessor, visa_dataframe, column):
+    records = visa_dataframe.iloc[:8].copy()
+    records[column] = records[column].astype(object)
+    records.loc[records.index[3], column] = "Atlantis"
+    with pytest.raises(ValueError):
+        preprocessor.transform(records)
+    for compiled_input in (records, records.to_dict("records"), records.iloc[3].to_dict()):
+        with pytest.raises(USVisaException, match=f"unknown category 'Atlantis' in column {column}"):
+            compiled_preprocessor.transform(compiled_input)
@@ -0,0 +1,123 @@
+import os
+
+import mongomock
+import pandas as pd
+import pytest
+
+from conftest import make_visa_dataframe
+from visa.components.data_ingestion import DataIngestion
+from visa.configuration.mongo_db_connection import MongoDBClient
+from visa.constants import DATABASE_NAME
+from visa.entity.config_entity import DataIngestionConfig
+from visa.exception import USVisaException
+from visa.utils.main_utils import read_dataframe
+
+
+@pytest.fixture
+def mongo_client(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(MongoDBClient, "client", client)
+    return client
+
+
+@pytest.fixture
+def artifact_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(DataIngestionConfig, "data_ingestion_dir", str(tmp_path / "data_ingestion"))
+    return tmp_path
+
+
+def insert_records(mongo_client, collection_name: str, n_rows: int, seed: int = 0) -> None:
+    records = make_visa_dataframe(n_rows, seed=seed).astype(object).to_dict("records")
+    mongo_client[DATABASE_NAME][collection_name].insert_many(records)
+
+
+def test_invalid_file_format():
+    with pytest.raises(ValueError):
+        DataIngestionConfig(file_format="xlsx")
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet", "feather"])
+def test_file_format(mongo_client, artifact_dir, file_format):
+    insert_records(mongo_client, "visa", 200)
+    data_ingestion_config = DataIngestionConfig(file_format=file_format, async_persist=False, collection_name="visa")
+    data_ingestion_artifact = DataIngestion(data_ingestion_config).initiate_data_ingestion()
+    for file_path in (data_ingestion_config.feature_store_file_path, data_ingestion_artifact.trained_file_path,
+                      data_ingestion_artifact.test_file_path):
+        assert file_path.startswith(str(artifact_dir)) and file_path.endswith(f".{file_format}")
+        assert os.path.exists(file_path)
+    n_train_rows = len(read_dataframe(data_ingestion_artifact.trained_file_path))
+    n_test_rows = len(read_dataframe(data_ingestion_artifact.test_file_path))
+    assert (n_train_rows, n_test_rows) == (160, 40)
+
+
+def test_split_is_streamed_in_chunks(mongo_client, artifact_dir):
+    insert_records(mongo_client, "visa", 1000)
+    data_ingestion_config = DataIngestionConfig(collection_name="visa", batch_size=64)
+    data_ingestion_artifact = DataIngestion(data_ingestion_config).initiate_data_ingestion()
+    assert data_ingestion_artifact.train_df is None and data_ingestion_artifact.test_df is None
+    train_df = read_dataframe(data_ingestion_artifact.trained_file_path)
+    test_df = read_dataframe(data_ingestion_artifact.test_file_path)
+    assert (len(train_df), len(test_df)) == (800, 200)
+    assert sorted(train_df["case_id"].tolist() + test_df["case_id"].tolist()) == sorted(f"EZYV{i}" for i in range(1000))
+    # the testing rows are drawn from every chunk, not only from the last ones
+    assert test_df["case_id"].str[4:].astype(int).min() < 64
+
+
+@pytest.fixture
+def incremental_config(monkeypatch, artifact_dir):
+    monkeypatch.setattr(DataIngestionConfig, "persistent_feature_store_dir", str(artifact_dir / "feature_store" / "visa_data"))
+    monkeypatch.setattr(DataIngestionConfig, "watermark_file_path", str(artifact_dir / "feature_store" / "watermark.yaml"))
+    return DataIngestionConfig(incremental=True, async_persist=False, collection_name="visa", batch_size=64)
+
+
+def read_feature_store(part_file_paths: list) -> pd.DataFrame:
+    return pd.concat([read_dataframe(file_path) for file_path in part_file_paths], ignore_index=True)
+
+
+def test_incremental_empty_collection(mongo_client, incremental_config):
+    data_ingestion = DataIngestion(incremental_config)
+    assert data_ingestion.export_incremental_data_into_feature_store() == []
+    assert data_ingestion.list_feature_store_parts() == []
+    with pytest.raises(USVisaException, match="has no records and the feature store is empty"):
+        data_ingestion.initiate_data_ingestion()
+
+
+def test_incremental_writes_delta_parts(mongo_client, incremental_config):
+    data_ingestion = DataIngestion(incremental_config)
+    collection = mongo_client[DATABASE_NAME]["visa"]
+    insert_records(mongo_client, "visa", 100, seed=0)
+    assert len(read_feature_store(data_ingestion.export_incremental_data_into_feature_store())) == 100
+    first_part, = data_ingestion.list_feature_store_parts()
+
+    new_records = make_visa_dataframe(30, seed=1)
+    new_records["case_id"] = [f"NEW{i}" for i in range(30)]
+    collection.insert_many(new_records.astype(object).to_dict("records"))
+    first_part_mtime = os.stat(first_part).st_mtime_ns
+    assert len(read_feature_store(data_ingestion.export_incremental_data_into_feature_store())) == 130
+    assert os.stat(first_part).st_mtime_ns == first_part_mtime
+    assert len(data_ingestion.list_feature_store_parts()) == 2
+
+    updates = make_visa_dataframe(10, seed=2)
+    updates["prevailing_wage"] = 123.0
+    collection.insert_many(updates.astype(object).to_dict("records"))
+    parts = data_ingestion.export_incremental_data_into_feature_store()
+    dataframe = read_feature_store(parts)
+    assert parts == data_ingestion.list_feature_store_parts()
+    assert len(dataframe) == 130 and dataframe["case_id"].is_unique
+    assert (dataframe.set_index("case_id").loc[[f"EZYV{i}" for i in range(10)], "prevailing_wage"] == 123.0).all()
+    assert len(parts) == 3 and len(read_dataframe(parts[0])) == 90 and len(read_dataframe(parts[1])) == 30
+
+    assert data_ingestion.export_incremental_data_into_feature_store() == parts
+    data_ingestion_artifact = DataIngestion(incremental_config).initiate_data_ingestion()
+    assert len(read_dataframe(data_ingestion_artifact.trained_file_path)) + \
+        len(read_dataframe(data_ingestion_artifact.test_file_path)) == 130
+
+
+def test_incremental_duplicates_within_delta(mongo_client, incremental_config):
+    insert_records(mongo_client, "visa", 50, seed=0)
+    updates = make_visa_dataframe(5, seed=3)
+    updates["prevailing_wage"] = 7.0
+    mongo_client[DATABASE_NAME]["visa"].insert_many(updates.astype(object).to_dict("records"))
+    dataframe = read_feature_store(DataIngestion(incremental_config).export_incremental_data_into_feature_store())
+    assert len(dataframe) == 50 and dataframe["case_id"].is_unique
+    assert (dataframe.set_index("case_id").loc[[f"EZYV{i}" for i in range(5)], "prevailing_wage"] == 7.0).all()
@@ -0,0 +1,100 @@
+import os
+
+import dill
+import numpy as np
+import pytest
+from scipy import sparse
+
+from conftest import make_visa_dataframe
+from visa.components.data_transformation import DataTransformation
+from visa.constants import TARGET_COLUMN
+from visa.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+from visa.entity.config_entity import DataTransformationConfig
+from visa.entity.estimator import TargetValueMapping
+from visa.utils.main_utils import load_numpy_array_data, wait_for_background_tasks
+
+
+@pytest.fixture
+def data_transformation_config_class(monkeypatch, tmp_path):
+    """
+    DataTransformationConfig with its artifact paths moved from the artifacts directory to tmp_path.
+    """
+    artifact_dir = DataTransformationConfig.data_transformation_dir
+    monkeypatch.setattr(DataTransformationConfig, "data_transformation_dir", str(tmp_path))
+    for name, value in list(vars(DataTransformationConfig).items()):
+        if name.endswith("_file_path") and isinstance(value, str):
+            monkeypatch.setattr(DataTransformationConfig, name, os.path.join(str(tmp_path), os.path.relpath(value, artifact_dir)))
+    return DataTransformationConfig
+
+
+def get_data_transformation(data_transformation_config: DataTransformationConfig) -> DataTransformation:
+    train_df, test_df = make_visa_dataframe(1500, seed=1), make_visa_dataframe(500, seed=2)
+    data_ingestion_artifact = DataIngestionArtifact(trained_file_path="train.parquet", test_file_path="test.parquet",
+                                                    train_df=train_df, test_df=test_df)
+    data_validation_artifact = DataValidationArtifact(validation_status=True, message="", drift_report_file_path="",
+                                                      validation_report_file_path="", drift_baseline_file_path="")
+    return DataTransformation(data_ingestion_artifact, data_validation_artifact, data_transformation_config)
+
+
+def test_saved_preprocessor_transforms_in_process(visa_dataframe):
+    data_transformation = DataTransformation(data_ingestion_artifact=None, data_validation_artifact=None,
+                                             data_transformation_config=DataTransformationConfig(preprocessor_n_jobs=-1))
+    preprocessor = data_transformation.get_data_transformer_object().fit(visa_dataframe)
+    assert preprocessor.named_steps['ColumnTransformer'].n_jobs == -1
+    DataTransformation.reset_preprocessor_n_jobs(preprocessor)
+    assert dill.loads(dill.dumps(preprocessor)).named_steps['ColumnTransformer'].n_jobs == 1
+
+
+@pytest.mark.parametrize("sparse_output", [False, True])
+def test_features_file_matches_sparse_output(data_transformation_config_class, sparse_output):
+    data_transformation_config = data_transformation_config_class(sparse_output=sparse_output, async_persist=False,
+                                                                  preprocessor_n_jobs=1, resampling_strategy="none")
+    artifact = get_data_transformation(data_transformation_config).initiate_data_transformation()
+    wait_for_background_tasks()
+    for file_path in (artifact.transformed_train_file_path, artifact.transformed_test_file_path):
+        assert file_path.endswith(".npz" if sparse_output else ".npy")
+        features = load_numpy_array_data(file_path)
+        assert sparse.issparse(features) == sparse_output
+    train_features = load_numpy_array_data(artifact.transformed_train_file_path)
+    assert train_features.shape[0] == len(load_numpy_array_data(artifact.transformed_train_labels_file_path))
+    if sparse_output:
+        train_features = train_features.toarray()
+    np.testing.assert_allclose(train_features, np.asarray(artifact.train_features.todense() if sparse_output
+                                                          else artifact.train_features))
+
+
+def get_class_share(labels: np.ndarray) -> float:
+    return float(np.mean(np.asarray(labels) == 1))
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_validation_and_unresampled_rows_saved(data_transformation_config_class, tmp_path, chunked):
+    data_transformation_config = data_transformation_config_class(
+        async_persist=False, preprocessor_n_jobs=1, chunked=chunked, chunk_size=256, validation_split=0.2,
+        resampling_strategy="class_weight" if chunked else "random_under")
+    data_transformation = get_data_transformation(data_transformation_config)
+    if chunked:
+        for file_path, dataframe in ((tmp_path / "train.parquet", data_transformation.data_ingestion_artifact.train_df),
+                                     (tmp_path / "test.parquet", data_transformation.data_ingestion_artifact.test_df)):
+            dataframe.to_parquet(file_path)
+        data_transformation.data_ingestion_artifact.trained_file_path = str(tmp_path / "train.parquet")
+        data_transformation.data_ingestion_artifact.test_file_path = str(tmp_path / "test.parquet")
+    artifact = data_transformation.initiate_data_transformation()
+    wait_for_background_tasks()
+
+    validation_labels = load_numpy_array_data(artifact.transformed_validation_labels_file_path)
+    validation_features = load_numpy_array_data(artifact.transformed_validation_file_path)
+    train_labels = load_numpy_array_data(artifact.transformed_train_labels_file_path)
+    original_labels = np.asarray(TargetValueMapping().encode(data_transformation.data_ingestion_artifact.train_df[TARGET_COLUMN]))
+    assert len(validation_labels) == validation_features.shape[0] == 300
+    assert get_class_share(validation_labels) == pytest.approx(get_class_share(original_labels), abs=0.01)
+    unresampled_train_labels = load_numpy_array_data(artifact.transformed_unresampled_train_labels_file_path)
+    assert len(unresampled_train_labels) == load_numpy_array_data(artifact.transformed_unresampled_train_file_path).shape[0] == 1200
+    if chunked:
+        assert len(train_labels) == 1200
+    else:
+        # only the training rows are undersampled, the validation rows keep the original class distribution
+        assert len(train_labels) < 1200 and get_class_share(train_labels) == pytest.approx(0.5)
+    np.testing.assert_allclose(validation_features, artifact.preprocessor.transform(
+        data_transformation.data_ingestion_artifact.train_df[data_transformation.get_validation_mask(
+            data_transformation.data_ingestion_artifact.train_df[TARGET_COLUMN].to_numpy())]), rtol=1e-5, atol=1e-5)
@@ -0,0 +1,102 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+
+from visa.entity.config_entity import BatchInferenceConfig
+from visa.entity.estimator import VisaModel
+from visa.exception import USVisaException
+from visa.pipeline.inference_pipeline import BatchInferencePipeline
+from visa.utils.main_utils import write_dataframe
+from visa.utils.model_package import save_model_package
+
+
+@pytest.fixture(scope="module")
+def package_dir(tmp_path_factory, visa_dataframe, visa_target, preprocessor):
+    learner = GradientBoostingClassifier(n_estimators=5, random_state=0)
+    learner.fit(preprocessor.transform(visa_dataframe), visa_target)
+    package_dir = str(tmp_path_factory.mktemp("package") / "model")
+    save_model_package(VisaModel(preprocessor, learner), package_dir)
+    return package_dir
+
+
+def make_pipeline(input_file_path: str, output_dir: str, package_dir: str) -> BatchInferencePipeline:
+    return BatchInferencePipeline(input_file_path=input_file_path, output_dir=output_dir, model_package_dir=package_dir,
+                                  batch_inference_config=BatchInferenceConfig(chunk_size=300, n_workers=1))
+
+
+def read_predictions(predictions_dir: str) -> pd.DataFrame:
+    return pd.concat([pd.read_parquet(file_path) for file_path in sorted(glob.glob(os.path.join(predictions_dir, "part-*")))],
+                     ignore_index=True)
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet", "feather"])
+def test_resume_after_failed_chunk(tmp_path, monkeypatch, package_dir, visa_dataframe, file_format):
+    input_file_path = str(tmp_path / f"applications.{file_format}")
+    write_dataframe(visa_dataframe, input_file_path)
+    output_dir = str(tmp_path / "output")
+    failed_chunk = 3
+    complete_chunk = BatchInferencePipeline.complete_chunk
+
+    def fail_at_chunk(self, chunk_index, *args):
+        if chunk_index == failed_chunk:
+            raise RuntimeError(f"failed at chunk {chunk_index}")
+        complete_chunk(self, chunk_index, *args)
+
+    monkeypatch.setattr(BatchInferencePipeline, "complete_chunk", fail_at_chunk)
+    with pytest.raises(USVisaException):
+        make_pipeline(input_file_path, output_dir, package_dir).run_pipeline()
+    first_parts = {file_path: os.path.getmtime(file_path) for file_path in glob.glob(os.path.join(output_dir, "predictions", "part-*"))}
+    assert len(first_parts) == failed_chunk
+
+    written_chunks, read_rows = [], []
+    iter_input_chunks = BatchInferencePipeline.iter_input_chunks
+
+    def record_complete_chunk(self, chunk_index, *args):
+        written_chunks.append(chunk_index)
+        complete_chunk(self, chunk_index, *args)
+
+    def record_input_chunks(self, checkpoint):
+        for chunk, position in iter_input_chunks(self, checkpoint):
+            read_rows.extend(chunk["case_id"])
+            yield chunk, position
+
+    monkeypatch.setattr(BatchInferencePipeline, "complete_chunk", record_complete_chunk)
+    monkeypatch.setattr(BatchInferencePipeline, "iter_input_chunks", record_input_chunks)
+    batch_inference_artifact = make_pipeline(input_file_path, output_dir, package_dir).run_pipeline()
+
+    # only the chunks after the completed ones are read and written, the completed parts are kept
+    assert written_chunks == list(range(failed_chunk, 7))
+    assert read_rows == visa_dataframe["case_id"].tolist()[failed_chunk * 300:]
+    assert all(os.path.getmtime(file_path) == mtime for file_path, mtime in first_parts.items())
+    assert (batch_inference_artifact.n_resumed_chunks, batch_inference_artifact.n_rows) == (failed_chunk, 2000)
+    predictions = read_predictions(batch_inference_artifact.predictions_dir)
+    assert predictions["case_id"].tolist() == visa_dataframe["case_id"].tolist()
+    assert predictions["row_number"].tolist() == list(range(2000))
+
+
+def test_replaced_input_is_not_resumed(tmp_path, monkeypatch, package_dir, visa_dataframe):
+    input_file_path = str(tmp_path / "applications.csv")
+    write_dataframe(visa_dataframe, input_file_path)
+    output_dir = str(tmp_path / "output")
+    complete_chunk = BatchInferencePipeline.complete_chunk
+
+    def fail_at_chunk(self, chunk_index, *args):
+        if chunk_index == 2:
+            raise RuntimeError(f"failed at chunk {chunk_index}")
+        complete_chunk(self, chunk_index, *args)
+
+    monkeypatch.setattr(BatchInferencePipeline, "complete_chunk", fail_at_chunk)
+    with pytest.raises(USVisaException):
+        make_pipeline(input_file_path, output_dir, package_dir).run_pipeline()
+    monkeypatch.setattr(BatchInferencePipeline, "complete_chunk", complete_chunk)
+
+    write_dataframe(visa_dataframe.iloc[::-1], input_file_path)
+    os.utime(input_file_path, ns=(0, 0))
+    with pytest.raises(USVisaException, match="use another output_dir"):
+        make_pipeline(input_file_path, output_dir, package_dir).run_pipeline()
+    batch_inference_artifact = make_pipeline(input_file_path, str(tmp_path / "new_output"), package_dir).run_pipeline()
+    assert read_predictions(batch_inference_artifact.predictions_dir)["case_id"].tolist() == \
+        visa_dataframe["case_id"].tolist()[::-1]
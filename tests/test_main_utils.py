@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+from conftest import make_visa_dataframe
+from visa.constants import SCHEMA_FILE_PATH
+from visa.utils.main_utils import apply_schema_dtypes, read_dataframe, read_yaml_file, write_dataframe
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_identifier_without_domain_kept_as_strings(tmp_path, file_format):
+    schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+    dataframe = make_visa_dataframe(1000)
+    dataframe["agent"] = [f"agent_{i % 3}" for i in range(1000)]
+    schema_config["columns"].append({"agent": "category"})
+    file_path = str(tmp_path / f"visa_data.{file_format}")
+    write_dataframe(dataframe, file_path)
+
+    compacted = read_dataframe(file_path, schema_config=schema_config)
+    assert pd.api.types.is_object_dtype(compacted["case_id"])
+    assert compacted["case_id"].tolist() == dataframe["case_id"].tolist()
+    assert isinstance(compacted["agent"].dtype, pd.CategoricalDtype)
+    assert list(compacted["continent"].cat.categories) == schema_config["domains"]["continent"]
+
+    # a categorical identifier, as written before, is turned back into strings
+    dataframe["case_id"] = dataframe["case_id"].astype("category")
+    assert pd.api.types.is_object_dtype(apply_schema_dtypes(dataframe, schema_config, log_report=False)["case_id"])
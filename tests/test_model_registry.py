@@ -0,0 +1,90 @@
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+
+from visa.entity.estimator import VisaModel
+from visa.entity.model_registry import LocalModelRegistryBackend, ModelCache, ModelRegistry, ModelRegistryBackend
+from visa.exception import USVisaException
+from visa.utils.model_package import save_model_package
+
+
+@pytest.fixture(scope="module")
+def package_dir(tmp_path_factory, visa_dataframe, visa_target, preprocessor):
+    learner = GradientBoostingClassifier(n_estimators=5, random_state=0)
+    learner.fit(preprocessor.transform(visa_dataframe), visa_target)
+    package_dir = str(tmp_path_factory.mktemp("package") / "model")
+    save_model_package(VisaModel(preprocessor, learner), package_dir)
+    return package_dir
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(LocalModelRegistryBackend(str(tmp_path / "model_registry"), "champion.json"))
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        ModelRegistryBackend()
+
+
+def test_publish_numbers_versions(registry, package_dir, monkeypatch):
+    assert [registry.publish(package_dir), registry.publish(package_dir)] == ["v1", "v2"]
+    assert registry.backend.list_versions() == ["v1", "v2"]
+    with pytest.raises(FileExistsError):
+        registry.backend.upload_version("v2", package_dir)
+
+    # a publisher that listed the versions before v3 was published by another one retries with v4
+    list_versions = registry.backend.list_versions
+    registry.publish(package_dir)
+    stale_listings = [["v1", "v2"]]
+    monkeypatch.setattr(registry.backend, "list_versions",
+                        lambda: stale_listings.pop() if stale_listings else list_versions())
+    assert registry.publish(package_dir) == "v4"
+
+
+def test_promote_swaps_pointer(registry, package_dir):
+    assert registry.get_champion_version() is None
+    registry.publish(package_dir)
+    registry.publish(package_dir)
+    assert registry.promote("v1")["previous_version"] is None
+    pointer = registry.promote("v2")
+    assert (pointer["version"], pointer["previous_version"]) == ("v2", "v1")
+    assert registry.get_champion_version() == "v2"
+    with pytest.raises(USVisaException):
+        registry.promote("v3")
+    assert registry.get_champion_version() == "v2"
+
+
+def test_model_cache_hot_reload(registry, package_dir, visa_dataframe):
+    for _ in range(2):
+        registry.publish(package_dir)
+    registry.promote("v1")
+    model_cache = ModelCache(registry, max_size=2, check_interval=0)
+    version, model = model_cache.get_with_version()
+    assert version == "v1" and len(model.predict(visa_dataframe.head())) == 5
+
+    registry.promote("v2")
+    assert model_cache.get_with_version()[0] == "v2"
+    # rolling back serves the previous champion from the cache without loading it again
+    registry.promote("v1")
+    assert model_cache.get_with_version()[0] == "v1"
+    assert (model_cache.stats["loads"], model_cache.stats["hits"]) == (2, 1)
+
+    # the pointer is not read again within check_interval
+    model_cache.check_interval = 3600
+    model_cache.get_with_version()
+    registry.promote("v2")
+    assert model_cache.get_with_version()[0] == "v1"
+
+
+def test_model_cache_evicts_least_recently_used(registry, package_dir):
+    for _ in range(3):
+        registry.publish(package_dir)
+    model_cache = ModelCache(registry, max_size=2)
+    model_cache.get("v1")
+    model_cache.get("v2")
+    model_cache.get("v1")
+    model_cache.get("v3")
+    assert list(model_cache._models) == ["v1", "v3"]
+    assert (model_cache.stats["loads"], model_cache.stats["evictions"]) == (3, 1)
+    model_cache.get("v2")
+    assert list(model_cache._models) == ["v3", "v2"]
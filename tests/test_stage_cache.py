@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+from visa.entity.config_entity import StageCacheConfig
+from visa.utils.stage_cache import MANIFEST_FILE_NAME, StageCache
+
+
+@pytest.fixture
+def make_stage_cache(tmp_path):
+    def make_stage_cache(max_size_bytes: int = 1 << 30) -> StageCache:
+        stage_cache_config = StageCacheConfig(max_size_bytes=max_size_bytes)
+        stage_cache_config.stage_cache_dir = str(tmp_path / "stage_cache")
+        stage_cache_config.report_file_path = str(tmp_path / "stage_cache_report.yaml")
+        return StageCache(stage_cache_config)
+    return make_stage_cache
+
+
+def write_file(file_path, content: bytes) -> str:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as file_obj:
+        file_obj.write(content)
+    return str(file_path)
+
+
+def test_miss_then_hit_restores_copies(tmp_path, make_stage_cache):
+    input_file_path = write_file(tmp_path / "input.csv", b"a,b\n1,2\n")
+    output_file_path = write_file(tmp_path / "run_1" / "output.bin", b"output")
+    stage_cache = make_stage_cache()
+    key = stage_cache.compute_key("stage", inputs=[input_file_path], config={"setting": 1})
+    output_file_paths = {"output": output_file_path}
+    assert stage_cache.lookup("stage", key, output_file_paths) is None
+    stage_cache.add("stage", key, fields={"status": True}, output_file_paths=output_file_paths)
+    stage_cache.commit()
+
+    stage_cache = make_stage_cache()
+    restored_file_path = str(tmp_path / "run_2" / "output.bin")
+    assert stage_cache.compute_key("stage", inputs=[input_file_path], config={"setting": 1}) == key
+    assert stage_cache.lookup("stage", key, {"output": restored_file_path}) == {"status": True}
+    assert stage_cache.write_report()["hits"] == 1
+
+    # the restored file is a copy, so rewriting it in the run leaves the cache entry intact
+    cached_file_path = os.path.join(stage_cache.stage_cache_config.stage_cache_dir, "stage", key, "output.bin")
+    assert not os.path.samefile(restored_file_path, cached_file_path)
+    write_file(restored_file_path, b"changed")
+    with open(cached_file_path, "rb") as file_obj:
+        assert file_obj.read() == b"output"
+
+
+def test_key_changes_with_config_and_inputs(tmp_path, make_stage_cache):
+    input_file_path = write_file(tmp_path / "input.csv", b"a,b\n1,2\n")
+    stage_cache = make_stage_cache()
+    key = stage_cache.compute_key("stage", inputs=[input_file_path], config={"setting": 1})
+    assert stage_cache.compute_key("stage", inputs=[input_file_path], config={"setting": 2}) != key
+    assert stage_cache.compute_key("other_stage", inputs=[input_file_path], config={"setting": 1}) != key
+    write_file(input_file_path, b"a,b\n1,3\n")
+    assert stage_cache.compute_key("stage", inputs=[input_file_path], config={"setting": 1}) != key
+
+
+def test_evicts_least_recently_used(tmp_path, make_stage_cache):
+    stage_cache = make_stage_cache(max_size_bytes=2600)
+    entry_dirs = {}
+    for name in ("a", "b"):
+        stage_cache.add("stage", name, fields={}, output_file_paths={
+            "output": write_file(tmp_path / "run" / f"{name}.bin", b"x" * 1000)})
+        stage_cache.commit()
+        entry_dirs[name] = os.path.join(stage_cache.stage_cache_config.stage_cache_dir, "stage", name)
+    now = time.time()
+    os.utime(os.path.join(entry_dirs["a"], MANIFEST_FILE_NAME), (now - 100, now - 100))
+    os.utime(os.path.join(entry_dirs["b"], MANIFEST_FILE_NAME), (now - 50, now - 50))
+
+    # a hit on the older entry makes the newer one the least recently used
+    assert stage_cache.lookup("stage", "a", {"output": str(tmp_path / "restored" / "a.bin")}) == {}
+    stage_cache.add("stage", "c", fields={}, output_file_paths={
+        "output": write_file(tmp_path / "run" / "c.bin", b"x" * 1000)})
+    stage_cache.commit()
+    assert os.path.isdir(entry_dirs["a"])
+    assert not os.path.exists(entry_dirs["b"])
+    assert os.path.isdir(os.path.join(stage_cache.stage_cache_config.stage_cache_dir, "stage", "c"))
@@ -0,0 +1,80 @@
+import time
+
+import numpy as np
+import pytest
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from xgboost import XGBClassifier
+
+from visa.utils.main_utils import save_numpy_array_data
+from visa.utils.training_utils import fit_estimator, get_model_candidates, train_candidates_in_parallel
+
+
+class SlowClassifier(ClassifierMixin, BaseEstimator):
+    """
+    Estimator that cannot stop early, to be killed by the hard time limit of its worker.
+    """
+
+    def __init__(self, seconds: float = 60):
+        self.seconds = seconds
+
+    def fit(self, features, target):
+        time.sleep(self.seconds)
+        return self
+
+
+@pytest.fixture(scope="module")
+def transformed_data(preprocessor, visa_dataframe, visa_target):
+    features = np.asarray(preprocessor.transform(visa_dataframe), dtype=np.float32)
+    target = np.asarray(visa_target, dtype=np.int8)
+    return {"train": (features[:1200], target[:1200]), "validation": (features[1200:1600], target[1200:1600]),
+            "test": (features[1600:], target[1600:])}
+
+
+@pytest.fixture
+def transformed_files(tmp_path, transformed_data):
+    file_paths = []
+    for name, (features, target) in transformed_data.items():
+        file_paths += [str(tmp_path / f"{name}.npy"), str(tmp_path / f"{name}_labels.npy")]
+        save_numpy_array_data(file_paths[-2], features)
+        save_numpy_array_data(file_paths[-1], target)
+    return file_paths
+
+
+def test_train_candidates_in_parallel(tmp_path, transformed_files):
+    model_config = {"model_selection": {
+        "module_0": {"class": "LogisticRegression", "module": "sklearn.linear_model", "params": {"max_iter": 200}},
+        "module_1": {"class": "DecisionTreeClassifier", "module": "sklearn.tree", "params": {"max_depth": 3}},
+        "module_2": {"class": "SlowClassifier", "module": __name__, "params": {}, "time_budget": 1}}}
+    candidates = get_model_candidates(model_config, time_budget=60, early_stopping_rounds=5)
+    start_time = time.perf_counter()
+    results = train_candidates_in_parallel(candidates, *transformed_files, output_dir=str(tmp_path / "candidates"),
+                                           n_workers=2, hard_time_limit_factor=1.5)
+    assert time.perf_counter() - start_time < 30
+
+    assert [result["name"] for result in results] == ["LogisticRegression", "DecisionTreeClassifier", "SlowClassifier"]
+    for result in results[:2]:
+        assert result["status"] == "completed", result.get("error")
+        assert result["stopped_by"] == "completed"
+        assert 0 <= result["validation"]["f1_score"] <= 1 and 0 <= result["test"]["f1_score"] <= 1
+    assert results[2]["status"] == "killed"
+    assert 1.5 <= results[2]["wall_seconds"] < 10
+
+
+@pytest.mark.parametrize("estimator, time_budget, early_stopping_rounds, stopped_by", [
+    (LogisticRegression(max_iter=200), 0, 0, "completed"),
+    (RandomForestClassifier(n_estimators=10), 0, 0, "completed"),
+    (XGBClassifier(n_estimators=500, learning_rate=0.5), 0, 3, "early_stopping"),
+    (GradientBoostingClassifier(n_estimators=500, learning_rate=0.5), 0, 3, "early_stopping"),
+    (XGBClassifier(n_estimators=500), 1e-6, 0, "time_budget"),
+    (RandomForestClassifier(n_estimators=100), 1e-6, 0, "time_budget"),
+], ids=["logistic_completed", "forest_completed", "xgboost_early_stopping", "gradient_boosting_early_stopping",
+        "xgboost_time_budget", "forest_time_budget"])
+def test_fit_estimator_stop_reasons(transformed_data, estimator, time_budget, early_stopping_rounds, stopped_by):
+    n_estimators = estimator.get_params().get("n_estimators")
+    training = fit_estimator(estimator, *transformed_data["train"], *transformed_data["validation"],
+                             time_budget=time_budget, early_stopping_rounds=early_stopping_rounds)
+    assert training["stopped_by"] == stopped_by
+    if stopped_by != "completed":
+        assert training["n_rounds"] < n_estimators
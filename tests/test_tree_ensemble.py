@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from catboost import CatBoostClassifier
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from xgboost import XGBClassifier
+
+from visa.entity.tree_ensemble import compile_tree_ensemble
+
+
+def make_data(n_rows: int = 2000, n_features: int = 5, missing: float = 0.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] - X[:, 3] > 0).astype(np.int64)
+    if missing:
+        X[rng.random(X.shape) < missing] = np.nan
+    return X, y
+
+
+def assert_same_proba(model, X: np.ndarray) -> None:
+    compiled = compile_tree_ensemble(model)
+    assert compiled is not None
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), atol=1e-5)
+
+
+@pytest.mark.parametrize("train_missing", [0.0, 0.2])
+def test_xgboost_nan_rows(train_missing):
+    X, y = make_data(missing=train_missing)
+    model = XGBClassifier(n_estimators=50, max_depth=4).fit(X, y)
+    X_test, _ = make_data(n_rows=500, missing=0.3, seed=1)
+    assert_same_proba(model, X_test)
+
+
+@pytest.mark.parametrize("nan_mode", ["Min", "Max"])
+@pytest.mark.parametrize("train_missing", [0.0, 0.2])
+def test_catboost_nan_rows(nan_mode, train_missing):
+    X, y = make_data(missing=train_missing)
+    model = CatBoostClassifier(iterations=50, depth=4, nan_mode=nan_mode, verbose=False,
+                               allow_writing_files=False).fit(X, y)
+    X_test, _ = make_data(n_rows=500, missing=0.3, seed=1)
+    assert_same_proba(model, X_test)
+
+
+@pytest.mark.parametrize("model", [RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0),
+                                   GradientBoostingClassifier(n_estimators=20, random_state=0)])
+def test_sklearn(model):
+    X, y = make_data()
+    model.fit(X, y)
+    X_test, _ = make_data(n_rows=500, seed=1)
+    assert_same_proba(model, X_test)
+
+
+def test_nan_block_after_dense_block():
+    X, y = make_data()
+    model = XGBClassifier(n_estimators=50, max_depth=4).fit(X, y)
+    X_test, _ = make_data(n_rows=500, seed=1)
+    X_test[400:, 0] = np.nan
+    compiled = compile_tree_ensemble(model)
+    # blocks of 100 rows, only the last block holds missing values
+    np.testing.assert_allclose(compiled.predict_proba(X_test, block_size=100 * compiled.n_trees),
+                               model.predict_proba(X_test), atol=1e-5)
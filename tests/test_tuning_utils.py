@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from visa.utils.main_utils import load_numpy_array_data, save_numpy_array_data
+from visa.utils.tuning_utils import SuccessiveHalvingSearch, get_fold_cache, init_trial_worker, run_trial
+
+
+@pytest.fixture
+def training_files(tmp_path, preprocessor, visa_dataframe, visa_target):
+    features_file_path, labels_file_path = str(tmp_path / "train.npy"), str(tmp_path / "train_labels.npy")
+    save_numpy_array_data(features_file_path, np.asarray(preprocessor.transform(visa_dataframe), dtype=np.float32))
+    save_numpy_array_data(labels_file_path, np.asarray(visa_target, dtype=np.int8))
+    return features_file_path, labels_file_path
+
+
+def test_folds_resampled_inside_training_rows(tmp_path, training_files, visa_target):
+    fold_cache = get_fold_cache(*training_files, cache_dir=str(tmp_path / "folds"), n_folds=3,
+                                resampling_strategy="random_under")
+    features = load_numpy_array_data(training_files[0])
+    validation_rows = []
+    for fold in fold_cache["folds"]:
+        train_labels = load_numpy_array_data(fold["train_labels"])
+        validation_features = load_numpy_array_data(fold["validation"])
+        assert np.mean(train_labels) == pytest.approx(0.5)
+        # the validation rows are original rows with the class distribution of the data
+        assert np.mean(load_numpy_array_data(fold["validation_labels"])) == pytest.approx(np.mean(visa_target), abs=0.01)
+        validation_rows.extend(map(bytes, validation_features))
+        assert set(map(bytes, load_numpy_array_data(fold["train"]))).isdisjoint(map(bytes, validation_features))
+    assert sorted(validation_rows) == sorted(map(bytes, features))
+    assert fold_cache["n_train_rows"] == min(len(load_numpy_array_data(fold["train_labels"])) for fold in fold_cache["folds"])
+    assert get_fold_cache(*training_files, cache_dir=str(tmp_path / "folds"), n_folds=3,
+                          resampling_strategy="random_under") == fold_cache
+
+
+def test_search_runs_trials_on_fold_blocks(tmp_path, training_files):
+    fold_cache = get_fold_cache(*training_files, cache_dir=str(tmp_path / "folds"), n_folds=3)
+    candidate = {"name": "LogisticRegression", "class": "LogisticRegression", "module": "sklearn.linear_model",
+                 "params": {"max_iter": 200}, "early_stopping_rounds": 0}
+    init_trial_worker(class_weight=None)
+    search = SuccessiveHalvingSearch(candidate, param_grid={"C": [0.01, 0.1, 1.0, 10.0]}, fold_cache=fold_cache,
+                                     min_resources=200, factor=2, max_configurations=4, method="successive_halving",
+                                     run_trials=lambda trials: [run_trial(trial) for trial in trials], checkpoint_trials={})
+    result = search.search()
+    assert search.max_resources == fold_cache["n_train_rows"]
+    assert result["brackets"][0]["rungs"][-1]["resource"] == fold_cache["n_train_rows"]
+    assert result["best_params"]["C"] in (0.01, 0.1, 1.0, 10.0) and 0 <= result["best_score"] <= 1
+
+
+@pytest.mark.parametrize("max_resources", [243, 1000])
+def test_brackets_reach_max_resources_on_last_rung(max_resources):
+    fold_cache = {"key": "folds", "n_train_rows": max_resources, "folds": [{"train": "", "train_labels": "",
+                                                                             "validation": "", "validation_labels": ""}]}
+    candidate = {"name": "Fake", "module": "fake", "class": "Fake", "params": {}, "early_stopping_rounds": 0}
+    run_trials = lambda trials: [{"key": trial["key"], "config": trial["config"], "score": trial["config"] / 1000}
+                                 for trial in trials]
+    # 243 = 3 ** 5, where math.log(243, 3) rounds to 4.999...
+    search = SuccessiveHalvingSearch(candidate, param_grid={"a": list(range(243))}, fold_cache=fold_cache,
+                                     min_resources=1, factor=3, max_configurations=243, method="hyperband",
+                                     run_trials=run_trials, checkpoint_trials={})
+    brackets = search.get_brackets()
+    assert len(brackets) == (6 if max_resources == 243 else 7)
+    assert brackets[0][1] == -(-max_resources // 3 ** (len(brackets) - 1))
+    result = search.search()
+    if max_resources == 243:
+        assert [bracket["rungs"][-1]["resource"] for bracket in result["brackets"]] == [243] * 6
+    for bracket in result["brackets"]:
+        resources = [rung["resource"] for rung in bracket["rungs"]]
+        # a bracket stops early only once a single configuration is left
+        assert resources[-1] == max_resources or bracket["rungs"][-1]["n_configurations"] == 1
+        assert all(resource * 3 >= next_resource for resource, next_resource in zip(resources, resources[1:]))
+        assert len(set(resources)) == len(resources)
+
+    search.method = "successive_halving"
+    assert search.get_brackets() == [(243, -(-max_resources // 243))]
+    assert len(search.search()["brackets"][0]["rungs"]) == 6
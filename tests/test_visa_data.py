@@ -0,0 +1,51 @@
+import mongomock
+import pandas as pd
+import pytest
+
+from conftest import make_visa_dataframe
+from visa.configuration.mongo_db_connection import MongoDBClient
+from visa.constants import DATABASE_NAME
+from visa.data_access.visa_data import VisaData, concat_chunks
+
+
+@pytest.fixture
+def visa_data(monkeypatch):
+    monkeypatch.setattr(MongoDBClient, "client", mongomock.MongoClient())
+    return VisaData()
+
+
+def insert_records(visa_data: VisaData, collection_name: str, n_rows: int) -> None:
+    if n_rows:
+        records = make_visa_dataframe(n_rows).astype(object).to_dict("records")
+        visa_data.mongo_client.client[DATABASE_NAME][collection_name].insert_many(records)
+
+
+def export(chunks) -> pd.DataFrame:
+    chunks = list(chunks)
+    return concat_chunks(chunks) if chunks else pd.DataFrame()
+
+
+@pytest.mark.parametrize("n_rows", [0, 7, 400])
+@pytest.mark.parametrize("n_workers, partition_size", [(2, 100), (4, 64), (3, 7), (8, 5000)])
+def test_partitioned_export_equals_single_cursor(visa_data, n_rows, n_workers, partition_size):
+    insert_records(visa_data, "visa", n_rows)
+    expected = export(visa_data.iter_collection_chunks("visa", batch_size=50))
+    partitioned = export(visa_data.iter_collection_partitions("visa", n_workers=n_workers,
+                                                              partition_size=partition_size, batch_size=50))
+    assert len(expected) == n_rows
+    pd.testing.assert_frame_equal(partitioned, expected, check_categorical=False)
+    if n_rows:
+        assert partitioned["case_id"].tolist() == [f"EZYV{i}" for i in range(n_rows)]
+
+
+def test_partition_ranges_cover_collection(visa_data):
+    insert_records(visa_data, "visa", 250)
+    ranges = visa_data.get_partition_ranges("visa", partition_size=100)
+    assert len(ranges) == 3
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    assert all(upper == lower for (_, upper), (lower, _) in zip(ranges[:-1], ranges[1:]))
+
+
+def test_collection_smaller_than_partition(visa_data):
+    insert_records(visa_data, "visa", 10)
+    assert visa_data.get_partition_ranges("visa", partition_size=100) == [(None, None)]
@@ -1,13 +1,20 @@
 import os
 import sys
-from pandas import DataFrame
-from sklearn.model_selection import train_test_split
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
 
 from visa.entity.config_entity import DataIngestionConfig
 from visa.entity.artifact_entity import DataIngestionArtifact
 from visa.exception import USVisaException
 from visa.logger import logging
 from visa.data_access.visa_data import VisaData
+from visa.constants import SCHEMA_FILE_PATH
+from visa.utils.main_utils import (read_yaml_file, write_yaml_file, read_dataframe, iter_dataframe_chunks,
+                                   DataFrameChunkWriter)
 
 
 class DataIngestion:
@@ -20,48 +27,214 @@ class DataIngestion:
         try:
             logging.info(f"{'>>'*20} Data Ingestion {'<<'*20}")
             self.data_ingestion_config = data_ingestion_config
+            self._schema_config = read_yaml_file(SCHEMA_FILE_PATH)
         except Exception as e:
             raise USVisaException(e, sys) from e
         
         
-    def export_data_into_feature_store(self) -> DataFrame:
+    def export_data_into_feature_store(self) -> list:
         """
-            This function exports the data from MongoDB collection to a feature store as a pandas dataframe.
-            Output           :  DataFrame containing the data from MongoDB collection
+            This function streams the data from MongoDB collection into the feature store file chunk by chunk,
+            so the collection is never held in memory.
+            Output           :  list with the feature store file path, empty when the collection has no records
             on Failure       :  raise exception
         """
         try:
             logging.info(f"Exporting data from collection: {self.data_ingestion_config.collection_name} to feature store.")
             visa_data = VisaData()
-            visa_dataframe = visa_data.export_collection_as_dataframe(collection_name=self.data_ingestion_config.collection_name)
-            logging.info(f"Shape of the exported dataframe: {visa_dataframe.shape}")
-            feature_store_dir = os.path.dirname(self.data_ingestion_config.feature_store_file_path)
-            os.makedirs(feature_store_dir, exist_ok=True)
-            visa_dataframe.to_csv(self.data_ingestion_config.feature_store_file_path, index=False)
-            logging.info(f"Data exported to feature store at: {self.data_ingestion_config.feature_store_file_path}")
-            return visa_dataframe
+
+            if self.data_ingestion_config.export_workers > 1:
+                logging.info(f"Exporting collection in parallel with {self.data_ingestion_config.export_workers} workers.")
+                chunk_iterator = visa_data.iter_collection_partitions(collection_name=self.data_ingestion_config.collection_name,
+                                                                      n_workers=self.data_ingestion_config.export_workers,
+                                                                      partition_size=self.data_ingestion_config.partition_size,
+                                                                      batch_size=self.data_ingestion_config.batch_size)
+            else:
+                chunk_iterator = visa_data.iter_collection_chunks(collection_name=self.data_ingestion_config.collection_name,
+                                                                  batch_size=self.data_ingestion_config.batch_size)
+
+            feature_store_file_path = self.data_ingestion_config.feature_store_file_path
+            if os.path.exists(feature_store_file_path):
+                os.remove(feature_store_file_path)
+            with DataFrameChunkWriter(feature_store_file_path) as feature_store_writer:
+                for chunk in chunk_iterator:
+                    feature_store_writer.write(chunk)
+
+            logging.info(f"Exported {feature_store_writer.n_rows} records to feature store at: {feature_store_file_path}")
+            return [feature_store_file_path] if feature_store_writer.n_rows else []
         except Exception as e:
             raise USVisaException(e, sys) from e
         
-    def split_data_as_train_test(self, dataframe: DataFrame) -> None:
+    def list_feature_store_parts(self) -> list:
         """
-            This function splits the dataframe into training and testing data and saves them in the ingested directory.
-            Output           :  DataIngestionArtifact containing the file paths of the ingested training and testing data
+            This function lists the part files of the persistent feature store in the order they were written.
+            Output           :  list of part file paths, empty when the feature store does not exist yet
+            on Failure       :  raise exception
+        """
+        try:
+            feature_store_dir = self.data_ingestion_config.persistent_feature_store_dir
+            if not os.path.isdir(feature_store_dir):
+                return []
+            return [os.path.join(feature_store_dir, file_name) for file_name in sorted(os.listdir(feature_store_dir))
+                    if file_name.startswith("part-")]
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def read_watermark(self) -> Optional[Any]:
+        """
+            This function reads the "_id" of the last record ingested into the persistent feature store.
+            Output           :  last ingested "_id", or None when no watermark or feature store exists yet
+            on Failure       :  raise exception
+        """
+        try:
+            if not (os.path.exists(self.data_ingestion_config.watermark_file_path) and self.list_feature_store_parts()):
+                return None
+            watermark = read_yaml_file(self.data_ingestion_config.watermark_file_path)
+            last_id = watermark["last_id"]
+            return ObjectId(last_id) if watermark.get("is_object_id", False) else last_id
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def write_watermark(self, last_id: Any, n_rows: int, n_parts: int) -> None:
+        """
+            This function records the "_id" of the last ingested record next to the persistent feature store.
+            Output           :  None
+            on Failure       :  raise exception
+        """
+        try:
+            is_object_id = isinstance(last_id, ObjectId)
+            write_yaml_file(file_path=self.data_ingestion_config.watermark_file_path,
+                            content={"last_id": str(last_id) if is_object_id else last_id,
+                                     "is_object_id": is_object_id,
+                                     "n_rows": int(n_rows),
+                                     "n_parts": int(n_parts),
+                                     "updated_at": datetime.now().isoformat()},
+                            replace=True)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def rewrite_feature_store_part(self, file_path: str, drop_values: np.ndarray) -> int:
+        """
+            This function rewrites a part file of the persistent feature store chunk by chunk without the rows whose
+            deduplication_column value is in drop_values, through a temporary file, and deletes it when nothing is
+            left.
+            Output           :  number of rows left in the part
+            on Failure       :  raise exception
+        """
+        try:
+            dedup_column = self.data_ingestion_config.deduplication_column
+            temp_file_path = os.path.join(os.path.dirname(file_path), f".tmp-{os.path.basename(file_path)}")
+            with DataFrameChunkWriter(temp_file_path) as part_writer:
+                for chunk in iter_dataframe_chunks(file_path, self.data_ingestion_config.batch_size,
+                                                   schema_config=self._schema_config):
+                    chunk = chunk[~chunk[dedup_column].isin(drop_values)]
+                    if len(chunk):
+                        part_writer.write(chunk)
+            if part_writer.n_rows:
+                os.replace(temp_file_path, file_path)
+            else:
+                os.remove(file_path)
+            return part_writer.n_rows
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def export_incremental_data_into_feature_store(self) -> list:
+        """
+            This function fetches only the records inserted after the stored watermark and adds them to the
+            persistent feature store, a directory of part files, keeping the latest record for each
+            deduplication_column value.
+            The new records are streamed into a new part file, holding only their deduplication_column values in
+            memory. Existing parts are only rewritten, chunk by chunk, when they hold a deduplication_column value of
+            the new records, without those rows, and deleted when nothing is left.
+            The parts are written before the watermark is advanced, so an interrupted run is simply re-fetched and
+            deduplicated by the next one.
+            Output           :  list of the part file paths of the feature store, empty when it has no records
+            on Failure       :  raise exception
+        """
+        try:
+            feature_store_dir = self.data_ingestion_config.persistent_feature_store_dir
+            dedup_column = self.data_ingestion_config.deduplication_column
+            last_id = self.read_watermark()
+            logging.info(f"Incremental export from collection: {self.data_ingestion_config.collection_name} after watermark: {last_id}")
+
+            part_file_paths = self.list_feature_store_parts()
+            part_index = int(os.path.basename(part_file_paths[-1]).split("-")[1].split(".")[0]) + 1 if part_file_paths else 0
+            part_file_path = os.path.join(feature_store_dir, f"part-{part_index:06d}.{self.data_ingestion_config.file_format}")
+            temp_file_path = os.path.join(feature_store_dir, f".tmp-{os.path.basename(part_file_path)}")
+            os.makedirs(feature_store_dir, exist_ok=True)
+            visa_data = VisaData()
+            delta_values = []
+            with DataFrameChunkWriter(temp_file_path) as delta_writer:
+                for chunk in visa_data.iter_collection_chunks(collection_name=self.data_ingestion_config.collection_name,
+                                                              batch_size=self.data_ingestion_config.batch_size,
+                                                              after_id=last_id, keep_id=True):
+                    chunk_last_id = chunk["_id"].max()
+                    last_id = chunk_last_id if last_id is None or chunk_last_id > last_id else last_id
+                    delta_writer.write(chunk.drop(columns="_id"))
+                    delta_values.append(chunk[dedup_column].astype(object).to_numpy())
+            logging.info(f"Fetched {delta_writer.n_rows} new records from the collection.")
+
+            if delta_writer.n_rows:
+                delta_values = pd.Series(np.concatenate(delta_values))
+                if delta_values.duplicated().any():
+                    # keep the last record of a deduplication_column value fetched more than once
+                    is_last = ~delta_values.duplicated(keep="last").to_numpy()
+                    offset = 0
+                    dedup_file_path = os.path.join(feature_store_dir, f".dedup-{os.path.basename(part_file_path)}")
+                    with DataFrameChunkWriter(dedup_file_path) as dedup_writer:
+                        for chunk in iter_dataframe_chunks(temp_file_path, self.data_ingestion_config.batch_size,
+                                                           schema_config=self._schema_config):
+                            dedup_writer.write(chunk[is_last[offset:offset + len(chunk)]])
+                            offset += len(chunk)
+                    os.replace(dedup_file_path, temp_file_path)
+                drop_values = delta_values.unique()
+                n_replaced = 0
+                for file_path in part_file_paths:
+                    is_overlapping = read_dataframe(file_path, columns=[dedup_column])[dedup_column].astype(object).isin(drop_values)
+                    if is_overlapping.any():
+                        n_replaced += int(is_overlapping.sum())
+                        self.rewrite_feature_store_part(file_path, drop_values)
+                os.replace(temp_file_path, part_file_path)
+                part_file_paths = self.list_feature_store_parts()
+                n_rows = sum(len(read_dataframe(file_path, columns=[dedup_column])) for file_path in part_file_paths)
+                logging.info(f"Wrote {len(drop_values)} records to feature store part: {part_file_path}, replacing "
+                             f"{n_replaced} records with the same {dedup_column}")
+                self.write_watermark(last_id=last_id, n_rows=n_rows, n_parts=len(part_file_paths))
+
+            logging.info(f"Feature store at: {feature_store_dir} has {len(part_file_paths)} parts, watermark: {last_id}")
+            return part_file_paths
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def split_data_as_train_test(self, file_paths: list) -> Tuple[int, int]:
+        """
+            This function splits the feature store files into training and testing data chunk by chunk and writes
+            them to the ingested directory, so the data is never held in memory. The testing rows of every chunk are
+            drawn at random, as many as keep the testing share of all rows read so far at train_test_split_ratio.
+            Output           :  number of training and testing rows
             on Failure       :  raise exception
         """
         try:
             logging.info(f"Splitting data into train and test sets with test size: {self.data_ingestion_config.train_test_split_ratio}")
-            train_set, test_set = train_test_split(dataframe, test_size=self.data_ingestion_config.train_test_split_ratio, random_state=42)
-            logging.info(f"Train set shape: {train_set.shape}, Test set shape: {test_set.shape}")
-            
-            ingested_dir = os.path.dirname(self.data_ingestion_config.training_file_path)
-            os.makedirs(ingested_dir, exist_ok=True)
-            
-            train_set.to_csv(self.data_ingestion_config.training_file_path, index=False,header=True)
-            test_set.to_csv(self.data_ingestion_config.testing_file_path, index=False,header=True)
-            
+            random_generator = np.random.default_rng(42)
+            n_rows = 0
+            with DataFrameChunkWriter(self.data_ingestion_config.training_file_path) as train_writer, \
+                    DataFrameChunkWriter(self.data_ingestion_config.testing_file_path) as test_writer:
+                for file_path in file_paths:
+                    for chunk in iter_dataframe_chunks(file_path, self.data_ingestion_config.batch_size,
+                                                       schema_config=self._schema_config):
+                        n_rows += len(chunk)
+                        n_test_rows = round(n_rows * self.data_ingestion_config.train_test_split_ratio) - test_writer.n_rows
+                        is_test = np.zeros(len(chunk), dtype=bool)
+                        is_test[random_generator.choice(len(chunk), size=min(max(n_test_rows, 0), len(chunk)), replace=False)] = True
+                        if not is_test.all():
+                            train_writer.write(chunk[~is_test])
+                        if is_test.any():
+                            test_writer.write(chunk[is_test])
+            logging.info(f"Train set rows: {train_writer.n_rows}, Test set rows: {test_writer.n_rows}")
             logging.info(f"Training data saved at: {self.data_ingestion_config.training_file_path}")
             logging.info(f"Testing data saved at: {self.data_ingestion_config.testing_file_path}")
+            return train_writer.n_rows, test_writer.n_rows
             
         except Exception as e:
             raise USVisaException(e, sys) from e
@@ -74,10 +247,17 @@ class DataIngestion:
             on Failure       :  raise exception
         """
         try:
-            dataframe = self.export_data_into_feature_store()
+            if self.data_ingestion_config.incremental:
+                feature_store_file_paths = self.export_incremental_data_into_feature_store()
+            else:
+                feature_store_file_paths = self.export_data_into_feature_store()
+            if not feature_store_file_paths:
+                raise ValueError(f"Collection: {self.data_ingestion_config.collection_name} has no records"
+                                 f"{' and the feature store is empty' if self.data_ingestion_config.incremental else ''}, "
+                                 f"there is nothing to split into train and test sets")
             logging.info("Exported data from MongoDB collection to feature store successfully.")
             
-            self.split_data_as_train_test(dataframe=dataframe)
+            self.split_data_as_train_test(file_paths=feature_store_file_paths)
             logging.info("Split data into train and test sets and saved them successfully.")
             
             data_ingestion_artifact = DataIngestionArtifact(
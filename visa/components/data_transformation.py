@@ -1,20 +1,28 @@
+import os
 import sys
+import time
+from typing import Optional, Tuple
 import pandas as pd
 import numpy as np
+from scipy import sparse
 
-from imblearn.combine import SMOTETomek, SMOTEENN
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder,PowerTransformer
 from sklearn.compose import ColumnTransformer
+from sklearn.model_selection import train_test_split
 
 from visa.components.data_validation import DataValidation
-from visa.constants import TARGET_COLUMN, CURRENT_YEAR,SCHEMA_FILE_PATH
+from visa.constants import TARGET_COLUMN, SCHEMA_FILE_PATH
 from visa.entity.config_entity import DataTransformationConfig
 from visa.entity.artifact_entity import DataIngestionArtifact, DataTransformationArtifact,DataValidationArtifact
 from visa.exception import USVisaException
 from visa.logger import logging
-from visa.utils.main_utils import save_object,load_object,save_numpy_array_data,write_yaml_file,read_yaml_file,drop_columns
-from visa.entity.estimator import TargetValueMapping
+from visa.utils.main_utils import save_object,load_object,save_numpy_array_data,write_yaml_file,read_yaml_file,read_dataframe,get_schema_dtypes,run_in_background,StratifiedReservoirSampler,\
+    iter_dataframe_chunks,load_numpy_array_data,wait_for_background_tasks
+from visa.entity.estimator import TargetValueMapping, FeatureEngineer, CompiledPreprocessor
+from visa.utils.resampling_utils import resample, estimate_resampling_seconds
+from visa.utils.stage_cache import link_or_copy
 
 
 class DataTransformation:
@@ -30,9 +38,9 @@ class DataTransformation:
             raise USVisaException(e, sys) from e
         
     @staticmethod
-    def read_data(file_path) -> pd.DataFrame:
+    def read_data(file_path, columns: list = None, schema_config: dict = None) -> pd.DataFrame:
         try:
-            return pd.read_csv(file_path)
+            return read_dataframe(file_path, columns=columns, schema_config=schema_config)
         except Exception as e:
             raise USVisaException(e, sys) from e
         
@@ -40,7 +48,9 @@ class DataTransformation:
     def get_data_transformer_object(self) -> Pipeline:
         """
         Method Name :   get_data_transformer_object
-        Description :   This method creates and returns a data transformer object for the data
+        Description :   This method creates and returns a data transformer object for the data.
+                        The FeatureEngineer step derives company_age and drops the unused columns, so the
+                        returned pipeline takes the raw dataframe.
         
         Output      :   data transformer object is created and returned 
         On Failure  :   Write an exception log and then raise an exception
@@ -68,14 +78,21 @@ class DataTransformation:
             transform_pipe = Pipeline(steps=[
                 ('transformer', PowerTransformer(method='yeo-johnson'))
             ])
-            preprocessor = ColumnTransformer(
+            column_transformer = ColumnTransformer(
                 [
                     ("OneHotEncoder", oh_transformer, oh_columns),
                     ("Ordinal_Encoder", ordinal_encoder, or_columns),
                     ("Transformer", transform_pipe, transform_columns),
                     ("StandardScaler", numeric_transformer, num_features)
-                ]
+                ],
+                sparse_threshold=1.0 if self.data_transformation_config.sparse_output else 0.0,
+                n_jobs=self.data_transformation_config.preprocessor_n_jobs
             )
+            feature_engineer = FeatureEngineer(drop_columns=tuple(self._schema_config['drop_columns']) + (TARGET_COLUMN,))
+            preprocessor = Pipeline(steps=[
+                ('FeatureEngineer', feature_engineer),
+                ('ColumnTransformer', column_transformer)
+            ])
 
             logging.info("Created preprocessor object from ColumnTransformer")
 
@@ -88,107 +105,519 @@ class DataTransformation:
             raise USVisaException(e, sys) from e
         
         
-    def initiate_data_transformation(self, ) -> DataTransformationArtifact:
+    def get_encoder_categories(self, category_sets: dict) -> dict:
         """
-        Method Name :   initiate_data_transformation
-        Description :   This method initiates the data transformation component for the pipeline 
-        
-        Output      :   data transformer steps are performed and preprocessor object is created  
+        Method Name :   get_encoder_categories
+        Description :   This method returns the sorted categories of the encoded columns as observed in the full data,
+                        the same vocabularies the encoders learn from it, as preprocessor parameters. The category
+                        sets are collected from the full data, in one go or merged over chunks, so they stay complete
+                        when the rest of the preprocessor is fitted on a sample that could miss rare categories.
+
+        Output      :   dict of preprocessor parameters
         On Failure  :   Write an exception log and then raise an exception
         """
         try:
-            if self.data_validation_artifact.validation_status:
-                logging.info(f"{'>>'*20} Data Transformation {'<<'*20}")
-                preprocessor = self.get_data_transformer_object()
-                logging.info("Got the preprocessor object")
-
-                train_df = DataTransformation.read_data(file_path=self.data_ingestion_artifact.trained_file_path)
-                test_df = DataTransformation.read_data(file_path=self.data_ingestion_artifact.test_file_path)
-
-                input_feature_train_df = train_df.drop(columns=[TARGET_COLUMN], axis=1)
-                target_feature_train_df = train_df[TARGET_COLUMN]
-
-                logging.info("Got train features and test features of Training dataset")
-
-                input_feature_train_df['company_age'] = CURRENT_YEAR-input_feature_train_df['yr_of_estab']
-
-                logging.info("Added company_age column to the Training dataset")
-
-                drop_cols = self._schema_config['drop_columns']
-
-                logging.info("drop the columns in drop_cols of Training dataset")
-
-                input_feature_train_df = drop_columns(df=input_feature_train_df, columns = drop_cols)
-                
-                target_feature_train_df = target_feature_train_df.replace(
-                    TargetValueMapping()._asdict()
-                )
-
-
-                input_feature_test_df = test_df.drop(columns=[TARGET_COLUMN], axis=1)
-
-                target_feature_test_df = test_df[TARGET_COLUMN]
-
-
-                input_feature_test_df['company_age'] = CURRENT_YEAR-input_feature_test_df['yr_of_estab']
-
-                logging.info("Added company_age column to the Test dataset")
-
-                input_feature_test_df = drop_columns(df=input_feature_test_df, columns = drop_cols)
-
-                logging.info("drop the columns in drop_cols of Test dataset")
-
-                target_feature_test_df = target_feature_test_df.replace(
-                TargetValueMapping()._asdict()
-                )
-
-                logging.info("Got train features and test features of Testing dataset")
-
-                logging.info(
-                    "Applying preprocessing object on training dataframe and testing dataframe"
-                )
+            params = {}
+            for step_name, columns in (("OneHotEncoder", self._schema_config['oh_columns']),
+                                       ("Ordinal_Encoder", self._schema_config['or_columns'])):
+                params[f"ColumnTransformer__{step_name}__categories"] = [
+                    np.array(sorted(category_sets[column]), dtype=object) for column in columns
+                ]
+            return params
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                input_feature_train_arr = preprocessor.fit_transform(input_feature_train_df)
+    def get_category_sets(self, dataframe: pd.DataFrame) -> dict:
+        """
+        Method Name :   get_category_sets
+        Description :   This method returns the set of values of every encoded column of the dataframe. Categorical
+                        columns are scanned through their codes, so this is cheap on large data.
 
-                logging.info(
-                    "Used the preprocessor object to fit transform the train features"
-                )
+        Output      :   dict of column name to set of values
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            return {column: set(dataframe[column].dropna().unique().tolist())
+                    for column in self._schema_config['oh_columns'] + self._schema_config['or_columns']}
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                input_feature_test_arr = preprocessor.transform(input_feature_test_df)
+    @staticmethod
+    def get_fitted_parameters(preprocessor: Pipeline) -> dict:
+        """
+        Method Name :   get_fitted_parameters
+        Description :   This method collects the fitted statistics of the preprocessor branches: Yeo-Johnson lambdas,
+                        scaler means and scales and encoder categories.
 
-                logging.info("Used the preprocessor object to transform the test features")
+        Output      :   dict of parameter name to fitted values
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            parameters = {}
+            for name, transformer in preprocessor.named_steps['ColumnTransformer'].named_transformers_.items():
+                estimators = transformer.steps if isinstance(transformer, Pipeline) else [(name, transformer)]
+                for _, estimator in estimators:
+                    for attribute in ("lambdas_", "mean_", "scale_"):
+                        if hasattr(estimator, attribute):
+                            parameters[f"{name}.{attribute}"] = np.asarray(getattr(estimator, attribute), dtype=np.float64)
+                    if hasattr(estimator, "_scaler"):
+                        parameters[f"{name}.standardize_mean_"] = estimator._scaler.mean_
+                        parameters[f"{name}.standardize_scale_"] = estimator._scaler.scale_
+                    if hasattr(estimator, "categories_"):
+                        parameters[f"{name}.categories_"] = [category.tolist() for category in estimator.categories_]
+            return parameters
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                logging.info("Applying SMOTEENN on Training dataset")
+    def get_validation_mask(self, target: np.ndarray) -> np.ndarray:
+        """
+        Method Name :   get_validation_mask
+        Description :   This method draws the stratified validation_split of the training rows the candidate models are
+                        selected on. The rows are held out before the preprocessor is fitted and the training rows are
+                        resampled, so the validation data keeps the original class distribution and the testing data
+                        is left for the evaluation of the selected model.
 
-                smt = SMOTEENN(sampling_strategy="minority")
+        Output      :   boolean mask of the validation rows
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            _, validation_index = train_test_split(np.arange(len(target)), test_size=self.data_transformation_config.validation_split,
+                                                   stratify=target, random_state=42)
+            validation_mask = np.zeros(len(target), dtype=bool)
+            validation_mask[validation_index] = True
+            return validation_mask
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                input_feature_train_final, target_feature_train_final = smt.fit_resample(
-                    input_feature_train_arr, target_feature_train_df
-                )
+    def fit_preprocessor(self, preprocessor: Pipeline, train_df: pd.DataFrame):
+        """
+        Method Name :   fit_preprocessor
+        Description :   This method fits the preprocessor and transforms the full training data. The ColumnTransformer
+                        branches are fitted in parallel with preprocessor_n_jobs. When the training data has more rows
+                        than preprocessor_fit_sample_size, the lambdas and moments are estimated from a stratified
+                        reservoir sample of that size and the encoder vocabularies from the full data.
+                        With preprocessor_fit_check the preprocessor is also fitted on the full data and the deviation
+                        of every fitted parameter is written to the preprocessor fit report.
+
+        Output      :   transformed training features
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            sample_size = self.data_transformation_config.preprocessor_fit_sample_size
+            fit_report = {"n_rows": int(len(train_df)), "n_jobs": self.data_transformation_config.preprocessor_n_jobs}
+            if sample_size and len(train_df) > sample_size:
+                start_time = time.perf_counter()
+                preprocessor.set_params(**self.get_encoder_categories(self.get_category_sets(train_df)))
+                sampler = StratifiedReservoirSampler(sample_size=sample_size, stratify_column=TARGET_COLUMN)
+                sampler.update(train_df)
+                fit_df = sampler.sample()
+                fit_report["sample_seconds"] = time.perf_counter() - start_time
+                start_time = time.perf_counter()
+                preprocessor.fit(fit_df)
+                fit_report["fit_seconds"] = time.perf_counter() - start_time
+                start_time = time.perf_counter()
+                transformed_features = preprocessor.transform(train_df)
+                fit_report["transform_seconds"] = time.perf_counter() - start_time
+            else:
+                fit_df = train_df
+                start_time = time.perf_counter()
+                transformed_features = preprocessor.fit_transform(train_df)
+                fit_report["fit_transform_seconds"] = time.perf_counter() - start_time
+            fit_report["fit_rows"] = int(len(fit_df))
+            logging.info(f"Fitted the preprocessor on {len(fit_df)} of {len(train_df)} training rows")
+
+            if self.data_transformation_config.preprocessor_fit_check and fit_df is not train_df:
+                full_preprocessor = self.get_data_transformer_object()
+                start_time = time.perf_counter()
+                full_preprocessor.fit(train_df)
+                fit_report["full_fit_seconds"] = time.perf_counter() - start_time
+                sample_parameters = self.get_fitted_parameters(preprocessor)
+                full_parameters = self.get_fitted_parameters(full_preprocessor)
+                deviation = {}
+                for name, full_values in full_parameters.items():
+                    if name.endswith("categories_"):
+                        deviation[name] = {"equal": sample_parameters[name] == full_values}
+                        continue
+                    absolute_deviation = np.abs(sample_parameters[name] - full_values)
+                    deviation[name] = {"max_abs_deviation": float(absolute_deviation.max()),
+                                       "max_rel_deviation": float((absolute_deviation / np.maximum(np.abs(full_values), 1e-12)).max())}
+                fit_report["deviation_from_full_fit"] = deviation
+
+            write_yaml_file(self.data_transformation_config.preprocessor_fit_report_file_path, content=fit_report, replace=True)
+            return transformed_features
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                logging.info("Applied SMOTEENN on training dataset")
+    def resample_training_data(self, features: np.ndarray, target: np.ndarray,
+                               fallback_reason: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Method Name :   resample_training_data
+        Description :   This method balances the transformed training data with the configured resampling strategy.
+                        When the data has more rows than resampling_max_rows, or the strategy is estimated from timed
+                        pilot samples to take longer than resampling_time_budget seconds, the fallback strategy is used.
+                        A fallback_reason given by the caller selects the fallback strategy without checking the budgets.
+                        The strategy used with its settings, the class counts and the class weights of "class_weight"
+                        are written to the resampling report, so the model tuner can resample its CV folds the same way.
+
+        Output      :   resampled features and target
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            strategy = self.data_transformation_config.resampling_strategy
+            estimated_seconds = None
+            if fallback_reason is None and len(target) > self.data_transformation_config.resampling_max_rows:
+                fallback_reason = f"{len(target)} rows exceed the row budget of {self.data_transformation_config.resampling_max_rows}"
+            elif fallback_reason is None and self.data_transformation_config.resampling_time_budget:
+                estimated_seconds = estimate_resampling_seconds(strategy, features, target,
+                                                                pilot_rows=self.data_transformation_config.resampling_pilot_rows,
+                                                                n_jobs=self.data_transformation_config.resampling_n_jobs,
+                                                                nn_algorithm=self.data_transformation_config.resampling_nn_algorithm)
+                if estimated_seconds > self.data_transformation_config.resampling_time_budget:
+                    fallback_reason = f"estimated {estimated_seconds:.0f}s exceed the time budget of " \
+                                      f"{self.data_transformation_config.resampling_time_budget}s"
+            if fallback_reason is not None:
+                strategy = self.data_transformation_config.resampling_fallback_strategy
+                logging.info(f"Falling back to resampling strategy: {strategy} as {fallback_reason}")
+
+            logging.info(f"Applying resampling strategy: {strategy} on {len(target)} training rows")
+            start_time = time.perf_counter()
+            features_resampled, target_resampled, class_weight = resample(
+                strategy, features, target,
+                n_jobs=self.data_transformation_config.resampling_n_jobs,
+                nn_algorithm=self.data_transformation_config.resampling_nn_algorithm,
+                working_memory=self.data_transformation_config.resampling_working_memory)
+            seconds = time.perf_counter() - start_time
+
+            classes_before, counts_before = np.unique(target, return_counts=True)
+            classes_after, counts_after = np.unique(target_resampled, return_counts=True)
+            resampling_report = {
+                "strategy": self.data_transformation_config.resampling_strategy,
+                "applied_strategy": strategy,
+                "fallback_reason": fallback_reason,
+                "estimated_seconds": estimated_seconds,
+                "seconds": seconds,
+                "rows_before": int(len(target)),
+                "rows_after": int(len(target_resampled)),
+                "class_counts_before": {classes_before[i].item(): int(counts_before[i]) for i in range(len(classes_before))},
+                "class_counts_after": {classes_after[i].item(): int(counts_after[i]) for i in range(len(classes_after))},
+                "class_weight": class_weight,
+                "n_jobs": self.data_transformation_config.resampling_n_jobs,
+                "nn_algorithm": self.data_transformation_config.resampling_nn_algorithm,
+                "working_memory": self.data_transformation_config.resampling_working_memory,
+            }
+            write_yaml_file(self.data_transformation_config.resampling_report_file_path, content=resampling_report, replace=True)
+            logging.info(f"Applied resampling strategy: {strategy} in {seconds:.2f}s, rows: {len(target)} -> {len(target_resampled)}")
+            return features_resampled, target_resampled
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                logging.info("Applying SMOTEENN on testing dataset")
+    def transform_in_chunks(self, preprocessor: Pipeline, columns: list) -> Tuple[np.ndarray, ...]:
+        """
+        Method Name :   transform_in_chunks
+        Description :   This method fits the preprocessor and transforms the training and testing files out of core,
+                        streaming them in chunks of chunk_size rows, so the peak memory is bounded by the chunk size
+                        and preprocessor_fit_sample_size instead of the dataset size.
+                        A first pass reads the training labels only and draws the validation rows. The next pass over
+                        the training file merges the encoder category sets, the exact mean and variance of the scaled
+                        columns and the label counts of the chunks without the validation rows, and keeps a stratified
+                        reservoir sample the Yeo-Johnson lambdas are fitted on. The last pass transforms the chunks of
+                        both files and writes the training, validation and testing rows into .npy memmaps preallocated
+                        at their final shape.
+
+        Output      :   memory mapped train, validation and test features and labels
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            chunk_size = self.data_transformation_config.chunk_size
+            features_dtype = self.data_transformation_config.features_dtype
+            labels_dtype = self.data_transformation_config.labels_dtype
+            if self.data_transformation_config.sparse_output:
+                raise ValueError("Chunked transformation writes dense .npy memmaps, it does not support sparse_output")
+            wait_for_background_tasks()
+            train_file_path = self.data_ingestion_artifact.trained_file_path
+            test_file_path = self.data_ingestion_artifact.test_file_path
+            fit_report = {"chunked": True, "chunk_size": chunk_size, "n_jobs": self.data_transformation_config.preprocessor_n_jobs}
+
+            start_time = time.perf_counter()
+            validation_mask = self.get_validation_mask(np.concatenate([
+                chunk[TARGET_COLUMN].to_numpy() for chunk in iter_dataframe_chunks(train_file_path, chunk_size, columns=[TARGET_COLUMN])]))
+            feature_engineer = clone(preprocessor.named_steps['FeatureEngineer'])
+            scaler = StandardScaler()
+            sampler = StratifiedReservoirSampler(sample_size=self.data_transformation_config.preprocessor_fit_sample_size,
+                                                 stratify_column=TARGET_COLUMN)
+            category_sets = {column: set() for column in self._schema_config['oh_columns'] + self._schema_config['or_columns']}
+            offset = 0
+            n_chunks = 0
+            for chunk in iter_dataframe_chunks(train_file_path, chunk_size, columns=columns, schema_config=self._schema_config):
+                chunk_validation_mask = validation_mask[offset:offset + len(chunk)]
+                offset += len(chunk)
+                chunk = chunk[~chunk_validation_mask]
+                if n_chunks == 0:
+                    feature_engineer.fit(chunk)
+                scaler.partial_fit(feature_engineer.transform(chunk)[self._schema_config['num_features']])
+                for column, values in self.get_category_sets(chunk).items():
+                    category_sets[column].update(values)
+                sampler.update(chunk)
+                n_chunks += 1
+            n_validation_rows = int(validation_mask.sum())
+            n_train_rows = len(validation_mask) - n_validation_rows
+            n_test_rows = sum(len(chunk) for chunk in iter_dataframe_chunks(test_file_path, chunk_size, columns=[TARGET_COLUMN]))
+            fit_report["statistics_seconds"] = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            fit_df = sampler.sample()
+            preprocessor.set_params(**self.get_encoder_categories(category_sets))
+            preprocessor.fit(fit_df)
+            fitted_scaler = preprocessor.named_steps['ColumnTransformer'].named_transformers_['StandardScaler']
+            for attribute in ("mean_", "var_", "scale_", "n_samples_seen_"):
+                setattr(fitted_scaler, attribute, getattr(scaler, attribute))
+            fit_report["fit_seconds"] = time.perf_counter() - start_time
+            fit_report.update({"n_rows": n_train_rows, "n_validation_rows": n_validation_rows, "n_chunks": n_chunks,
+                               "fit_rows": int(len(fit_df))})
+            logging.info(f"Fitted the preprocessor on {len(fit_df)} sampled rows and the moments of {n_train_rows} rows "
+                         f"streamed in {n_chunks} chunks, holding out {n_validation_rows} validation rows")
+            del fit_df, sampler
+
+            start_time = time.perf_counter()
+            n_features = len(preprocessor.get_feature_names_out())
+            target_value_mapping = TargetValueMapping()
+            outputs = []
+            # the rows of a file are split by the mask into the first output file and the masked rows into the second
+            for file_path, row_mask, output_files in (
+                    (train_file_path, validation_mask,
+                     [(n_train_rows, self.data_transformation_config.transformed_train_file_path,
+                       self.data_transformation_config.transformed_train_labels_file_path),
+                      (n_validation_rows, self.data_transformation_config.transformed_validation_file_path,
+                       self.data_transformation_config.transformed_validation_labels_file_path)]),
+                    (test_file_path, np.zeros(n_test_rows, dtype=bool),
+                     [(n_test_rows, self.data_transformation_config.transformed_test_file_path,
+                       self.data_transformation_config.transformed_test_labels_file_path)])):
+                memmaps = []
+                for n_rows, features_file_path, labels_file_path in output_files:
+                    os.makedirs(os.path.dirname(features_file_path), exist_ok=True)
+                    memmaps.append((np.lib.format.open_memmap(features_file_path, mode="w+", dtype=features_dtype, shape=(n_rows, n_features)),
+                                    np.lib.format.open_memmap(labels_file_path, mode="w+", dtype=labels_dtype, shape=(n_rows,))))
+                offset = 0
+                output_offsets = [0] * len(output_files)
+                for chunk in iter_dataframe_chunks(file_path, chunk_size, columns=columns, schema_config=self._schema_config):
+                    chunk_mask = row_mask[offset:offset + len(chunk)]
+                    offset += len(chunk)
+                    chunk_features = preprocessor.transform(chunk)
+                    chunk_labels = target_value_mapping.encode(chunk[TARGET_COLUMN])
+                    for i, (features, labels) in enumerate(memmaps):
+                        selected = ~chunk_mask if i == 0 else chunk_mask
+                        n_selected = int(selected.sum())
+                        features[output_offsets[i]:output_offsets[i] + n_selected] = chunk_features[selected]
+                        labels[output_offsets[i]:output_offsets[i] + n_selected] = chunk_labels[selected]
+                        output_offsets[i] += n_selected
+                for features, labels in memmaps:
+                    features.flush()
+                    labels.flush()
+                del memmaps, features, labels
+                for _, features_file_path, labels_file_path in output_files:
+                    outputs.extend([load_numpy_array_data(features_file_path, mmap_mode="r"),
+                                    load_numpy_array_data(labels_file_path, mmap_mode="r")])
+            fit_report["transform_seconds"] = time.perf_counter() - start_time
+            logging.info(f"Transformed {n_train_rows} training, {n_validation_rows} validation and {n_test_rows} testing rows "
+                         f"into {features_dtype} memmaps")
+
+            write_yaml_file(self.data_transformation_config.preprocessor_fit_report_file_path, content=fit_report, replace=True)
+            return tuple(outputs)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                input_feature_test_final, target_feature_test_final = smt.fit_resample(
-                    input_feature_test_arr, target_feature_test_df
-                )
+    @staticmethod
+    def reset_preprocessor_n_jobs(preprocessor: Pipeline) -> None:
+        """
+        Method Name :   reset_preprocessor_n_jobs
+        Description :   This method sets n_jobs of the fitted ColumnTransformer back to 1 once the training and testing
+                        data are transformed. preprocessor_n_jobs parallelises the fit over the branches, but the
+                        saved preprocessor scores small batches, where starting joblib workers costs more than the
+                        transform, and the serving and inference workers are already parallel.
 
-                logging.info("Applied SMOTEENN on testing dataset")
+        Output      :   None, the preprocessor is updated in place
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            preprocessor.named_steps['ColumnTransformer'].set_params(n_jobs=1)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                logging.info("Created train array and test array")
+    def compile_preprocessor(self, preprocessor: Pipeline, check_df: pd.DataFrame) -> CompiledPreprocessor:
+        """
+        Method Name :   compile_preprocessor
+        Description :   This method compiles the fitted preprocessor into a NumPy-only CompiledPreprocessor for low
+                        latency scoring and checks that it reproduces the sklearn output on up to compiled_check_rows
+                        rows of check_df.
 
-                train_arr = np.c_[
-                    input_feature_train_final, np.array(target_feature_train_final)
-                ]
+        Output      :   compiled preprocessor
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            compiled_preprocessor = CompiledPreprocessor(preprocessor)
+            check_df = check_df.iloc[:self.data_transformation_config.compiled_check_rows]
+            expected = preprocessor.transform(check_df)
+            if sparse.issparse(expected):
+                expected = expected.toarray()
+            compiled = compiled_preprocessor.transform(check_df)
+            max_abs_deviation = float(np.abs(compiled - expected).max(initial=0.0))
+            if not np.allclose(compiled, expected, rtol=1e-9, atol=1e-9):
+                raise ValueError(f"Compiled preprocessor deviates from the fitted preprocessor by up to {max_abs_deviation}")
+            logging.info(f"Compiled the preprocessor, max abs deviation on {len(check_df)} rows: {max_abs_deviation}")
+            return compiled_preprocessor
+        except Exception as e:
+            raise USVisaException(e, sys) from e
 
-                test_arr = np.c_[
-                    input_feature_test_final, np.array(target_feature_test_final)
-                ]
+    def initiate_data_transformation(self, ) -> DataTransformationArtifact:
+        """
+        Method Name :   initiate_data_transformation
+        Description :   This method initiates the data transformation component for the pipeline 
+                        A stratified validation_split of the training rows is held out before the preprocessor is
+                        fitted and the training rows are resampled, and saved as the validation features the model
+                        trainer selects the candidate models on. The training rows are also saved before resampling,
+                        for the model tuner to build its CV folds on.
+                        With chunked the ingested files are transformed out of core by transform_in_chunks.
+        
+        Output      :   data transformer steps are performed and preprocessor object is created  
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            if self.data_validation_artifact.validation_status:
+                logging.info(f"{'>>'*20} Data Transformation {'<<'*20}")
+                preprocessor = self.get_data_transformer_object()
+                logging.info("Got the preprocessor object")
 
-                save_object(self.data_transformation_config.transformed_object_file_path, preprocessor)
-                save_numpy_array_data(self.data_transformation_config.transformed_train_file_path, array=train_arr)
-                save_numpy_array_data(self.data_transformation_config.transformed_test_file_path, array=test_arr)
+                drop_cols = self._schema_config['drop_columns']
+                read_columns = [column for column in get_schema_dtypes(self._schema_config)
+                                if column not in drop_cols or column == 'yr_of_estab']
+                if self.data_transformation_config.chunked:
+                    fallback_strategy = self.data_transformation_config.resampling_fallback_strategy
+                    if fallback_strategy not in ("class_weight", "none"):
+                        raise ValueError(f"Chunked transformation needs a resampling fallback strategy that keeps the rows, "
+                                         f"class_weight or none, got: {fallback_strategy}")
+                    train_features, train_labels, validation_features, validation_labels, test_features, test_labels = \
+                        self.transform_in_chunks(preprocessor, read_columns)
+                    self.reset_preprocessor_n_jobs(preprocessor)
+                    self.resample_training_data(train_features, train_labels,
+                                                fallback_reason="chunked transformation keeps the training rows on disk")
+                    # the fallback strategies keep the rows, so the training files are also the unresampled ones
+                    for file_path, unresampled_file_path in (
+                            (self.data_transformation_config.transformed_train_file_path,
+                             self.data_transformation_config.transformed_unresampled_train_file_path),
+                            (self.data_transformation_config.transformed_train_labels_file_path,
+                             self.data_transformation_config.transformed_unresampled_train_labels_file_path)):
+                        if os.path.exists(unresampled_file_path):
+                            os.remove(unresampled_file_path)
+                        link_or_copy(file_path, unresampled_file_path)
+                    check_df = next(iter_dataframe_chunks(self.data_ingestion_artifact.test_file_path,
+                                                          self.data_transformation_config.compiled_check_rows,
+                                                          columns=read_columns, schema_config=self._schema_config))
+                    compiled_preprocessor = self.compile_preprocessor(preprocessor, check_df)
+                    if self.data_transformation_config.async_persist:
+                        run_in_background(save_object, self.data_transformation_config.transformed_object_file_path, preprocessor)
+                        run_in_background(save_object, self.data_transformation_config.compiled_object_file_path, compiled_preprocessor)
+                    else:
+                        save_object(self.data_transformation_config.transformed_object_file_path, preprocessor)
+                        save_object(self.data_transformation_config.compiled_object_file_path, compiled_preprocessor)
+                else:
+                    if self.data_ingestion_artifact.train_df is not None and self.data_ingestion_artifact.test_df is not None:
+                        logging.info("Using the training and testing dataframes handed over in memory by data ingestion")
+                        train_df = self.data_ingestion_artifact.train_df
+                        test_df = self.data_ingestion_artifact.test_df
+                    else:
+                        train_df = DataTransformation.read_data(file_path=self.data_ingestion_artifact.trained_file_path, columns=read_columns,
+                                                                schema_config=self._schema_config)
+                        test_df = DataTransformation.read_data(file_path=self.data_ingestion_artifact.test_file_path, columns=read_columns,
+                                                               schema_config=self._schema_config)
+                    validation_mask = self.get_validation_mask(train_df[TARGET_COLUMN].to_numpy())
+                    validation_df = train_df[validation_mask]
+                    train_df = train_df[~validation_mask]
+                    logging.info(f"Held out {len(validation_df)} of {len(validation_mask)} training rows for validation")
+
+                    target_feature_train_arr = TargetValueMapping().encode(train_df[TARGET_COLUMN])
+                    target_feature_validation_arr = TargetValueMapping().encode(validation_df[TARGET_COLUMN])
+                    target_feature_test_arr = TargetValueMapping().encode(test_df[TARGET_COLUMN])
+
+                    logging.info("Encoded the target of the training, validation and testing dataset")
+
+                    logging.info(
+                        "Applying preprocessing object on training dataframe and testing dataframe"
+                    )
+
+                    input_feature_train_arr = self.fit_preprocessor(preprocessor, train_df)
+
+                    logging.info(
+                        "Used the preprocessor object to fit transform the train features"
+                    )
+
+                    input_feature_validation_arr = preprocessor.transform(validation_df)
+                    input_feature_test_arr = preprocessor.transform(test_df)
+
+                    logging.info("Used the preprocessor object to transform the validation and test features")
+
+                    self.reset_preprocessor_n_jobs(preprocessor)
+                    compiled_preprocessor = self.compile_preprocessor(preprocessor, test_df)
+
+                    input_feature_train_final, target_feature_train_final = self.resample_training_data(
+                        input_feature_train_arr, target_feature_train_arr
+                    )
+                    resampled = input_feature_train_final is not input_feature_train_arr
+
+                    logging.info("Resampled the training dataset, the validation and testing datasets keep their original class distribution")
+
+                    features_dtype = self.data_transformation_config.features_dtype
+                    labels_dtype = self.data_transformation_config.labels_dtype
+                    # the features are saved in the layout their file names are built for, even when resampling
+                    # returned a different one
+                    if self.data_transformation_config.sparse_output:
+                        train_features = sparse.csr_matrix(input_feature_train_final, dtype=features_dtype)
+                        validation_features = sparse.csr_matrix(input_feature_validation_arr, dtype=features_dtype)
+                        test_features = sparse.csr_matrix(input_feature_test_arr, dtype=features_dtype)
+                    else:
+                        if sparse.issparse(input_feature_train_final):
+                            input_feature_train_final = input_feature_train_final.toarray()
+                        if sparse.issparse(input_feature_validation_arr):
+                            input_feature_validation_arr = input_feature_validation_arr.toarray()
+                        if sparse.issparse(input_feature_test_arr):
+                            input_feature_test_arr = input_feature_test_arr.toarray()
+                        train_features = np.ascontiguousarray(input_feature_train_final, dtype=features_dtype)
+                        validation_features = np.ascontiguousarray(input_feature_validation_arr, dtype=features_dtype)
+                        test_features = np.ascontiguousarray(input_feature_test_arr, dtype=features_dtype)
+                    train_labels = np.asarray(target_feature_train_final, dtype=labels_dtype)
+                    unresampled_train_features, unresampled_train_labels = train_features, train_labels
+                    if resampled:
+                        if self.data_transformation_config.sparse_output:
+                            unresampled_train_features = sparse.csr_matrix(input_feature_train_arr, dtype=features_dtype)
+                        else:
+                            unresampled_train_features = np.ascontiguousarray(input_feature_train_arr.toarray() if sparse.issparse(input_feature_train_arr)
+                                                                              else input_feature_train_arr, dtype=features_dtype)
+                        unresampled_train_labels = np.asarray(target_feature_train_arr, dtype=labels_dtype)
+                    validation_labels = np.asarray(target_feature_validation_arr, dtype=labels_dtype)
+                    test_labels = np.asarray(target_feature_test_arr, dtype=labels_dtype)
+
+                    logging.info(f"Created {'sparse' if sparse.issparse(train_features) else 'dense'} train, validation and test features "
+                                 f"as {features_dtype} and labels as {labels_dtype}")
+
+                    arrays_to_save = [
+                        (self.data_transformation_config.transformed_train_file_path, train_features),
+                        (self.data_transformation_config.transformed_train_labels_file_path, train_labels),
+                        (self.data_transformation_config.transformed_unresampled_train_file_path, unresampled_train_features),
+                        (self.data_transformation_config.transformed_unresampled_train_labels_file_path, unresampled_train_labels),
+                        (self.data_transformation_config.transformed_validation_file_path, validation_features),
+                        (self.data_transformation_config.transformed_validation_labels_file_path, validation_labels),
+                        (self.data_transformation_config.transformed_test_file_path, test_features),
+                        (self.data_transformation_config.transformed_test_labels_file_path, test_labels),
+                    ]
+                    if self.data_transformation_config.async_persist:
+                        run_in_background(save_object, self.data_transformation_config.transformed_object_file_path, preprocessor)
+                        run_in_background(save_object, self.data_transformation_config.compiled_object_file_path, compiled_preprocessor)
+                        for file_path, array in arrays_to_save:
+                            run_in_background(save_numpy_array_data, file_path, array=array)
+                    else:
+                        save_object(self.data_transformation_config.transformed_object_file_path, preprocessor)
+                        save_object(self.data_transformation_config.compiled_object_file_path, compiled_preprocessor)
+                        for file_path, array in arrays_to_save:
+                            save_numpy_array_data(file_path, array=array)
 
                 logging.info("Saved the preprocessor object")
 
@@ -199,7 +628,22 @@ class DataTransformation:
                 data_transformation_artifact = DataTransformationArtifact(
                     transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
                     transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
-                    transformed_test_file_path=self.data_transformation_config.transformed_test_file_path
+                    transformed_test_file_path=self.data_transformation_config.transformed_test_file_path,
+                    transformed_train_labels_file_path=self.data_transformation_config.transformed_train_labels_file_path,
+                    transformed_test_labels_file_path=self.data_transformation_config.transformed_test_labels_file_path,
+                    transformed_validation_file_path=self.data_transformation_config.transformed_validation_file_path,
+                    transformed_validation_labels_file_path=self.data_transformation_config.transformed_validation_labels_file_path,
+                    transformed_unresampled_train_file_path=self.data_transformation_config.transformed_unresampled_train_file_path,
+                    transformed_unresampled_train_labels_file_path=self.data_transformation_config.transformed_unresampled_train_labels_file_path,
+                    resampling_report_file_path=self.data_transformation_config.resampling_report_file_path,
+                    compiled_object_file_path=self.data_transformation_config.compiled_object_file_path,
+                    train_features=train_features,
+                    train_labels=train_labels,
+                    test_features=test_features,
+                    test_labels=test_labels,
+                    validation_features=validation_features,
+                    validation_labels=validation_labels,
+                    preprocessor=preprocessor
                 )
                 return data_transformation_artifact
             else:
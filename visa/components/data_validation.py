@@ -1,14 +1,14 @@
 import json
 import sys
+from typing import Iterable, Union
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
-from evidently.model_profile import Profile
-from evidently.model_profile.sections import DataDriftProfileSection
-
 from visa.exception import USVisaException
 from visa.logger import logging
-from visa.utils.main_utils import read_yaml_file, write_yaml_file
+from visa.utils.main_utils import read_yaml_file, write_yaml_file, read_dataframe, get_schema_dtypes
+from visa.utils.drift_utils import compute_drift_report, compute_sketch_drift_report, DatasetSketch
 from visa.entity.artifact_entity import DataValidationArtifact, DataIngestionArtifact
 from visa.entity.config_entity import DataValidationConfig
 from visa.constants import SCHEMA_FILE_PATH
@@ -29,84 +29,186 @@ class DataValidation:
         except Exception as e:
             raise USVisaException(e, sys) from e
         
-    def validate_number_of_columns(self, dataframe: DataFrame) -> bool:
-        """This function validates the number of columns in the given dataframe with the expected number of columns in the schema config.
+    @staticmethod
+    def read_data(file_path: str, schema_config: dict = None) -> DataFrame:
+        try:
+            return read_dataframe(file_path, schema_config=schema_config)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+        
+    def validate_dataframe(self, dataframe: DataFrame) -> dict:
+        """This function validates the given dataframe against the rules of the schema config in one vectorized pass per rule:
+        column presence, data types, allowed category domains, numeric ranges and null ratios.
         Input           :  dataframe: DataFrame
-        Output          :  bool
+        Output          :  dict with the per-column results and the overall validation status
         on Failure      :  raise exception
         """
         try:
-            status = len(dataframe.columns) == len(self._schema_config["columns"])
-            logging.info(f"Number of columns validation status: {status}")
-            return status
+            schema_dtypes = get_schema_dtypes(self._schema_config)
+            domains = self._schema_config.get("domains", {})
+            ranges = self._schema_config.get("ranges", {})
+            max_null_ratio = self._schema_config.get("max_null_ratio", 0.0)
+
+            columns = [column for column in schema_dtypes if column in dataframe.columns]
+            missing_columns = [column for column in schema_dtypes if column not in dataframe.columns]
+            unexpected_columns = [column for column in dataframe.columns if column not in schema_dtypes]
+
+            null_ratios = dataframe[columns].isna().mean() if len(dataframe) > 0 else pd.Series(0.0, index=columns)
+            numeric_columns = [column for column in columns
+                               if schema_dtypes[column] != "category" and pd.api.types.is_numeric_dtype(dataframe[column])]
+            numeric_bounds = dataframe[numeric_columns].agg(["min", "max"])
+
+            column_reports = {}
+            for column in columns:
+                series = dataframe[column]
+                expected_dtype = schema_dtypes[column]
+                if expected_dtype == "category":
+                    dtype_status = isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(series) \
+                        or pd.api.types.is_string_dtype(series)
+                else:
+                    dtype_status = column in numeric_columns
+                column_report = {
+                    "dtype": str(series.dtype),
+                    "expected_dtype": expected_dtype,
+                    "dtype_status": bool(dtype_status),
+                    "null_ratio": float(null_ratios[column]),
+                    "null_status": bool(null_ratios[column] <= max_null_ratio),
+                }
+
+                if column in domains and dtype_status:
+                    if isinstance(series.dtype, pd.CategoricalDtype):
+                        counts = np.bincount(series.cat.codes.to_numpy() + 1, minlength=len(series.cat.categories) + 1)[1:]
+                        is_unknown = ~series.cat.categories.isin(domains[column])
+                        unknown_values = series.cat.categories[is_unknown & (counts > 0)].tolist()
+                        n_out_of_domain = int(counts[is_unknown].sum())
+                    else:
+                        is_unknown = ~series.isin(domains[column]) & series.notna()
+                        unknown_values = series[is_unknown].unique().tolist()
+                        n_out_of_domain = int(is_unknown.sum())
+                    column_report["n_out_of_domain"] = n_out_of_domain
+                    column_report["out_of_domain_values"] = [str(value) for value in unknown_values[:20]]
+                    column_report["domain_status"] = n_out_of_domain == 0
+
+                if column in numeric_columns:
+                    minimum, maximum = numeric_bounds[column]["min"], numeric_bounds[column]["max"]
+                    column_report["min"] = None if pd.isna(minimum) else float(minimum)
+                    column_report["max"] = None if pd.isna(maximum) else float(maximum)
+                    if column in ranges:
+                        lower, upper = ranges[column].get("min", -np.inf), ranges[column].get("max", np.inf)
+                        column_report["range_status"] = bool(pd.isna(minimum) or (minimum >= lower and maximum <= upper))
+
+                column_report["status"] = all(value for key, value in column_report.items() if key.endswith("_status"))
+                column_reports[column] = column_report
+
+            failed_columns = [column for column, column_report in column_reports.items() if not column_report["status"]]
+            report = {
+                "n_rows": int(len(dataframe)),
+                "n_columns": int(len(dataframe.columns)),
+                "expected_n_columns": len(schema_dtypes),
+                "missing_columns": missing_columns,
+                "unexpected_columns": unexpected_columns,
+                "failed_columns": failed_columns,
+                "columns": column_reports,
+                "status": not (missing_columns or unexpected_columns or failed_columns),
+            }
+            logging.info(f"Dataframe validation status: {report['status']}, missing columns: {missing_columns}, "
+                         f"unexpected columns: {unexpected_columns}, failed columns: {failed_columns}")
+            return report
         except Exception as e:
             raise USVisaException(e, sys) from e
-    
-    def is_column_exist(self,df:DataFrame) -> bool:
-        """This function validates the presence of all the expected columns in the given dataframe as per the schema config.
-        Input           :  dataframe: DataFrame
-        Output          :  bool
+
+    def detect_dataset_drift(self, base_df: DataFrame, current_df: DataFrame) -> bool:
+        """This function detects the dataset drift between the base dataframe and the current dataframe and writes the data drift report.
+        The native engine runs KS tests on numerical columns and chi-square/PSI on categorical columns straight from the column values,
+        the evidently engine builds an evidently data drift profile.
+        Input           :  base_df: DataFrame, current_df: DataFrame
+        Output          :  bool, whether the dataset drifted
         on Failure      :  raise exception
         """
         try:
-            dataframe_columns = df.columns
-            missing_numerical_columns = []
-            missing_categorical_columns = []
-            for column in self._schema_config["numerical_columns"]:
-                if column not in dataframe_columns:
-                    missing_numerical_columns.append(column)
-            
-            if len(missing_numerical_columns) > 0:
-                logging.info(f"Missing numerical columns: {missing_numerical_columns}")
-            
-            for column in self._schema_config["categorical_columns"]:
-                if column not in dataframe_columns:
-                    missing_categorical_columns.append(column)
-            
-            if len(missing_categorical_columns) > 0:
-                logging.info(f"Missing categorical columns: {missing_categorical_columns}")
-                
-            return False if len(missing_numerical_columns) > 0 or len(missing_categorical_columns) > 0 else True
+            if self.data_validation_config.drift_engine == "evidently":
+                return self.detect_dataset_drift_evidently(base_df, current_df)
+
+            report = compute_drift_report(reference_df=base_df, current_df=current_df,
+                                          numerical_columns=self._schema_config["numerical_columns"],
+                                          categorical_columns=self._schema_config["categorical_columns"],
+                                          thresholds=self.get_drift_thresholds(),
+                                          drift_share=self.data_validation_config.drift_share)
+            write_yaml_file(file_path=self.data_validation_config.drift_report_file_path, content=report, replace=True)
+
+            n_features = report["n_features"]
+            n_drifted_features = report["n_drifted_features"]
+
+            logging.info(f"{n_drifted_features} out of {n_features} features are drifted.")
+            logging.info(f"{report['share_drifted_features']*100} % of features are drifted.")
+            return report["dataset_drift"]
         except Exception as e:
             raise USVisaException(e, sys) from e
-        
-    @staticmethod
-    def read_data(file_path: str) -> DataFrame:
+
+    def get_drift_thresholds(self) -> dict:
+        return {"p_value": self.data_validation_config.drift_p_value_threshold,
+                "ks_statistic": self.data_validation_config.drift_ks_threshold,
+                "psi": self.data_validation_config.drift_psi_threshold}
+
+    def build_drift_baseline(self, data: Union[DataFrame, Iterable[DataFrame]]) -> DatasetSketch:
+        """This function summarises the training data into a compact mergeable drift baseline and saves it as an artifact.
+        Numerical columns are summarised by symlog histograms over their schema range, categorical columns with a
+        schema domain by category frequencies. Identifier like columns without a domain such as case_id are left out.
+        Input           :  data: DataFrame or iterable of DataFrame chunks
+        Output          :  DatasetSketch of the data
+        on Failure      :  raise exception
+        """
         try:
-            return pd.read_csv(file_path)
+            domains = self._schema_config.get("domains", {})
+            sketch = DatasetSketch(numerical_columns=self._schema_config["numerical_columns"],
+                                   categorical_columns=[column for column in self._schema_config["categorical_columns"] if column in domains],
+                                   ranges=self._schema_config.get("ranges", {}),
+                                   n_bins=self.data_validation_config.drift_baseline_bins)
+            for chunk in ([data] if isinstance(data, DataFrame) else data):
+                sketch.update(chunk)
+            write_yaml_file(file_path=self.data_validation_config.drift_baseline_file_path, content=sketch.to_dict(), replace=True)
+            logging.info(f"Drift baseline of {sketch.n_rows} rows saved at: {self.data_validation_config.drift_baseline_file_path}")
+            return sketch
         except Exception as e:
             raise USVisaException(e, sys) from e
-        
-    def check_data_type(self, dataframe: DataFrame) -> bool:
-        """This function validates the data types of the columns in the given dataframe with the expected data types in the schema config.
-        Input           :  dataframe: DataFrame
-        Output          :  bool
+
+    def detect_batch_drift(self, data: Union[DataFrame, Iterable[DataFrame]], baseline_file_path: str = None,
+                           report_file_path: str = None) -> bool:
+        """This function detects the drift of a new batch against a saved drift baseline without loading the training data.
+        The batch is sketched chunk by chunk on the bins of the baseline and the drift report is written to report_file_path.
+        Input           :  data: DataFrame or iterable of DataFrame chunks, baseline_file_path: defaults to the baseline of this run,
+                           report_file_path: defaults to the batch drift report of this run
+        Output          :  bool, whether the batch drifted
         on Failure      :  raise exception
         """
         try:
-            status = True
-            for column in self._schema_config["numerical_columns"]:
-                if column in dataframe.columns and not pd.api.types.is_numeric_dtype(dataframe[column]):
-                    logging.info(f"Column: {column} is expected to be numerical but found {dataframe[column].dtype}")
-                    status = False
-            
-            for column in self._schema_config["categorical_columns"]:
-                if column in dataframe.columns and not pd.api.types.is_object_dtype(dataframe[column]):
-                    logging.info(f"Column: {column} is expected to be categorical but found {dataframe[column].dtype}")
-                    status = False
-            
-            logging.info(f"Data type validation status: {status}")
-            return status
+            baseline_file_path = baseline_file_path or self.data_validation_config.drift_baseline_file_path
+            report_file_path = report_file_path or self.data_validation_config.batch_drift_report_file_path
+            baseline = DatasetSketch.from_dict(read_yaml_file(baseline_file_path))
+            batch_sketch = baseline.empty_like()
+            for chunk in ([data] if isinstance(data, DataFrame) else data):
+                batch_sketch.update(chunk)
+
+            report = compute_sketch_drift_report(reference_sketch=baseline, current_sketch=batch_sketch,
+                                                 thresholds=self.get_drift_thresholds(),
+                                                 drift_share=self.data_validation_config.drift_share)
+            write_yaml_file(file_path=report_file_path, content=report, replace=True)
+            logging.info(f"{report['n_drifted_features']} out of {report['n_features']} features of the batch of "
+                         f"{batch_sketch.n_rows} rows drifted from the baseline at: {baseline_file_path}")
+            return report["dataset_drift"]
         except Exception as e:
             raise USVisaException(e, sys) from e
-        
-    def detect_dataset_drift(self, base_df: DataFrame, current_df: DataFrame) -> bool:
+
+    def detect_dataset_drift_evidently(self, base_df: DataFrame, current_df: DataFrame) -> bool:
         """This function detects the dataset drift between the base dataframe and the current dataframe using the evidently library and returns the data drift report.
         Input           :  base_df: DataFrame, current_df: DataFrame
-        Output          :  Profile
+        Output          :  bool, whether the dataset drifted
         on Failure      :  raise exception
         """
         try:
+            from evidently.model_profile import Profile
+            from evidently.model_profile.sections import DataDriftProfileSection
+
             data_drift_profile = Profile(sections=[DataDriftProfileSection()])
             data_drift_profile.calculate(base_df, current_df)
             
@@ -137,29 +239,27 @@ class DataValidation:
         try:
             validation_error_msg = ""
             logging.info("Starting data validation")
-            train_df, test_df = (DataValidation.read_data(file_path=self.data_ingestion_artifact.trained_file_path),
-                                 DataValidation.read_data(file_path=self.data_ingestion_artifact.test_file_path))
-
-            status = self.validate_number_of_columns(dataframe=train_df)
-            logging.info(f"All required columns present in training dataframe: {status}")
-            if not status:
-                validation_error_msg += f"Columns are missing in training dataframe."
-            status = self.validate_number_of_columns(dataframe=test_df)
-
-            logging.info(f"All required columns present in testing dataframe: {status}")
-            if not status:
-                validation_error_msg += f"Columns are missing in test dataframe."
-
-            status = self.is_column_exist(df=train_df)
+            if self.data_ingestion_artifact.train_df is not None and self.data_ingestion_artifact.test_df is not None:
+                logging.info("Using the training and testing dataframes handed over in memory by data ingestion")
+                train_df, test_df = self.data_ingestion_artifact.train_df, self.data_ingestion_artifact.test_df
+            else:
+                train_df, test_df = (DataValidation.read_data(file_path=self.data_ingestion_artifact.trained_file_path, schema_config=self._schema_config),
+                                     DataValidation.read_data(file_path=self.data_ingestion_artifact.test_file_path, schema_config=self._schema_config))
 
-            if not status:
-                validation_error_msg += f"Columns are missing in training dataframe."
-            status = self.is_column_exist(df=test_df)
+            validation_report = {"train": self.validate_dataframe(dataframe=train_df),
+                                 "test": self.validate_dataframe(dataframe=test_df)}
+            write_yaml_file(file_path=self.data_validation_config.validation_report_file_path, content=validation_report, replace=True)
+            logging.info(f"Validation report saved at: {self.data_validation_config.validation_report_file_path}")
 
-            if not status:
-                validation_error_msg += f"columns are missing in test dataframe."
+            for name, report in (("training", validation_report["train"]), ("test", validation_report["test"])):
+                if report["missing_columns"] or report["unexpected_columns"]:
+                    validation_error_msg += f"Columns are missing or unexpected in {name} dataframe: " \
+                                            f"{report['missing_columns'] + report['unexpected_columns']}. "
+                if report["failed_columns"]:
+                    validation_error_msg += f"Columns failed validation in {name} dataframe: {report['failed_columns']}. "
 
             validation_status = len(validation_error_msg) == 0
+            self.build_drift_baseline(train_df)
 
             if validation_status:
                 drift_status = self.detect_dataset_drift(train_df, test_df)
@@ -175,7 +275,9 @@ class DataValidation:
             data_validation_artifact = DataValidationArtifact(
                 validation_status=validation_status,
                 message=validation_error_msg,
-                drift_report_file_path=self.data_validation_config.drift_report_file_path
+                drift_report_file_path=self.data_validation_config.drift_report_file_path,
+                validation_report_file_path=self.data_validation_config.validation_report_file_path,
+                drift_baseline_file_path=self.data_validation_config.drift_baseline_file_path
             )
 
             logging.info(f"Data validation artifact: {data_validation_artifact}")
@@ -0,0 +1,150 @@
+import sys
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from visa.constants import SCHEMA_FILE_PATH, TARGET_COLUMN
+from visa.entity.artifact_entity import DataIngestionArtifact, ModelEvaluationArtifact, ModelTrainerArtifact
+from visa.entity.config_entity import ModelEvaluationConfig, ModelRegistryConfig
+from visa.entity.estimator import TargetValueMapping, VisaModel
+from visa.entity.model_registry import get_model_registry
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.evaluation_utils import StreamingBinaryMetrics, get_metric_report, get_paired_f1_difference
+from visa.utils.main_utils import iter_dataframe_chunks, load_object, read_yaml_file, wait_for_background_tasks, write_yaml_file
+
+
+class ModelEvaluation:
+    def __init__(self, model_eval_config: ModelEvaluationConfig, data_ingestion_artifact: DataIngestionArtifact,
+                 model_trainer_artifact: ModelTrainerArtifact, model_registry_config: ModelRegistryConfig = ModelRegistryConfig()):
+        """
+        :param model_eval_config: Configuration for model evaluation
+        :param data_ingestion_artifact: Output reference of data ingestion artifact stage
+        :param model_trainer_artifact: Output reference of model trainer artifact stage
+        :param model_registry_config: Configuration of the model registry holding the deployed model
+        """
+        try:
+            self.model_eval_config = model_eval_config
+            self.data_ingestion_artifact = data_ingestion_artifact
+            self.model_trainer_artifact = model_trainer_artifact
+            self.model_registry = get_model_registry(model_registry_config)
+            self._schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def get_deployed_model(self) -> Tuple[Optional[str], Optional[VisaModel]]:
+        """
+        Method Name :   get_deployed_model
+        Description :   This method loads the champion of the model registry, the deployed model the trained model is
+                        compared with.
+
+        Output      :   Returns the champion version and model, or None and None if no model is deployed yet
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            version = self.model_registry.get_champion_version()
+            if version is None:
+                logging.info(f"No deployed model in the model registry at: {self.model_registry.backend.uri}")
+                return None, None
+            return version, self.model_registry.load_model(version)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def evaluate_models(self, trained_model: VisaModel, deployed_model: Optional[VisaModel]) -> dict:
+        """
+        Method Name :   evaluate_models
+        Description :   This method streams the test data in batches through the trained and the deployed model, each
+                        with its own preprocessor, and only accumulates a (label, score bin) histogram per model and the
+                        paired counts of their predictions at the decision threshold. ROC-AUC, the threshold table
+                        and the bootstrap confidence intervals are then computed from these counts.
+
+        Output      :   Returns the evaluation report
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            config = self.model_eval_config
+            models = {"trained_model": trained_model}
+            if deployed_model is not None:
+                models["deployed_model"] = deployed_model
+            metrics = {name: StreamingBinaryMetrics(n_bins=config.n_bins, decision_threshold=config.decision_threshold)
+                       for name in models}
+            paired_counts = np.zeros((2, 2, 2), dtype=np.int64)
+            target_value_mapping = TargetValueMapping()
+
+            start_time = time.perf_counter()
+            scoring_seconds = dict.fromkeys(models, 0.0)
+            for chunk in iter_dataframe_chunks(self.data_ingestion_artifact.test_file_path, config.batch_size,
+                                               schema_config=self._schema_config):
+                labels = target_value_mapping.encode(chunk[TARGET_COLUMN])
+                features = chunk.drop(columns=[TARGET_COLUMN])
+                predictions = {}
+                for name, model in models.items():
+                    scoring_start_time = time.perf_counter()
+                    scores = model.predict_proba(features)
+                    scoring_seconds[name] += time.perf_counter() - scoring_start_time
+                    predictions[name] = metrics[name].update(labels, scores)
+                if deployed_model is not None:
+                    paired_counts += np.bincount(labels * 4 + predictions["trained_model"] * 2 + predictions["deployed_model"],
+                                                 minlength=8).reshape(2, 2, 2)
+            streaming_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            report = {name: get_metric_report(metrics[name], thresholds=np.array(config.thresholds),
+                                              n_resamples=config.n_bootstrap, confidence_level=config.confidence_level)
+                      for name in models}
+            if deployed_model is not None:
+                report["f1_score_difference"] = get_paired_f1_difference(paired_counts, n_resamples=config.n_bootstrap,
+                                                                         confidence_level=config.confidence_level)
+            report["seconds"] = {"streaming": streaming_seconds, "scoring": scoring_seconds,
+                                 "metrics": time.perf_counter() - start_time}
+            return report
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def initiate_model_evaluation(self) -> ModelEvaluationArtifact:
+        """
+        Method Name :   initiate_model_evaluation
+        Description :   This method evaluates the trained model against the deployed model on the test data and
+                        accepts the trained model when no model is deployed, or when its F1 score is higher by at least
+                        changed_threshold_score and, with require_significance, the lower bound of the paired bootstrap
+                        confidence interval of the difference is above 0.
+
+        Output      :   Returns model evaluation artifact
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        logging.info("Entered initiate_model_evaluation method of ModelEvaluation class")
+        try:
+            wait_for_background_tasks()
+            trained_model = self.model_trainer_artifact.trained_model
+            if trained_model is None:
+                trained_model = load_object(self.model_trainer_artifact.trained_model_file_path)
+            deployed_model_version, deployed_model = self.get_deployed_model()
+            report = self.evaluate_models(trained_model, deployed_model)
+
+            if deployed_model is None:
+                changed_accuracy = report["trained_model"]["f1_score"]
+                is_model_accepted = True
+            else:
+                changed_accuracy = report["f1_score_difference"]["difference"]
+                is_model_accepted = changed_accuracy >= self.model_eval_config.changed_threshold_score
+                if self.model_eval_config.require_significance:
+                    is_model_accepted = is_model_accepted and report["f1_score_difference"]["confidence_interval"][0] > 0
+            report["deployed_model_version"] = deployed_model_version
+            report["is_model_accepted"] = bool(is_model_accepted)
+            report["changed_accuracy"] = float(changed_accuracy)
+            write_yaml_file(self.model_eval_config.evaluation_report_file_path, content=report, replace=True)
+            logging.info(f"Evaluated the trained model in {report['seconds']['streaming'] + report['seconds']['metrics']:.2f}s, "
+                         f"f1 score: {report['trained_model']['f1_score']:.4f}, changed accuracy: {changed_accuracy:.4f}, "
+                         f"accepted: {is_model_accepted}")
+
+            model_evaluation_artifact = ModelEvaluationArtifact(
+                is_model_accepted=bool(is_model_accepted),
+                changed_accuracy=float(changed_accuracy),
+                trained_model_path=self.model_trainer_artifact.trained_model_file_path,
+                deployed_model_version=deployed_model_version,
+                evaluation_report_file_path=self.model_eval_config.evaluation_report_file_path)
+            logging.info(f"Model evaluation artifact: {model_evaluation_artifact}")
+            return model_evaluation_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
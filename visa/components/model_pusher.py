@@ -0,0 +1,62 @@
+import sys
+
+from visa.entity.artifact_entity import ModelEvaluationArtifact, ModelPusherArtifact, ModelTrainerArtifact
+from visa.entity.config_entity import ModelPusherConfig, ModelRegistryConfig
+from visa.entity.model_registry import get_model_registry
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.main_utils import write_yaml_file
+
+
+class ModelPusher:
+    def __init__(self, model_trainer_artifact: ModelTrainerArtifact, model_evaluation_artifact: ModelEvaluationArtifact,
+                 model_pusher_config: ModelPusherConfig, model_registry_config: ModelRegistryConfig = ModelRegistryConfig()):
+        """
+        :param model_trainer_artifact: Output reference of model trainer artifact stage
+        :param model_evaluation_artifact: Output reference of model evaluation artifact stage
+        :param model_pusher_config: Configuration for model pusher
+        :param model_registry_config: Configuration of the model registry the model is pushed to
+        """
+        try:
+            self.model_trainer_artifact = model_trainer_artifact
+            self.model_evaluation_artifact = model_evaluation_artifact
+            self.model_pusher_config = model_pusher_config
+            self.model_registry = get_model_registry(model_registry_config)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def initiate_model_pusher(self) -> ModelPusherArtifact:
+        """
+        Method Name :   initiate_model_pusher
+        Description :   This method publishes the model package of the accepted trained model as a new version of the
+                        model registry and, with promote, makes it the champion by swapping the registry pointer.
+
+        Output      :   Returns model pusher artifact
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        logging.info("Entered initiate_model_pusher method of ModelPusher class")
+        try:
+            if not self.model_evaluation_artifact.is_model_accepted:
+                raise Exception("Trained model was not accepted by model evaluation and can not be pushed")
+
+            model_version = self.model_registry.publish(self.model_trainer_artifact.trained_model_package_dir)
+            previous_champion_version = self.model_registry.get_champion_version()
+            if self.model_pusher_config.promote:
+                self.model_registry.promote(model_version)
+            champion_version = self.model_registry.get_champion_version()
+
+            write_yaml_file(self.model_pusher_config.push_report_file_path, replace=True, content={
+                "registry_uri": self.model_registry.backend.uri,
+                "model_version": model_version,
+                "previous_champion_version": previous_champion_version,
+                "champion_version": champion_version,
+                "changed_accuracy": self.model_evaluation_artifact.changed_accuracy,
+            })
+            model_pusher_artifact = ModelPusherArtifact(registry_uri=self.model_registry.backend.uri,
+                                                        model_version=model_version,
+                                                        champion_version=champion_version,
+                                                        push_report_file_path=self.model_pusher_config.push_report_file_path)
+            logging.info(f"Model pusher artifact: {model_pusher_artifact}")
+            return model_pusher_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
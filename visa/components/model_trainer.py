@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+from typing import Optional
+
+from visa.entity.artifact_entity import (ClassificationMetricArtifact, DataTransformationArtifact, ModelTrainerArtifact,
+                                         ModelTunerArtifact)
+from visa.entity.config_entity import ModelTrainerConfig
+from visa.entity.estimator import VisaModel
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.main_utils import load_object, read_yaml_file, save_object, wait_for_background_tasks, write_yaml_file
+from visa.utils.model_package import save_model_package
+from visa.utils.training_utils import get_model_candidates, train_candidates_in_parallel
+
+
+class ModelTrainer:
+    def __init__(self, data_transformation_artifact: DataTransformationArtifact,
+                 model_trainer_config: ModelTrainerConfig,
+                 model_tuner_artifact: Optional[ModelTunerArtifact] = None):
+        """
+        :param data_transformation_artifact: Output reference of data transformation artifact stage
+        :param model_trainer_config: Configuration for model trainer
+        :param model_tuner_artifact: Output reference of model tuner artifact stage, whose best params override model.yaml
+        """
+        try:
+            self.data_transformation_artifact = data_transformation_artifact
+            self.model_trainer_config = model_trainer_config
+            self.model_tuner_artifact = model_tuner_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def get_class_weight(self) -> Optional[dict]:
+        """
+        Method Name :   get_class_weight
+        Description :   This method returns the class weights written to the resampling report when data
+                        transformation balanced the classes with "class_weight" instead of resampling the rows.
+
+        Output      :   dict of class label to weight, or None
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            resampling_report = read_yaml_file(self.data_transformation_artifact.resampling_report_file_path)
+            return resampling_report.get("class_weight")
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def initiate_model_trainer(self) -> ModelTrainerArtifact:
+        """
+        Method Name :   initiate_model_trainer
+        Description :   This method trains the candidate models of model.yaml at the same time in worker processes
+                        reading the transformed data through memory maps, selects the best candidate by its f1
+                        score on the validation data held out by data transformation, checks its f1 score on the
+                        test data against the expected score and saves it
+                        wrapped in a VisaModel with the preprocessor. The wall-clock time and CPU utilisation of the
+                        training are written to the training report.
+
+        Output      :   Returns model trainer artifact
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        logging.info("Entered initiate_model_trainer method of ModelTrainer class")
+        try:
+            wait_for_background_tasks()
+            candidates = get_model_candidates(read_yaml_file(self.model_trainer_config.model_config_file_path),
+                                              time_budget=self.model_trainer_config.time_budget,
+                                              early_stopping_rounds=self.model_trainer_config.early_stopping_rounds)
+            if self.model_tuner_artifact is not None:
+                best_params = read_yaml_file(self.model_tuner_artifact.best_params_file_path) or {}
+                for candidate in candidates:
+                    candidate["params"].update(best_params.get(candidate["name"]) or {})
+                logging.info(f"Using the tuned params: {best_params}")
+            logging.info(f"Training {len(candidates)} candidate models: {[candidate['name'] for candidate in candidates]}")
+
+            start_time = time.perf_counter()
+            results = train_candidates_in_parallel(
+                candidates,
+                features_file_path=self.data_transformation_artifact.transformed_train_file_path,
+                labels_file_path=self.data_transformation_artifact.transformed_train_labels_file_path,
+                validation_features_file_path=self.data_transformation_artifact.transformed_validation_file_path,
+                validation_labels_file_path=self.data_transformation_artifact.transformed_validation_labels_file_path,
+                test_features_file_path=self.data_transformation_artifact.transformed_test_file_path,
+                test_labels_file_path=self.data_transformation_artifact.transformed_test_labels_file_path,
+                output_dir=self.model_trainer_config.candidates_dir,
+                n_workers=self.model_trainer_config.n_workers,
+                class_weight=self.get_class_weight(),
+                hard_time_limit_factor=self.model_trainer_config.hard_time_limit_factor,
+                mp_context=self.model_trainer_config.mp_context)
+            wall_seconds = time.perf_counter() - start_time
+
+            completed = [result for result in results if result["status"] == "completed"]
+            if not completed:
+                raise Exception(f"No candidate model finished training: {[(result['name'], result['status']) for result in results]}")
+            best_result = max(completed, key=lambda result: result["validation"]["f1_score"])
+            trained_model = load_object(best_result["model_file_path"])
+            metric_artifact = ClassificationMetricArtifact(**best_result["test"])
+            logging.info(f"Best candidate model: {best_result['name']} with validation scores: {best_result['validation']} "
+                         f"and test scores: {best_result['test']}")
+
+            n_cpus = os.cpu_count() or 1
+            cpu_seconds = sum(result.get("cpu_seconds") or 0.0 for result in results)
+            training_report = {
+                "best_model": best_result["name"],
+                "validation": best_result["validation"],
+                "test": metric_artifact.__dict__,
+                "expected_score": self.model_trainer_config.expected_score,
+                "n_cpus": n_cpus,
+                "n_workers": self.model_trainer_config.n_workers,
+                "wall_seconds": wall_seconds,
+                "sequential_seconds": sum(result.get("wall_seconds") or 0.0 for result in results),
+                "cpu_seconds": cpu_seconds,
+                "cpu_utilization": cpu_seconds / max(wall_seconds * n_cpus, 1e-9),
+                "candidates": {result["name"]: result for result in results},
+            }
+            write_yaml_file(self.model_trainer_config.training_report_file_path, content=training_report, replace=True)
+            logging.info(f"Trained {len(candidates)} candidates in {wall_seconds:.1f}s wall clock, "
+                         f"{cpu_seconds:.1f}s CPU, utilisation {training_report['cpu_utilization']:.0%}")
+
+            if metric_artifact.f1_score < self.model_trainer_config.expected_score:
+                logging.info("No best model found with score more than base score")
+                raise Exception("No best model found with score more than base score")
+
+            preprocessor = self.data_transformation_artifact.preprocessor
+            if preprocessor is None:
+                preprocessor = load_object(self.data_transformation_artifact.transformed_object_file_path)
+            visa_model = VisaModel(preprocessing_object=preprocessor, trained_model_object=trained_model,
+                                   compiled_preprocessing_object=load_object(self.data_transformation_artifact.compiled_object_file_path))
+            logging.info("Created usvisa model object with preprocessor and model")
+            save_object(self.model_trainer_config.trained_model_file_path, visa_model)
+            save_model_package(visa_model, self.model_trainer_config.trained_model_package_dir,
+                               metadata={"model_name": best_result["name"], "test": metric_artifact.__dict__})
+
+            model_trainer_artifact = ModelTrainerArtifact(
+                trained_model_file_path=self.model_trainer_config.trained_model_file_path,
+                training_report_file_path=self.model_trainer_config.training_report_file_path,
+                trained_model_package_dir=self.model_trainer_config.trained_model_package_dir,
+                metric_artifact=metric_artifact,
+                trained_model=visa_model,
+            )
+            logging.info(f"Model trainer artifact: {model_trainer_artifact}")
+            return model_trainer_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+
+from visa.entity.artifact_entity import DataTransformationArtifact, ModelTunerArtifact
+from visa.entity.config_entity import ModelTunerConfig
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.main_utils import read_yaml_file, wait_for_background_tasks, write_yaml_file
+from visa.utils.training_utils import get_model_candidates
+from visa.utils.tuning_utils import SuccessiveHalvingSearch, TrialRunner, get_fold_cache, load_checkpoint
+
+
+class ModelTuner:
+    def __init__(self, data_transformation_artifact: DataTransformationArtifact,
+                 model_tuner_config: ModelTunerConfig):
+        """
+        :param data_transformation_artifact: Output reference of data transformation artifact stage
+        :param model_tuner_config: Configuration for model tuner
+        """
+        try:
+            self.data_transformation_artifact = data_transformation_artifact
+            self.model_tuner_config = model_tuner_config
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def initiate_model_tuner(self) -> ModelTunerArtifact:
+        """
+        Method Name :   initiate_model_tuner
+        Description :   This method searches the search_param_grid of every candidate model of model.yaml with
+                        successive halving or Hyperband. The CV folds are built once on the transformed training data
+                        before resampling, the training rows of every fold are resampled inside the fold with the
+                        strategy data transformation applied, and the folds are cached as contiguous blocks shared by
+                        all trials. The trials run in parallel worker processes and every finished trial is
+                        checkpointed, so a rerun after an interruption only runs the missing trials. The best params
+                        of every candidate are written for the model trainer.
+
+        Output      :   Returns model tuner artifact
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        logging.info("Entered initiate_model_tuner method of ModelTuner class")
+        try:
+            wait_for_background_tasks()
+            candidates = get_model_candidates(read_yaml_file(self.model_tuner_config.model_config_file_path),
+                                              time_budget=0, early_stopping_rounds=self.model_tuner_config.early_stopping_rounds)
+            best_params = {}
+            tuning_report = {"method": self.model_tuner_config.method, "n_folds": self.model_tuner_config.n_folds,
+                             "factor": self.model_tuner_config.factor, "candidates": {}}
+            searched = [candidate for candidate in candidates if candidate["search_param_grid"]]
+            if self.model_tuner_config.enabled and searched:
+                resampling_report = read_yaml_file(self.data_transformation_artifact.resampling_report_file_path)
+                start_time = time.perf_counter()
+                fold_cache = get_fold_cache(self.data_transformation_artifact.transformed_unresampled_train_file_path,
+                                            self.data_transformation_artifact.transformed_unresampled_train_labels_file_path,
+                                            cache_dir=self.model_tuner_config.fold_cache_dir,
+                                            n_folds=self.model_tuner_config.n_folds,
+                                            resampling_strategy=resampling_report["applied_strategy"],
+                                            resampling_n_jobs=resampling_report["n_jobs"],
+                                            nn_algorithm=resampling_report["nn_algorithm"],
+                                            working_memory=resampling_report["working_memory"])
+                tuning_report["fold_cache_seconds"] = time.perf_counter() - start_time
+                tuning_report["resampling_strategy"] = resampling_report["applied_strategy"]
+                checkpoint_trials = load_checkpoint(self.model_tuner_config.checkpoint_file_path)
+                with TrialRunner(checkpoint_file_path=self.model_tuner_config.checkpoint_file_path,
+                                 n_workers=self.model_tuner_config.n_workers,
+                                 class_weight=resampling_report.get("class_weight"),
+                                 mp_context=self.model_tuner_config.mp_context,
+                                 preload_modules=[candidate["module"] for candidate in searched]) as trial_runner:
+                    for candidate in searched:
+                        start_time = time.perf_counter()
+                        search = SuccessiveHalvingSearch(candidate, param_grid=candidate["search_param_grid"],
+                                                         fold_cache=fold_cache,
+                                                         min_resources=self.model_tuner_config.min_resources,
+                                                         factor=self.model_tuner_config.factor,
+                                                         max_configurations=self.model_tuner_config.max_configurations,
+                                                         method=self.model_tuner_config.method, run_trials=trial_runner,
+                                                         checkpoint_trials=checkpoint_trials,
+                                                         n_threads=max(1, (os.cpu_count() or 1) // trial_runner.n_workers))
+                        result = search.search()
+                        result["seconds"] = time.perf_counter() - start_time
+                        best_params[candidate["name"]] = result["best_params"]
+                        tuning_report["candidates"][candidate["name"]] = result
+                        logging.info(f"Tuned {candidate['name']} in {result['seconds']:.1f}s with {result['n_trials']} trials "
+                                     f"({result['n_resumed_trials']} resumed), best params: {result['best_params']} "
+                                     f"with cv f1 score: {result['best_score']:.4f}")
+
+            write_yaml_file(self.model_tuner_config.best_params_file_path, content=best_params, replace=True)
+            write_yaml_file(self.model_tuner_config.tuning_report_file_path, content=tuning_report, replace=True)
+            model_tuner_artifact = ModelTunerArtifact(best_params_file_path=self.model_tuner_config.best_params_file_path,
+                                                      tuning_report_file_path=self.model_tuner_config.tuning_report_file_path)
+            logging.info(f"Model tuner artifact: {model_tuner_artifact}")
+            return model_tuner_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
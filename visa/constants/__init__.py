@@ -23,11 +23,39 @@ MODEL_FILE_NAME = "model.pkl"
 TARGET_COLUMN: str = "case_status"
 CURRENT_YEAR = date.today().year
 PREPROCESSING_OBJECT_FILE_NAME = "preprocessor.pkl"
+COMPILED_PREPROCESSING_OBJECT_FILE_NAME = "compiled_preprocessor.pkl"
 
-FILE_NAME: str = "visa_data.csv"
-TRAIN_FILE_NAME: str = "train.csv"
-TEST_FILE_NAME: str = "test.csv"
+### Model Package Constants: a VisaModel saved as preprocessor arrays, a native learner file and a manifest
+MODEL_PACKAGE_DIR_NAME: str = "model_package"
+MODEL_PACKAGE_MANIFEST_FILE_NAME: str = "manifest.json"
+MODEL_PACKAGE_PREPROCESSOR_FILE_NAME: str = "preprocessor.npy"
+MODEL_PACKAGE_LEARNER_FILE_NAME: str = "learner"
+MODEL_PACKAGE_FORMAT_VERSION: int = 1
+
+### Compiled Tree Ensemble Constants: batches of up to this many rows are scored with the compiled trees of a VisaModel,
+### larger ones with the library, by the batch size where the library overtakes the compiled trees
+### (benchmarks/tree_ensemble_throughput.py), per library or per sklearn estimator class
+COMPILED_TREE_ENSEMBLE_MAX_ROWS: dict = {"xgboost": 10, "catboost": 1, "RandomForestClassifier": 1000,
+                                         "ExtraTreesClassifier": 1000, "GradientBoostingClassifier": 10}
+
+### Artifact file format of the feature store and train/test splits: csv, parquet or feather
+ARTIFACT_FILE_FORMAT: str = "parquet"
+FILE_NAME: str = f"visa_data.{ARTIFACT_FILE_FORMAT}"
+TRAIN_FILE_NAME: str = f"train.{ARTIFACT_FILE_FORMAT}"
+TEST_FILE_NAME: str = f"test.{ARTIFACT_FILE_FORMAT}"
+### Hand artifacts to the next stage in memory and write them to disk on a background thread
+ARTIFACT_ASYNC_PERSIST: bool = True
 SCHEMA_FILE_PATH = os.path.join("config", "schema.yaml")
+### A categorical column without a domain is kept as strings when more than this share of its values are distinct,
+### such as the case_id identifier, where a category dtype would only add a category per row
+SCHEMA_CATEGORY_MAX_UNIQUE_RATIO: float = 0.5
+
+
+### Stage Cache Constants
+STAGE_CACHE_DIR_NAME: str = "stage_cache"
+STAGE_CACHE_ENABLED: bool = True
+STAGE_CACHE_MAX_SIZE_BYTES: int = 2 * 1024 ** 3
+STAGE_CACHE_REPORT_FILE_NAME: str = "stage_cache_report.yaml"
 
 
 ### AWS Credentials Constants
@@ -41,14 +69,141 @@ DATA_INGESTION_DIR_NAME: str = "data_ingestion"
 DATA_INGESTION_FEATURE_STORE_DIR: str = "feature_store"
 DATA_INGESTION_INGESTED_DIR: str = "ingested"
 DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO: float = 0.2
+DATA_INGESTION_BATCH_SIZE: int = 10000
+DATA_INGESTION_EXPORT_WORKERS: int = 1
+DATA_INGESTION_PARTITION_SIZE: int = 100000
+DATA_INGESTION_INCREMENTAL: bool = False
+DATA_INGESTION_WATERMARK_FILE_NAME: str = "watermark.yaml"
+DATA_INGESTION_DEDUPLICATION_COLUMN: str = "case_id"
 
 
 ### Data Validation Constant
 DATA_VALIDATION_DIR_NAME: str = "data_validation"
 DATA_VALIDATION_DRIFT_REPORT_DIR: str = "drift_report"
 DATA_VALIDATION_DRIFT_REPORT_FILE_NAME: str = "report.yaml"
+DATA_VALIDATION_REPORT_DIR: str = "validation_report"
+DATA_VALIDATION_REPORT_FILE_NAME: str = "report.yaml"
+DATA_VALIDATION_DRIFT_ENGINE: str = "native"
+DATA_VALIDATION_DRIFT_SHARE: float = 0.5
+DATA_VALIDATION_DRIFT_P_VALUE_THRESHOLD: float = 0.05
+DATA_VALIDATION_DRIFT_KS_THRESHOLD: float = 0.1
+DATA_VALIDATION_DRIFT_PSI_THRESHOLD: float = 0.1
+DATA_VALIDATION_DRIFT_BASELINE_DIR: str = "drift_baseline"
+DATA_VALIDATION_DRIFT_BASELINE_FILE_NAME: str = "baseline.yaml"
+DATA_VALIDATION_DRIFT_BASELINE_BINS: int = 256
+DATA_VALIDATION_BATCH_DRIFT_REPORT_FILE_NAME: str = "batch_report.yaml"
 
 ### Data Transformation Constants
 DATA_TRANSFORMATION_DIR_NAME: str = "data_transformation"
 DATA_TRANSFORMATION_TRANSFORMED_DIR: str = "transformed"
-DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR: str = "transformed_object"
\ No newline at end of file
+DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR: str = "transformed_object"
+DATA_TRANSFORMATION_LABELS_FILE_SUFFIX: str = "_labels"
+### Share of the training rows held out, before the preprocessor is fitted and the rows are resampled, to select the model on
+DATA_TRANSFORMATION_VALIDATION_SPLIT: float = 0.1
+DATA_TRANSFORMATION_VALIDATION_FILE_NAME: str = "validation"
+### The training rows before resampling, the model tuner builds its CV folds on them and resamples inside the folds
+DATA_TRANSFORMATION_UNRESAMPLED_FILE_SUFFIX: str = "_unresampled"
+DATA_TRANSFORMATION_SPARSE_OUTPUT: bool = False
+DATA_TRANSFORMATION_FEATURES_DTYPE: str = "float32"
+DATA_TRANSFORMATION_LABELS_DTYPE: str = "int8"
+DATA_TRANSFORMATION_PREPROCESSOR_FIT_REPORT_FILE_NAME: str = "preprocessor_fit_report.yaml"
+DATA_TRANSFORMATION_PREPROCESSOR_N_JOBS: int = -1
+DATA_TRANSFORMATION_PREPROCESSOR_FIT_SAMPLE_SIZE: int = 200000
+DATA_TRANSFORMATION_PREPROCESSOR_FIT_CHECK: bool = False
+DATA_TRANSFORMATION_CHUNKED: bool = False
+DATA_TRANSFORMATION_CHUNK_SIZE: int = 100000
+DATA_TRANSFORMATION_COMPILED_CHECK_ROWS: int = 1000
+DATA_TRANSFORMATION_RESAMPLING_REPORT_FILE_NAME: str = "resampling_report.yaml"
+DATA_TRANSFORMATION_RESAMPLING_STRATEGY: str = "smoteenn"
+DATA_TRANSFORMATION_RESAMPLING_FALLBACK_STRATEGY: str = "class_weight"
+DATA_TRANSFORMATION_RESAMPLING_N_JOBS: int = -1
+DATA_TRANSFORMATION_RESAMPLING_NN_ALGORITHM: str = "kd_tree"
+DATA_TRANSFORMATION_RESAMPLING_WORKING_MEMORY: int = 1024
+DATA_TRANSFORMATION_RESAMPLING_MAX_ROWS: int = 1000000
+DATA_TRANSFORMATION_RESAMPLING_TIME_BUDGET: int = 600
+DATA_TRANSFORMATION_RESAMPLING_PILOT_ROWS: int = 10000
+
+
+### Model Tuner Constants
+MODEL_TUNER_DIR_NAME: str = "model_tuner"
+MODEL_TUNER_BEST_PARAMS_FILE_NAME: str = "best_params.yaml"
+MODEL_TUNER_REPORT_FILE_NAME: str = "tuning_report.yaml"
+MODEL_TUNER_FOLD_CACHE_DIR: str = "fold_cache"
+MODEL_TUNER_CHECKPOINT_FILE_NAME: str = "checkpoint.jsonl"
+MODEL_TUNER_ENABLED: bool = True
+MODEL_TUNER_METHOD: str = "successive_halving"
+MODEL_TUNER_N_FOLDS: int = 3
+MODEL_TUNER_FACTOR: int = 3
+MODEL_TUNER_MIN_RESOURCES: int = 1000
+MODEL_TUNER_MAX_CONFIGURATIONS: int = 81
+MODEL_TUNER_N_WORKERS: int = -1
+
+
+### Model Trainer Constants
+MODEL_TRAINER_DIR_NAME: str = "model_trainer"
+MODEL_TRAINER_TRAINED_MODEL_DIR: str = "trained_model"
+MODEL_TRAINER_TRAINED_MODEL_NAME: str = "model.pkl"
+MODEL_TRAINER_CANDIDATES_DIR: str = "candidates"
+MODEL_TRAINER_REPORT_FILE_NAME: str = "training_report.yaml"
+MODEL_TRAINER_EXPECTED_SCORE: float = 0.6
+MODEL_TRAINER_MODEL_CONFIG_FILE_PATH: str = os.path.join("config", "model.yaml")
+MODEL_TRAINER_N_WORKERS: int = -1
+MODEL_TRAINER_MP_CONTEXT: str = "forkserver"
+MODEL_TRAINER_TIME_BUDGET: int = 600
+MODEL_TRAINER_HARD_TIME_LIMIT_FACTOR: float = 1.5
+MODEL_TRAINER_EARLY_STOPPING_ROUNDS: int = 20
+
+
+### Model Evaluation Constants
+MODEL_EVALUATION_DIR_NAME: str = "model_evaluation"
+MODEL_EVALUATION_REPORT_FILE_NAME: str = "evaluation_report.yaml"
+MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE: float = 0.02
+MODEL_EVALUATION_REQUIRE_SIGNIFICANCE: bool = True
+MODEL_EVALUATION_BATCH_SIZE: int = 100000
+MODEL_EVALUATION_N_BINS: int = 10000
+MODEL_EVALUATION_THRESHOLDS: tuple = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+MODEL_EVALUATION_DECISION_THRESHOLD: float = 0.5
+MODEL_EVALUATION_N_BOOTSTRAP: int = 1000
+MODEL_EVALUATION_CONFIDENCE_LEVEL: float = 0.95
+
+
+### Model Registry Constants: "local" keeps the versions in MODEL_REGISTRY_DIR, "s3" in MODEL_REGISTRY_BUCKET_NAME
+MODEL_REGISTRY_BACKEND: str = "local"
+MODEL_REGISTRY_DIR: str = "model_registry"
+MODEL_REGISTRY_POINTER_FILE_NAME: str = "champion.json"
+MODEL_REGISTRY_BUCKET_NAME: str = "usvisa-model-registry"
+MODEL_REGISTRY_PREFIX: str = "visa-model"
+MODEL_REGISTRY_DOWNLOAD_DIR: str = os.path.join(MODEL_REGISTRY_DIR, "downloads")
+MODEL_REGISTRY_CACHE_SIZE: int = 2
+MODEL_REGISTRY_CHECK_INTERVAL: float = 1.0
+
+
+### Model Pusher Constants
+MODEL_PUSHER_DIR_NAME: str = "model_pusher"
+MODEL_PUSHER_REPORT_FILE_NAME: str = "push_report.yaml"
+MODEL_PUSHER_PROMOTE: bool = True
+
+
+### Batch Inference Constants: predictions are written as numbered part files in the output directory of a run
+BATCH_INFERENCE_DIR: str = "batch_inference"
+BATCH_INFERENCE_PREDICTIONS_DIR_NAME: str = "predictions"
+BATCH_INFERENCE_CHECKPOINT_FILE_NAME: str = "checkpoint.json"
+BATCH_INFERENCE_REPORT_FILE_NAME: str = "inference_report.yaml"
+BATCH_INFERENCE_OUTPUT_FILE_FORMAT: str = "parquet"
+BATCH_INFERENCE_CHUNK_SIZE: int = 100000
+BATCH_INFERENCE_N_WORKERS: int = -1
+BATCH_INFERENCE_MP_CONTEXT: str = "forkserver"
+BATCH_INFERENCE_KEY_COLUMNS: tuple = ("case_id",)
+BATCH_INFERENCE_DECISION_THRESHOLD: float = MODEL_EVALUATION_DECISION_THRESHOLD
+
+
+### App Constants: concurrent prediction requests are scored together in batches of up to APP_MAX_BATCH_SIZE records,
+### waiting at most APP_MAX_WAIT_MS for a batch to fill; APP_MICRO_BATCHING False scores every request on its own
+APP_HOST: str = "0.0.0.0"
+APP_PORT: int = 8080
+APP_MICRO_BATCHING: bool = True
+APP_MAX_BATCH_SIZE: int = 64
+APP_MAX_WAIT_MS: float = 5.0
+APP_EXECUTOR: str = "thread"
+APP_N_EXECUTOR_WORKERS: int = 1
+APP_DECISION_THRESHOLD: float = MODEL_EVALUATION_DECISION_THRESHOLD
@@ -1,9 +1,15 @@
-from visa.constants import DATABASE_NAME
+from visa.constants import (DATABASE_NAME, SCHEMA_FILE_PATH, DATA_INGESTION_BATCH_SIZE,
+                            DATA_INGESTION_EXPORT_WORKERS, DATA_INGESTION_PARTITION_SIZE)
 from visa.exception import USVisaException
 from visa.logger import logging
+from visa.utils.main_utils import read_yaml_file, get_schema_dtypes, apply_schema_dtypes
 import pandas as pd
+from pandas.api.types import union_categoricals
 import sys
-from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Iterator, List, Optional, Tuple
 import numpy as np
 from visa.configuration.mongo_db_connection import MongoDBClient
 
@@ -13,31 +19,182 @@ class VisaData:
     """
     This class helps to export entire mongo db record as pandas dataframe.
     """
-    
+
     def __init__(self):
             try:
                 self.mongo_client = MongoDBClient(database_name = DATABASE_NAME)
+                self._schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+                self._schema_dtypes = get_schema_dtypes(self._schema_config)
             except Exception as e:
                 raise USVisaException(e, sys) from e
-            
-    def export_collection_as_dataframe(self, collection_name: str,database_name:Optional[str] = None) -> Optional[pd.DataFrame]:
+
+    def _get_collection(self, collection_name: str, database_name: Optional[str] = None):
+        if database_name is None:
+            return self.mongo_client.database[collection_name]
+        return self.mongo_client.client[database_name][collection_name]
+
+    def _build_dataframe(self, records: list) -> pd.DataFrame:
+        """
+        This function builds a dataframe column by column from a batch of mongo records,
+        replacing "na" with NaN and compacting the columns to the dtypes declared in the schema config.
+        Output           :  DataFrame containing the batch of records
+        on Failure       :  raise exception
+        """
+        try:
+            columns = list(dict.fromkeys(key for record in records for key in record))
+            data = {}
+            for column in columns:
+                values = [record.get(column) for record in records]
+                dtype = self._schema_dtypes.get(column)
+                if dtype == "int":
+                    data[column] = pd.to_numeric(pd.Series(values), errors="coerce")
+                else:
+                    data[column] = pd.Series(values, dtype=object).replace({"na": np.nan})
+            return apply_schema_dtypes(pd.DataFrame(data), self._schema_config, log_report=False)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def iter_collection_chunks(self, collection_name: str, database_name: Optional[str] = None,
+                               batch_size: int = DATA_INGESTION_BATCH_SIZE,
+                               after_id: Optional[Any] = None, keep_id: bool = False) -> Iterator[pd.DataFrame]:
+        """
+        This function streams the records of the collection as pandas dataframe chunks of at most batch_size rows.
+        The "_id" field is dropped on the server with a projection unless keep_id is set, and the cursor fetches
+        batch_size documents per round trip. Records are streamed in "_id" order, the order of the partitioned
+        export, and when after_id is given only the records inserted after it are streamed.
+        Output           :  Iterator of DataFrames containing the records of the collection
+        on Failure       :  raise exception
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            projection = None if keep_id else {"_id": 0}
+            id_filter = {} if after_id is None else {"_id": {"$gt": after_id}}
+            cursor = collection.find(id_filter, projection, batch_size=batch_size).sort("_id", 1)
+            n_chunks = 0
+            while True:
+                records = list(islice(cursor, batch_size))
+                if not records:
+                    break
+                n_chunks += 1
+                yield self._build_dataframe(records)
+            logging.info(f"Data from collection: {collection_name} has been streamed in {n_chunks} chunks of at most {batch_size} rows.")
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def get_partition_ranges(self, collection_name: str, database_name: Optional[str] = None,
+                             partition_size: int = DATA_INGESTION_PARTITION_SIZE) -> List[Tuple[Optional[Any], Optional[Any]]]:
+        """
+        This function splits the collection into contiguous "_id" ranges of about partition_size documents.
+        Split points are found by walking the "_id" index with skip/limit, so no $sample or full scan is needed.
+        Output           :  list of (lower bound inclusive, upper bound exclusive) "_id" ranges, None meaning unbounded
+        on Failure       :  raise exception
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            split_points = []
+            lower_filter = {}
+            while True:
+                boundary = list(collection.find(lower_filter, {"_id": 1}).sort("_id", 1).skip(partition_size).limit(1))
+                if not boundary:
+                    break
+                split_points.append(boundary[0]["_id"])
+                lower_filter = {"_id": {"$gte": split_points[-1]}}
+            bounds = [None] + split_points + [None]
+            ranges = list(zip(bounds[:-1], bounds[1:]))
+            logging.info(f"Collection: {collection_name} split into {len(ranges)} partitions of about {partition_size} documents.")
+            return ranges
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def _export_partition(self, collection_name: str, database_name: Optional[str], id_range: Tuple[Optional[Any], Optional[Any]],
+                          batch_size: int) -> pd.DataFrame:
+        """
+        This function exports one "_id" range of the collection as a pandas dataframe, ordered by "_id".
+        Output           :  DataFrame containing the records of the partition
+        on Failure       :  raise exception
+        """
+        try:
+            lower, upper = id_range
+            id_filter = {}
+            if lower is not None:
+                id_filter["$gte"] = lower
+            if upper is not None:
+                id_filter["$lt"] = upper
+            collection = self._get_collection(collection_name, database_name)
+            cursor = collection.find({"_id": id_filter} if id_filter else {}, {"_id": 0}, batch_size=batch_size).sort("_id", 1)
+            chunks = []
+            while True:
+                records = list(islice(cursor, batch_size))
+                if not records:
+                    break
+                chunks.append(self._build_dataframe(records))
+            return concat_chunks(chunks) if chunks else pd.DataFrame()
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def iter_collection_partitions(self, collection_name: str, database_name: Optional[str] = None,
+                                   n_workers: int = DATA_INGESTION_EXPORT_WORKERS,
+                                   partition_size: int = DATA_INGESTION_PARTITION_SIZE,
+                                   batch_size: int = DATA_INGESTION_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        This function exports the collection in parallel "_id" range partitions through a thread pool sharing the
+        MongoClient of MongoDBClient. Partitions are yielded in "_id" order whatever order they finish in, and at most
+        2 * n_workers partitions are held in memory at a time. An empty collection yields no partition, as
+        iter_collection_chunks yields no chunk.
+        Output           :  Iterator of DataFrames, one per partition
+        on Failure       :  raise exception
+        """
+        try:
+            ranges = self.get_partition_ranges(collection_name=collection_name, database_name=database_name, partition_size=partition_size)
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                pending = deque()
+                for id_range in ranges:
+                    pending.append(executor.submit(self._export_partition, collection_name, database_name, id_range, batch_size))
+                    if len(pending) >= 2 * n_workers:
+                        partition = pending.popleft().result()
+                        if len(partition):
+                            yield partition
+                while pending:
+                    partition = pending.popleft().result()
+                    if len(partition):
+                        yield partition
+            logging.info(f"Data from collection: {collection_name} has been exported in {len(ranges)} partitions using {n_workers} workers.")
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def export_collection_as_dataframe(self, collection_name: str,database_name:Optional[str] = None,
+                                       batch_size: int = DATA_INGESTION_BATCH_SIZE) -> Optional[pd.DataFrame]:
         """
         This function returns the entire record of the collection as a pandas dataframe.
         Output           :  DataFrame containing the entire record of the collection
         on Failure       :  raise exception
         """
         try:
-            if database_name is None:
-                collection = self.mongo_client.database[collection_name]
-            else:
-                collection = self.mongo_client.client[database_name][collection_name]
-                
-            df = pd.DataFrame(list(collection.find()))
+            chunks = list(self.iter_collection_chunks(collection_name=collection_name, database_name=database_name, batch_size=batch_size))
+            if not chunks:
+                return pd.DataFrame()
+            df = concat_chunks(chunks)
             logging.info(f"Data from collection: {collection_name} has been exported as dataframe successfully.")
-            if "_id" in df.columns:
-                df.drop("_id", axis=1, inplace=True)
-            df.replace({"na": np.nan}, inplace=True)
             return df
         except Exception as e:
             raise USVisaException(e, sys) from e
-            
\ No newline at end of file
+
+
+def concat_chunks(chunks: list) -> pd.DataFrame:
+    """
+    This function concatenates dataframe chunks and restores the category dtype of columns
+    whose categories differ between chunks, keeping the category order of the first chunk.
+    Output           :  DataFrame containing all the chunks
+    on Failure       :  raise exception
+    """
+    try:
+        df = pd.concat(chunks, ignore_index=True)
+        for column in chunks[0].columns:
+            if isinstance(chunks[0][column].dtype, pd.CategoricalDtype) and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                if all(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+                    df[column] = union_categoricals([chunk[column] for chunk in chunks])
+                else:
+                    df[column] = df[column].astype("category")
+        return df
+    except Exception as e:
+        raise USVisaException(e, sys) from e
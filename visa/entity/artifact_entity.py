@@ -1,20 +1,92 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import numpy as np
+from pandas import DataFrame
 
 @dataclass
 class DataIngestionArtifact:
     trained_file_path: str
     test_file_path: str
-    
-    
+    train_df: Optional[DataFrame] = field(default=None, repr=False, compare=False)
+    test_df: Optional[DataFrame] = field(default=None, repr=False, compare=False)
+
+
 @dataclass
 class DataValidationArtifact:
     validation_status:bool
     message: str
     drift_report_file_path: str
-    
-    
+    validation_report_file_path: str
+    drift_baseline_file_path: str
+
+
 @dataclass
 class DataTransformationArtifact:
     transformed_train_file_path: str
     transformed_test_file_path: str
-    transformed_object_file_path: str
\ No newline at end of file
+    transformed_object_file_path: str
+    transformed_train_labels_file_path: str
+    transformed_test_labels_file_path: str
+    transformed_validation_file_path: str
+    transformed_validation_labels_file_path: str
+    transformed_unresampled_train_file_path: str
+    transformed_unresampled_train_labels_file_path: str
+    resampling_report_file_path: str
+    compiled_object_file_path: str
+    train_features: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+    train_labels: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+    test_features: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+    test_labels: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+    validation_features: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+    validation_labels: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+    preprocessor: Optional[Any] = field(default=None, repr=False, compare=False)
+
+
+@dataclass
+class ModelTunerArtifact:
+    best_params_file_path: str
+    tuning_report_file_path: str
+
+
+@dataclass
+class ClassificationMetricArtifact:
+    f1_score: float
+    precision_score: float
+    recall_score: float
+
+
+@dataclass
+class ModelTrainerArtifact:
+    trained_model_file_path: str
+    training_report_file_path: str
+    trained_model_package_dir: str
+    metric_artifact: ClassificationMetricArtifact
+    trained_model: Optional[Any] = field(default=None, repr=False, compare=False)
+
+
+@dataclass
+class ModelEvaluationArtifact:
+    is_model_accepted: bool
+    changed_accuracy: float
+    trained_model_path: str
+    deployed_model_version: Optional[str]
+    evaluation_report_file_path: str
+
+
+@dataclass
+class ModelPusherArtifact:
+    registry_uri: str
+    model_version: str
+    champion_version: Optional[str]
+    push_report_file_path: str
+
+
+@dataclass
+class BatchInferenceArtifact:
+    predictions_dir: str
+    model_version: Optional[str]
+    n_rows: int
+    n_chunks: int
+    n_resumed_chunks: int
+    inference_report_file_path: str
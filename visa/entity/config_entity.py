@@ -16,25 +16,193 @@ class TrainingPipelineConfig:
 training_pipeline_config = TrainingPipelineConfig()
 
 
+@dataclass
+class StageCacheConfig:
+    stage_cache_dir = os.path.join(ARTIFACTS_DIR, STAGE_CACHE_DIR_NAME)
+    report_file_path = os.path.join(training_pipeline_config.artifact_dir, STAGE_CACHE_REPORT_FILE_NAME)
+    enabled: bool = STAGE_CACHE_ENABLED
+    max_size_bytes: int = STAGE_CACHE_MAX_SIZE_BYTES
+
+
 @dataclass
 class DataIngestionConfig:
     data_ingestion_dir = os.path.join(training_pipeline_config.artifact_dir, DATA_INGESTION_DIR_NAME)
-    feature_store_file_path = os.path.join(data_ingestion_dir, DATA_INGESTION_FEATURE_STORE_DIR, FILE_NAME)
-    training_file_path = os.path.join(data_ingestion_dir, DATA_INGESTION_INGESTED_DIR, TRAIN_FILE_NAME)
-    testing_file_path = os.path.join(data_ingestion_dir, DATA_INGESTION_INGESTED_DIR, TEST_FILE_NAME)
+    file_format: str = ARTIFACT_FILE_FORMAT
+    async_persist: bool = ARTIFACT_ASYNC_PERSIST
     train_test_split_ratio: float = DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
     collection_name: str = DATA_INGESTION_COLLECTION_NAME
+    batch_size: int = DATA_INGESTION_BATCH_SIZE
+    export_workers: int = DATA_INGESTION_EXPORT_WORKERS
+    partition_size: int = DATA_INGESTION_PARTITION_SIZE
+    incremental: bool = DATA_INGESTION_INCREMENTAL
+    persistent_feature_store_dir = os.path.join(ARTIFACTS_DIR, DATA_INGESTION_FEATURE_STORE_DIR, os.path.splitext(FILE_NAME)[0])
+    watermark_file_path = os.path.join(ARTIFACTS_DIR, DATA_INGESTION_FEATURE_STORE_DIR, DATA_INGESTION_WATERMARK_FILE_NAME)
+    deduplication_column: str = DATA_INGESTION_DEDUPLICATION_COLUMN
+
+    def __post_init__(self):
+        if self.file_format not in ("csv", "parquet", "feather"):
+            raise ValueError(f"Data ingestion file format: {self.file_format} is not one of csv, parquet, feather")
+        feature_store_file_name = f"{os.path.splitext(FILE_NAME)[0]}.{self.file_format}"
+        self.feature_store_file_path = os.path.join(self.data_ingestion_dir, DATA_INGESTION_FEATURE_STORE_DIR, feature_store_file_name)
+        self.training_file_path = os.path.join(self.data_ingestion_dir, DATA_INGESTION_INGESTED_DIR,
+                                               f"{os.path.splitext(TRAIN_FILE_NAME)[0]}.{self.file_format}")
+        self.testing_file_path = os.path.join(self.data_ingestion_dir, DATA_INGESTION_INGESTED_DIR,
+                                              f"{os.path.splitext(TEST_FILE_NAME)[0]}.{self.file_format}")
     
     
 @dataclass
 class DataValidationConfig:
     data_validation_dir = os.path.join(training_pipeline_config.artifact_dir,DATA_VALIDATION_DIR_NAME)
     drift_report_file_path = os.path.join(data_validation_dir,DATA_VALIDATION_DRIFT_REPORT_DIR,DATA_VALIDATION_DRIFT_REPORT_FILE_NAME)
+    validation_report_file_path = os.path.join(data_validation_dir, DATA_VALIDATION_REPORT_DIR, DATA_VALIDATION_REPORT_FILE_NAME)
+    drift_baseline_file_path = os.path.join(data_validation_dir, DATA_VALIDATION_DRIFT_BASELINE_DIR, DATA_VALIDATION_DRIFT_BASELINE_FILE_NAME)
+    batch_drift_report_file_path = os.path.join(data_validation_dir, DATA_VALIDATION_DRIFT_REPORT_DIR, DATA_VALIDATION_BATCH_DRIFT_REPORT_FILE_NAME)
+    drift_engine: str = DATA_VALIDATION_DRIFT_ENGINE
+    drift_share: float = DATA_VALIDATION_DRIFT_SHARE
+    drift_p_value_threshold: float = DATA_VALIDATION_DRIFT_P_VALUE_THRESHOLD
+    drift_ks_threshold: float = DATA_VALIDATION_DRIFT_KS_THRESHOLD
+    drift_psi_threshold: float = DATA_VALIDATION_DRIFT_PSI_THRESHOLD
+    drift_baseline_bins: int = DATA_VALIDATION_DRIFT_BASELINE_BINS
     
 
 @dataclass
 class DataTransformationConfig:
     data_transformation_dir = os.path.join(training_pipeline_config.artifact_dir, DATA_TRANSFORMATION_DIR_NAME)
-    transformed_train_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR, TRAIN_FILE_NAME.replace(".csv", ".npy"))
-    transformed_test_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR, TEST_FILE_NAME.replace(".csv", ".npy"))
-    transformed_object_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR, PREPROCESSING_OBJECT_FILE_NAME)
\ No newline at end of file
+    async_persist: bool = ARTIFACT_ASYNC_PERSIST
+    sparse_output: bool = DATA_TRANSFORMATION_SPARSE_OUTPUT
+    transformed_train_labels_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                      os.path.splitext(TRAIN_FILE_NAME)[0] + DATA_TRANSFORMATION_LABELS_FILE_SUFFIX + ".npy")
+    transformed_test_labels_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                     os.path.splitext(TEST_FILE_NAME)[0] + DATA_TRANSFORMATION_LABELS_FILE_SUFFIX + ".npy")
+    transformed_validation_labels_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                           DATA_TRANSFORMATION_VALIDATION_FILE_NAME + DATA_TRANSFORMATION_LABELS_FILE_SUFFIX + ".npy")
+    transformed_unresampled_train_labels_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                                  os.path.splitext(TRAIN_FILE_NAME)[0] + DATA_TRANSFORMATION_UNRESAMPLED_FILE_SUFFIX +
+                                                                  DATA_TRANSFORMATION_LABELS_FILE_SUFFIX + ".npy")
+    validation_split: float = DATA_TRANSFORMATION_VALIDATION_SPLIT
+    features_dtype: str = DATA_TRANSFORMATION_FEATURES_DTYPE
+    labels_dtype: str = DATA_TRANSFORMATION_LABELS_DTYPE
+    transformed_object_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR, PREPROCESSING_OBJECT_FILE_NAME)
+    compiled_object_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,
+                                             COMPILED_PREPROCESSING_OBJECT_FILE_NAME)
+    compiled_check_rows: int = DATA_TRANSFORMATION_COMPILED_CHECK_ROWS
+    preprocessor_fit_report_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_PREPROCESSOR_FIT_REPORT_FILE_NAME)
+    preprocessor_n_jobs: int = DATA_TRANSFORMATION_PREPROCESSOR_N_JOBS
+    preprocessor_fit_sample_size: int = DATA_TRANSFORMATION_PREPROCESSOR_FIT_SAMPLE_SIZE
+    preprocessor_fit_check: bool = DATA_TRANSFORMATION_PREPROCESSOR_FIT_CHECK
+    chunked: bool = DATA_TRANSFORMATION_CHUNKED
+    chunk_size: int = DATA_TRANSFORMATION_CHUNK_SIZE
+    resampling_report_file_path = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_RESAMPLING_REPORT_FILE_NAME)
+    resampling_strategy: str = DATA_TRANSFORMATION_RESAMPLING_STRATEGY
+    resampling_fallback_strategy: str = DATA_TRANSFORMATION_RESAMPLING_FALLBACK_STRATEGY
+    resampling_n_jobs: int = DATA_TRANSFORMATION_RESAMPLING_N_JOBS
+    resampling_nn_algorithm: str = DATA_TRANSFORMATION_RESAMPLING_NN_ALGORITHM
+    resampling_working_memory: int = DATA_TRANSFORMATION_RESAMPLING_WORKING_MEMORY
+    resampling_max_rows: int = DATA_TRANSFORMATION_RESAMPLING_MAX_ROWS
+    resampling_time_budget: int = DATA_TRANSFORMATION_RESAMPLING_TIME_BUDGET
+    resampling_pilot_rows: int = DATA_TRANSFORMATION_RESAMPLING_PILOT_ROWS
+
+    def __post_init__(self):
+        # sparse features are saved as CSR .npz archives, dense features as .npy arrays
+        features_file_extension = ".npz" if self.sparse_output else ".npy"
+        self.transformed_train_file_path = os.path.join(self.data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                        os.path.splitext(TRAIN_FILE_NAME)[0] + features_file_extension)
+        self.transformed_test_file_path = os.path.join(self.data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                       os.path.splitext(TEST_FILE_NAME)[0] + features_file_extension)
+        self.transformed_validation_file_path = os.path.join(self.data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                             DATA_TRANSFORMATION_VALIDATION_FILE_NAME + features_file_extension)
+        self.transformed_unresampled_train_file_path = os.path.join(self.data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                                    os.path.splitext(TRAIN_FILE_NAME)[0] +
+                                                                    DATA_TRANSFORMATION_UNRESAMPLED_FILE_SUFFIX + features_file_extension)
+
+
+@dataclass
+class ModelTunerConfig:
+    model_tuner_dir = os.path.join(training_pipeline_config.artifact_dir, MODEL_TUNER_DIR_NAME)
+    best_params_file_path = os.path.join(model_tuner_dir, MODEL_TUNER_BEST_PARAMS_FILE_NAME)
+    tuning_report_file_path = os.path.join(model_tuner_dir, MODEL_TUNER_REPORT_FILE_NAME)
+    fold_cache_dir = os.path.join(ARTIFACTS_DIR, MODEL_TUNER_DIR_NAME, MODEL_TUNER_FOLD_CACHE_DIR)
+    checkpoint_file_path = os.path.join(ARTIFACTS_DIR, MODEL_TUNER_DIR_NAME, MODEL_TUNER_CHECKPOINT_FILE_NAME)
+    model_config_file_path = MODEL_TRAINER_MODEL_CONFIG_FILE_PATH
+    enabled: bool = MODEL_TUNER_ENABLED
+    method: str = MODEL_TUNER_METHOD
+    n_folds: int = MODEL_TUNER_N_FOLDS
+    factor: int = MODEL_TUNER_FACTOR
+    min_resources: int = MODEL_TUNER_MIN_RESOURCES
+    max_configurations: int = MODEL_TUNER_MAX_CONFIGURATIONS
+    n_workers: int = MODEL_TUNER_N_WORKERS
+    mp_context: str = MODEL_TRAINER_MP_CONTEXT
+    early_stopping_rounds: int = MODEL_TRAINER_EARLY_STOPPING_ROUNDS
+
+
+@dataclass
+class ModelTrainerConfig:
+    model_trainer_dir = os.path.join(training_pipeline_config.artifact_dir, MODEL_TRAINER_DIR_NAME)
+    trained_model_file_path = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_TRAINER_TRAINED_MODEL_NAME)
+    trained_model_package_dir = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_PACKAGE_DIR_NAME)
+    candidates_dir = os.path.join(model_trainer_dir, MODEL_TRAINER_CANDIDATES_DIR)
+    training_report_file_path = os.path.join(model_trainer_dir, MODEL_TRAINER_REPORT_FILE_NAME)
+    model_config_file_path = MODEL_TRAINER_MODEL_CONFIG_FILE_PATH
+    expected_score: float = MODEL_TRAINER_EXPECTED_SCORE
+    n_workers: int = MODEL_TRAINER_N_WORKERS
+    mp_context: str = MODEL_TRAINER_MP_CONTEXT
+    time_budget: int = MODEL_TRAINER_TIME_BUDGET
+    hard_time_limit_factor: float = MODEL_TRAINER_HARD_TIME_LIMIT_FACTOR
+    early_stopping_rounds: int = MODEL_TRAINER_EARLY_STOPPING_ROUNDS
+
+
+@dataclass
+class ModelEvaluationConfig:
+    model_evaluation_dir = os.path.join(training_pipeline_config.artifact_dir, MODEL_EVALUATION_DIR_NAME)
+    evaluation_report_file_path = os.path.join(model_evaluation_dir, MODEL_EVALUATION_REPORT_FILE_NAME)
+    changed_threshold_score: float = MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE
+    require_significance: bool = MODEL_EVALUATION_REQUIRE_SIGNIFICANCE
+    batch_size: int = MODEL_EVALUATION_BATCH_SIZE
+    n_bins: int = MODEL_EVALUATION_N_BINS
+    thresholds: tuple = MODEL_EVALUATION_THRESHOLDS
+    decision_threshold: float = MODEL_EVALUATION_DECISION_THRESHOLD
+    n_bootstrap: int = MODEL_EVALUATION_N_BOOTSTRAP
+    confidence_level: float = MODEL_EVALUATION_CONFIDENCE_LEVEL
+
+
+@dataclass
+class ModelRegistryConfig:
+    backend: str = MODEL_REGISTRY_BACKEND
+    registry_dir = MODEL_REGISTRY_DIR
+    pointer_file_name: str = MODEL_REGISTRY_POINTER_FILE_NAME
+    bucket_name: str = MODEL_REGISTRY_BUCKET_NAME
+    prefix: str = MODEL_REGISTRY_PREFIX
+    region_name: str = REGION_NAME
+    download_dir = MODEL_REGISTRY_DOWNLOAD_DIR
+    cache_size: int = MODEL_REGISTRY_CACHE_SIZE
+    check_interval: float = MODEL_REGISTRY_CHECK_INTERVAL
+
+
+@dataclass
+class ModelPusherConfig:
+    model_pusher_dir = os.path.join(training_pipeline_config.artifact_dir, MODEL_PUSHER_DIR_NAME)
+    push_report_file_path = os.path.join(model_pusher_dir, MODEL_PUSHER_REPORT_FILE_NAME)
+    promote: bool = MODEL_PUSHER_PROMOTE
+
+
+@dataclass
+class BatchInferenceConfig:
+    batch_inference_dir = BATCH_INFERENCE_DIR
+    output_file_format: str = BATCH_INFERENCE_OUTPUT_FILE_FORMAT
+    chunk_size: int = BATCH_INFERENCE_CHUNK_SIZE
+    n_workers: int = BATCH_INFERENCE_N_WORKERS
+    mp_context: str = BATCH_INFERENCE_MP_CONTEXT
+    key_columns: tuple = BATCH_INFERENCE_KEY_COLUMNS
+    decision_threshold: float = BATCH_INFERENCE_DECISION_THRESHOLD
+
+
+@dataclass
+class AppConfig:
+    host: str = APP_HOST
+    port: int = APP_PORT
+    micro_batching: bool = APP_MICRO_BATCHING
+    max_batch_size: int = APP_MAX_BATCH_SIZE
+    max_wait_ms: float = APP_MAX_WAIT_MS
+    executor: str = APP_EXECUTOR
+    n_executor_workers: int = APP_N_EXECUTOR_WORKERS
+    decision_threshold: float = APP_DECISION_THRESHOLD
@@ -1,7 +1,14 @@
 import sys
+from typing import Optional
 
+import numpy as np
+import pandas as pd
 from pandas import DataFrame
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, PowerTransformer, StandardScaler
+from visa.constants import COMPILED_TREE_ENSEMBLE_MAX_ROWS, CURRENT_YEAR
+from visa.entity.tree_ensemble import compile_tree_ensemble
 from visa.exception import USVisaException
 from visa.logger import logging
 
@@ -20,32 +27,333 @@ class TargetValueMapping:
     def reverse_mapping(self):
         mapping_response = self._asdict()
         return dict(zip(mapping_response.values(), mapping_response.keys()))
-    
-    
+
+    def encode(self, target: pd.Series) -> np.ndarray:
+        """
+        Maps the target labels to their integer values. Categorical targets are mapped once per category and the
+        result is gathered by category code, without materialising the labels.
+        """
+        try:
+            mapping = self._asdict()
+            if isinstance(target.dtype, pd.CategoricalDtype):
+                category_values = np.array([mapping[category] for category in target.cat.categories], dtype=np.int8)
+                return category_values[target.cat.codes.to_numpy()]
+            return target.map(mapping).to_numpy(dtype=np.int8)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+
+class FeatureEngineer(BaseEstimator, TransformerMixin):
+    """
+    First step of the preprocessor: derives company_age from yr_of_estab and leaves out the target and the schema
+    drop_columns. The reference year is frozen at fit time, so a preprocessor fitted in one year keeps computing the
+    same ages when it serves predictions in the next one.
+    The output frame references the input columns instead of copying the input frame.
+    """
+
+    def __init__(self, drop_columns: tuple = (), reference_year: Optional[int] = None,
+                 year_column: str = "yr_of_estab", age_column: str = "company_age"):
+        self.drop_columns = drop_columns
+        self.reference_year = reference_year
+        self.year_column = year_column
+        self.age_column = age_column
+
+    def fit(self, X: DataFrame, y=None) -> "FeatureEngineer":
+        self.reference_year_ = self.reference_year if self.reference_year is not None else CURRENT_YEAR
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.kept_columns_ = [column for column in X.columns
+                              if column not in self.drop_columns and column != self.age_column]
+        return self
+
+    def transform(self, X: DataFrame) -> DataFrame:
+        columns = {column: X[column] for column in self.kept_columns_}
+        columns[self.age_column] = np.subtract(self.reference_year_, X[self.year_column].to_numpy())
+        return DataFrame(columns, index=X.index, copy=False)
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return np.asarray(self.kept_columns_ + [self.age_column], dtype=object)
+
+
+class CompiledPreprocessor:
+    """
+    Flat, NumPy-only copy of a fitted preprocessor Pipeline of FeatureEngineer and ColumnTransformer, for scoring
+    single records and small batches without the pandas and sklearn validation overhead of Pipeline.transform.
+    The fitted state is reduced to category-to-index lookup tables with the one-hot offsets and ordinal positions,
+    Yeo-Johnson lambdas with their standardisation constants and the scaler constants, each with the output
+    columns it writes. The output is the dense float64 matrix of the ColumnTransformer.
+    """
+
+    ARRAY_NAMES = ("power_positions", "power_lambdas", "power_mean", "power_scale",
+                   "scale_positions", "scale_mean", "scale_scale")
+
+    def __init__(self, preprocessor: Pipeline):
+        try:
+            feature_engineer = preprocessor.named_steps['FeatureEngineer']
+            column_transformer = preprocessor.named_steps['ColumnTransformer']
+            self.reference_year = feature_engineer.reference_year_
+            self.year_column = feature_engineer.year_column
+            self.age_column = feature_engineer.age_column
+            self.one_hot = []
+            self.ordinal = []
+            power_columns, power_positions, power_lambdas, power_mean, power_scale = [], [], [], [], []
+            scale_columns, scale_positions, scale_mean, scale_scale = [], [], [], []
+            offset = 0
+            for name, transformer, columns in column_transformer.transformers_:
+                if isinstance(transformer, str) and transformer == "drop":
+                    continue
+                estimators = [estimator for _, estimator in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+                if len(estimators) != 1:
+                    raise ValueError(f"Branch {name} has {len(estimators)} steps, only single step branches can be compiled")
+                estimator = estimators[0]
+                if isinstance(estimator, OneHotEncoder):
+                    if estimator.drop is not None or getattr(estimator, "_infrequent_enabled", False):
+                        raise ValueError(f"Branch {name}: only one-hot encoders without drop and infrequent categories can be compiled")
+                    for column, categories in zip(columns, estimator.categories_):
+                        self.one_hot.append((column, {category: index for index, category in enumerate(categories.tolist())}, offset))
+                        offset += len(categories)
+                elif isinstance(estimator, OrdinalEncoder):
+                    for column, categories in zip(columns, estimator.categories_):
+                        self.ordinal.append((column, {category: index for index, category in enumerate(categories.tolist())}, offset))
+                        offset += 1
+                elif isinstance(estimator, PowerTransformer) and estimator.method == "yeo-johnson":
+                    power_columns.extend(columns)
+                    power_positions.extend(range(offset, offset + len(columns)))
+                    power_lambdas.extend(estimator.lambdas_)
+                    power_mean.extend(estimator._scaler.mean_ if estimator.standardize else np.zeros(len(columns)))
+                    power_scale.extend(estimator._scaler.scale_ if estimator.standardize else np.ones(len(columns)))
+                    offset += len(columns)
+                elif isinstance(estimator, StandardScaler):
+                    scale_columns.extend(columns)
+                    scale_positions.extend(range(offset, offset + len(columns)))
+                    scale_mean.extend(estimator.mean_ if estimator.with_mean else np.zeros(len(columns)))
+                    scale_scale.extend(estimator.scale_ if estimator.with_std else np.ones(len(columns)))
+                    offset += len(columns)
+                else:
+                    raise ValueError(f"Branch {name}: {type(estimator).__name__} can not be compiled")
+            self.power_columns = power_columns
+            self.power_positions = np.asarray(power_positions, dtype=np.intp)
+            self.power_lambdas = np.asarray(power_lambdas, dtype=np.float64)
+            self.lambda_zero = np.abs(self.power_lambdas) < np.spacing(1.0)
+            self.lambda_two = np.abs(self.power_lambdas - 2) < np.spacing(1.0)
+            self.positive_lambdas = np.where(self.lambda_zero, 1.0, self.power_lambdas)
+            self.negative_lambdas = np.where(self.lambda_two, 1.0, 2 - self.power_lambdas)
+            self.power_mean = np.asarray(power_mean, dtype=np.float64)
+            self.power_scale = np.asarray(power_scale, dtype=np.float64)
+            self.scale_columns = scale_columns
+            self.scale_positions = np.asarray(scale_positions, dtype=np.intp)
+            self.scale_mean = np.asarray(scale_mean, dtype=np.float64)
+            self.scale_scale = np.asarray(scale_scale, dtype=np.float64)
+            self.n_features_out = offset
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def get_state(self) -> tuple:
+        """
+        Returns the fitted state as a dict of float64 arrays and a JSON serialisable dict of everything else,
+        the preprocessor part of a model package.
+        """
+        arrays = {name: np.asarray(getattr(self, name), dtype=np.float64) for name in self.ARRAY_NAMES}
+        metadata = {"reference_year": int(self.reference_year), "year_column": self.year_column, "age_column": self.age_column,
+                    "one_hot": [[column, list(lookup), offset] for column, lookup, offset in self.one_hot],
+                    "ordinal": [[column, list(lookup), offset] for column, lookup, offset in self.ordinal],
+                    "power_columns": list(self.power_columns), "scale_columns": list(self.scale_columns),
+                    "n_features_out": int(self.n_features_out)}
+        return arrays, metadata
+
+    @classmethod
+    def from_state(cls, arrays: dict, metadata: dict) -> "CompiledPreprocessor":
+        """
+        Rebuilds a compiled preprocessor from the output of get_state, without the fitted sklearn Pipeline.
+        The arrays may be read-only memory maps.
+        """
+        try:
+            compiled = cls.__new__(cls)
+            compiled.reference_year = metadata["reference_year"]
+            compiled.year_column = metadata["year_column"]
+            compiled.age_column = metadata["age_column"]
+            compiled.one_hot = [(column, {category: index for index, category in enumerate(categories)}, offset)
+                                for column, categories, offset in metadata["one_hot"]]
+            compiled.ordinal = [(column, {category: index for index, category in enumerate(categories)}, offset)
+                                for column, categories, offset in metadata["ordinal"]]
+            compiled.power_columns = metadata["power_columns"]
+            compiled.scale_columns = metadata["scale_columns"]
+            compiled.n_features_out = metadata["n_features_out"]
+            for name in cls.ARRAY_NAMES:
+                array = arrays[name]
+                setattr(compiled, name, array.astype(np.intp) if name.endswith("_positions") else array)
+            compiled.lambda_zero = np.abs(compiled.power_lambdas) < np.spacing(1.0)
+            compiled.lambda_two = np.abs(compiled.power_lambdas - 2) < np.spacing(1.0)
+            compiled.positive_lambdas = np.where(compiled.lambda_zero, 1.0, compiled.power_lambdas)
+            compiled.negative_lambdas = np.where(compiled.lambda_two, 1.0, 2 - compiled.power_lambdas)
+            return compiled
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def yeo_johnson(self, x: np.ndarray) -> np.ndarray:
+        """
+        Yeo-Johnson transform of the columns of x with the lambda of each column, as computed by PowerTransformer,
+        evaluated for all columns at once.
+        """
+        positive = x >= 0
+        x_positive = np.where(positive, x, 0.0)
+        x_negative = np.where(positive, 0.0, -x)
+        positive_values = np.where(self.lambda_zero, np.log1p(x_positive),
+                                   (np.power(x_positive + 1, self.positive_lambdas) - 1) / self.positive_lambdas)
+        negative_values = np.where(self.lambda_two, -np.log1p(x_negative),
+                                   -(np.power(x_negative + 1, self.negative_lambdas) - 1) / self.negative_lambdas)
+        return np.where(positive, positive_values, negative_values)
+
+    def get_numerical_matrix(self, records, columns: list, n_rows: int, is_single: bool) -> np.ndarray:
+        """
+        Returns the values of numerical columns as a float64 matrix with one column each.
+        """
+        if is_single:
+            return np.array([[self.reference_year - records[self.year_column] if column == self.age_column else records[column]
+                              for column in columns]], dtype=np.float64)
+        return np.column_stack([np.asarray(self.get_column(records, column, n_rows, is_single), dtype=np.float64)
+                                for column in columns])
+
+    def get_column(self, records, column: str, n_rows: int, is_single: bool) -> np.ndarray:
+        """
+        Returns the values of a column as an array, deriving the age column from the year column.
+        """
+        if column == self.age_column:
+            return self.reference_year - np.asarray(self.get_column(records, self.year_column, n_rows, is_single), dtype=np.float64)
+        values = records[column]
+        if is_single:
+            return np.array([values], dtype=object)
+        return values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values, dtype=object)
+
+    def get_category_indices(self, records, column: str, lookup: dict, n_rows: int, is_single: bool) -> np.ndarray:
+        """
+        Returns the category indices of the values of a column.
+        """
+        try:
+            if is_single:
+                return lookup[records[column]]
+            return np.fromiter((lookup[value] for value in self.get_column(records, column, n_rows, is_single)),
+                               dtype=np.intp, count=n_rows)
+        except KeyError as e:
+            raise ValueError(f"Found unknown category {e.args[0]!r} in column {column}") from e
+
+    def transform(self, records) -> np.ndarray:
+        """
+        Encodes raw records. records is a dict of one record, a list of record dicts, a dict of column sequences or
+        a DataFrame, with the raw columns of the training data.
+
+        Args:
+            records: The raw records.
+        Returns:
+            np.ndarray: The transformed features, one row per record.
+        Raises:
+            USVisaException: If a column is missing or a category was not seen in training.
+        """
+        try:
+            is_single = False
+            if isinstance(records, list):
+                n_rows = len(records)
+                records = {column: [record[column] for record in records] for column in (records[0] if records else ())}
+            elif isinstance(records, DataFrame):
+                n_rows = len(records)
+            else:
+                is_single = np.ndim(next(iter(records.values()))) == 0
+                n_rows = 1 if is_single else len(next(iter(records.values())))
+            out = np.zeros((n_rows, self.n_features_out), dtype=np.float64)
+            for column, lookup, offset in self.one_hot:
+                out[np.arange(n_rows), offset + self.get_category_indices(records, column, lookup, n_rows, is_single)] = 1.0
+            for column, lookup, offset in self.ordinal:
+                out[:, offset] = self.get_category_indices(records, column, lookup, n_rows, is_single)
+            if self.power_columns:
+                power_input = self.get_numerical_matrix(records, self.power_columns, n_rows, is_single)
+                out[:, self.power_positions] = (self.yeo_johnson(power_input) - self.power_mean) / self.power_scale
+            if self.scale_columns:
+                scale_input = self.get_numerical_matrix(records, self.scale_columns, n_rows, is_single)
+                out[:, self.scale_positions] = (scale_input - self.scale_mean) / self.scale_scale
+            return out
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+
 class VisaModel:
-    def __init__(self, preprocessing_object: Pipeline, trained_model_object: object):
+    def __init__(self, preprocessing_object: Optional[Pipeline], trained_model_object: object,
+                 compiled_preprocessing_object: Optional[CompiledPreprocessor] = None):
         """
-        :param preprocessing_object: Input Object of preprocesser
+        :param preprocessing_object: Input Object of preprocesser, None for a model loaded from a model package
         :param trained_model_object: Input Object of trained model 
+        :param compiled_preprocessing_object: Input Object of the compiled preprocesser, compiled on first use if None
         """
         self.preprocessing_object = preprocessing_object
         self.trained_model_object = trained_model_object
+        self.compiled_preprocessing_object = compiled_preprocessing_object
+        self.compiled_model_object = None
+
+    def get_prediction_model(self, n_rows: int) -> object:
+        """
+        Returns the model to score a batch of n_rows transformed rows with: the compiled tree ensemble of the
+        trained model for small batches, where the per-call overhead of the library dominates, and the trained model
+        otherwise. The ensemble is compiled on the first small batch, and False is kept if the model can not be compiled.
+        """
+        compiled_model = getattr(self, "compiled_model_object", None)
+        if compiled_model is None and n_rows <= max(COMPILED_TREE_ENSEMBLE_MAX_ROWS.values()):
+            from visa.utils.model_package import LazyLearner
+
+            learner = self.trained_model_object
+            compiled_model = compile_tree_ensemble(learner.load() if isinstance(learner, LazyLearner) else learner) or False
+            self.compiled_model_object = compiled_model
+        if compiled_model and n_rows <= compiled_model.max_rows:
+            return compiled_model
+        return self.trained_model_object
 
     def predict(self, dataframe: DataFrame) -> DataFrame:
         """
         Function accepts raw inputs and then transformed raw input using preprocessing_object
         which guarantees that the inputs are in the same format as the training data
+        The preprocessing_object starts with the fitted FeatureEngineer, so raw records with yr_of_estab
+        get the same company_age as at training time
         At last it performs prediction on transformed features
         """
-        logging.info("Entered predict method of UTruckModel class")
+        logging.info("Entered predict method of VisaModel class")
 
         try:
             logging.info("Using the trained model to get predictions")
 
-            transformed_feature = self.preprocessing_object.transform(dataframe)
+            if self.preprocessing_object is None:
+                transformed_feature = self.compiled_preprocessing_object.transform(dataframe)
+            else:
+                transformed_feature = self.preprocessing_object.transform(dataframe)
 
             logging.info("Used the trained model to get predictions")
-            return self.trained_model_object.predict(transformed_feature)
+            return self.get_prediction_model(len(transformed_feature)).predict(transformed_feature)
+
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def predict_records(self, records) -> np.ndarray:
+        """
+        Function accepts raw records as a dict of one record, a list of record dicts or a dict of columns
+        and encodes them with the compiled preprocessor, skipping the pandas and sklearn overhead of
+        preprocessing_object for single records and small batches
+        At last it performs prediction on transformed features
+        """
+        try:
+            if getattr(self, "compiled_preprocessing_object", None) is None:
+                self.compiled_preprocessing_object = CompiledPreprocessor(self.preprocessing_object)
+            transformed_feature = self.compiled_preprocessing_object.transform(records)
+            return self.get_prediction_model(len(transformed_feature)).predict(transformed_feature)
+
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def predict_proba(self, records) -> np.ndarray:
+        """
+        Function accepts raw records like predict_records and returns the predicted probability
+        of the positive class, so model evaluation can score the model at any threshold
+        """
+        try:
+            if getattr(self, "compiled_preprocessing_object", None) is None:
+                self.compiled_preprocessing_object = CompiledPreprocessor(self.preprocessing_object)
+            transformed_feature = self.compiled_preprocessing_object.transform(records)
+            return self.get_prediction_model(len(transformed_feature)).predict_proba(transformed_feature)[:, 1]
 
         except Exception as e:
             raise USVisaException(e, sys) from e
@@ -0,0 +1,346 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from visa.constants import MODEL_PACKAGE_MANIFEST_FILE_NAME
+from visa.entity.config_entity import ModelRegistryConfig
+from visa.entity.estimator import VisaModel
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.model_package import get_file_sha256, load_model_package, read_model_package_manifest
+
+VERSIONS_DIR_NAME = "versions"
+VERSION_PREFIX = "v"
+
+
+def get_version_number(version: str) -> int:
+    return int(version[len(VERSION_PREFIX):])
+
+
+class ModelRegistryBackend(ABC):
+    """
+    Storage of a model registry: immutable model package versions and a champion pointer. A version must only
+    become visible once all of its files are stored, and the pointer must be replaced atomically, so readers see
+    either the old or the new champion and never a partial one.
+    """
+
+    uri: str
+
+    @abstractmethod
+    def list_versions(self) -> List[str]:
+        """
+        Returns the stored versions, oldest first.
+        """
+
+    @abstractmethod
+    def upload_version(self, version: str, package_dir: str) -> None:
+        """
+        Stores a package directory as a new version, raising FileExistsError if the version exists.
+        """
+
+    @abstractmethod
+    def download_version(self, version: str) -> str:
+        """
+        Returns a local directory holding the package of a version.
+        """
+
+    @abstractmethod
+    def read_pointer(self) -> Optional[dict]:
+        """
+        Returns the champion pointer, None if no version was promoted.
+        """
+
+    @abstractmethod
+    def write_pointer(self, pointer: dict) -> None:
+        """
+        Replaces the champion pointer atomically.
+        """
+
+
+class LocalModelRegistryBackend(ModelRegistryBackend):
+    """
+    Registry in a local or shared directory. A version is copied to a temporary directory and renamed into
+    versions/, and the pointer file is written to a temporary file and swapped in with os.replace, both atomic
+    on POSIX file systems.
+    """
+
+    def __init__(self, registry_dir: str, pointer_file_name: str):
+        self.registry_dir = registry_dir
+        self.versions_dir = os.path.join(registry_dir, VERSIONS_DIR_NAME)
+        self.pointer_file_path = os.path.join(registry_dir, pointer_file_name)
+        self.uri = os.path.abspath(registry_dir)
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+    def list_versions(self) -> List[str]:
+        return sorted((name for name in os.listdir(self.versions_dir) if name.startswith(VERSION_PREFIX)),
+                      key=get_version_number)
+
+    def upload_version(self, version: str, package_dir: str) -> None:
+        version_dir = os.path.join(self.versions_dir, version)
+        if os.path.exists(version_dir):
+            raise FileExistsError(version_dir)
+        temp_version_dir = os.path.join(self.versions_dir, f".tmp-{uuid.uuid4().hex}")
+        shutil.copytree(package_dir, temp_version_dir)
+        try:
+            os.rename(temp_version_dir, version_dir)
+        except OSError as e:
+            shutil.rmtree(temp_version_dir, ignore_errors=True)
+            raise FileExistsError(version_dir) from e
+
+    def download_version(self, version: str) -> str:
+        version_dir = os.path.join(self.versions_dir, version)
+        if not os.path.isdir(version_dir):
+            raise FileNotFoundError(f"Model version {version} is not in the registry at: {self.uri}")
+        return version_dir
+
+    def read_pointer(self) -> Optional[dict]:
+        try:
+            with open(self.pointer_file_path) as file_obj:
+                return json.load(file_obj)
+        except FileNotFoundError:
+            return None
+
+    def write_pointer(self, pointer: dict) -> None:
+        temp_pointer_file_path = f"{self.pointer_file_path}.tmp-{uuid.uuid4().hex}"
+        with open(temp_pointer_file_path, "w") as file_obj:
+            json.dump(pointer, file_obj)
+            file_obj.flush()
+            os.fsync(file_obj.fileno())
+        os.replace(temp_pointer_file_path, self.pointer_file_path)
+
+
+class S3ModelRegistryBackend(ModelRegistryBackend):
+    """
+    Registry in an S3 bucket. The manifest of a version is uploaded last with a conditional write, so a version is
+    listed only once all its files are stored and only one of two concurrent publishers of a version succeeds. The
+    other gets FileExistsError, and a package file it overwrote in the meantime fails the sha256 check of the
+    winning manifest on download instead of being served. The pointer is a single object, which S3 replaces atomically.
+    Downloaded versions are kept in a local directory, as versions never change.
+    """
+
+    def __init__(self, bucket_name: str, prefix: str, pointer_file_name: str, download_dir: str, region_name: str):
+        import boto3
+
+        self.s3_client = boto3.client("s3", region_name=region_name)
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip("/")
+        self.pointer_key = f"{self.prefix}/{pointer_file_name}"
+        self.download_dir = download_dir
+        self.uri = f"s3://{bucket_name}/{self.prefix}"
+
+    def list_versions(self) -> List[str]:
+        versions = set()
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{self.prefix}/{VERSIONS_DIR_NAME}/"):
+            for obj in page.get("Contents", []):
+                version, file_name = obj["Key"].split("/")[-2:]
+                if file_name == MODEL_PACKAGE_MANIFEST_FILE_NAME:
+                    versions.add(version)
+        return sorted(versions, key=get_version_number)
+
+    def upload_version(self, version: str, package_dir: str) -> None:
+        from botocore.exceptions import ClientError
+
+        version_uri = f"{self.uri}/{VERSIONS_DIR_NAME}/{version}"
+        if version in self.list_versions():
+            raise FileExistsError(version_uri)
+        version_prefix = f"{self.prefix}/{VERSIONS_DIR_NAME}/{version}"
+        for file_name in sorted(os.listdir(package_dir)):
+            if file_name != MODEL_PACKAGE_MANIFEST_FILE_NAME:
+                self.s3_client.upload_file(os.path.join(package_dir, file_name), self.bucket_name,
+                                           f"{version_prefix}/{file_name}")
+        with open(os.path.join(package_dir, MODEL_PACKAGE_MANIFEST_FILE_NAME), "rb") as file_obj:
+            try:
+                self.s3_client.put_object(Bucket=self.bucket_name, Body=file_obj.read(), IfNoneMatch="*",
+                                          Key=f"{version_prefix}/{MODEL_PACKAGE_MANIFEST_FILE_NAME}")
+            except ClientError as e:
+                if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 412:
+                    raise FileExistsError(version_uri) from e
+                raise
+
+    def download_version(self, version: str) -> str:
+        version_dir = os.path.join(self.download_dir, version)
+        if os.path.isdir(version_dir):
+            return version_dir
+        temp_version_dir = os.path.join(self.download_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(temp_version_dir)
+        version_prefix = f"{self.prefix}/{VERSIONS_DIR_NAME}/{version}/"
+        response = self.s3_client.list_objects_v2(Bucket=self.bucket_name, Prefix=version_prefix)
+        for obj in response.get("Contents", []):
+            self.s3_client.download_file(self.bucket_name, obj["Key"],
+                                         os.path.join(temp_version_dir, obj["Key"][len(version_prefix):]))
+        for file_name, sha256 in read_model_package_manifest(temp_version_dir)["files"].items():
+            if get_file_sha256(os.path.join(temp_version_dir, file_name)) != sha256:
+                shutil.rmtree(temp_version_dir, ignore_errors=True)
+                raise ValueError(f"Model version {version} file {file_name} does not match its sha256 in the manifest")
+        try:
+            os.rename(temp_version_dir, version_dir)
+        except OSError:
+            shutil.rmtree(temp_version_dir, ignore_errors=True)
+        return version_dir
+
+    def read_pointer(self) -> Optional[dict]:
+        try:
+            return json.loads(self.s3_client.get_object(Bucket=self.bucket_name, Key=self.pointer_key)["Body"].read())
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+
+    def write_pointer(self, pointer: dict) -> None:
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=self.pointer_key, Body=json.dumps(pointer).encode())
+
+
+class ModelRegistry:
+    """
+    Versioned registry of model packages with a champion pointer. Publishing stores a package as the next
+    version, and promoting a version swaps the pointer, so serving processes switch to it on their next check.
+    """
+
+    def __init__(self, backend: ModelRegistryBackend):
+        self.backend = backend
+
+    def publish(self, package_dir: str, max_attempts: int = 5) -> str:
+        """
+        Stores a model package as the next version and returns the version.
+        """
+        try:
+            for _ in range(max_attempts):
+                versions = self.backend.list_versions()
+                version = f"{VERSION_PREFIX}{get_version_number(versions[-1]) + 1 if versions else 1}"
+                try:
+                    self.backend.upload_version(version, package_dir)
+                except FileExistsError:
+                    logging.info(f"Model version {version} was published concurrently, retrying with the next version")
+                    continue
+                logging.info(f"Published model package: {package_dir} as version {version} to: {self.backend.uri}")
+                return version
+            raise RuntimeError(f"Could not publish a model version in {max_attempts} attempts")
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def promote(self, version: str) -> dict:
+        """
+        Makes a published version the champion by swapping the pointer and returns the new pointer.
+        """
+        try:
+            if version not in self.backend.list_versions():
+                raise ValueError(f"Model version {version} is not in the registry at: {self.backend.uri}")
+            previous_pointer = self.backend.read_pointer() or {}
+            pointer = {"version": version, "previous_version": previous_pointer.get("version"),
+                       "promoted_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+            self.backend.write_pointer(pointer)
+            logging.info(f"Promoted model version {version} to champion, previous champion: {pointer['previous_version']}")
+            return pointer
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def get_champion_version(self) -> Optional[str]:
+        try:
+            pointer = self.backend.read_pointer()
+            return pointer["version"] if pointer else None
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def load_model(self, version: str, lazy: bool = True) -> VisaModel:
+        try:
+            return load_model_package(self.backend.download_version(version), lazy=lazy)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+
+def get_model_registry(model_registry_config: ModelRegistryConfig = ModelRegistryConfig()) -> ModelRegistry:
+    """
+    Returns the model registry with the backend of the config, local or s3.
+    """
+    try:
+        if model_registry_config.backend == "local":
+            backend = LocalModelRegistryBackend(model_registry_config.registry_dir, model_registry_config.pointer_file_name)
+        elif model_registry_config.backend == "s3":
+            backend = S3ModelRegistryBackend(model_registry_config.bucket_name, model_registry_config.prefix,
+                                             model_registry_config.pointer_file_name,
+                                             model_registry_config.download_dir, model_registry_config.region_name)
+        else:
+            raise ValueError(f"Model registry backend: {model_registry_config.backend} is not one of local, s3")
+        return ModelRegistry(backend)
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+class ModelCache:
+    """
+    In-process LRU cache of loaded VisaModel versions of a registry. The champion pointer is read at most once
+    every check_interval seconds, and a new champion is loaded on the first request after it was promoted, so
+    serving processes pick up new models without restarting. Versions still in the cache, such as the previous
+    champion after a rollback, are served without loading them again.
+    """
+
+    def __init__(self, registry: ModelRegistry, max_size: int = 2, check_interval: float = 1.0):
+        self.registry = registry
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._champion_version = None
+        self._checked_at = float("-inf")
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0, "pointer_reads": 0}
+
+    def get_champion_version(self) -> str:
+        """
+        Returns the champion version, reading the pointer again once check_interval has passed.
+        """
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            version = self.registry.get_champion_version()
+            self.stats["pointer_reads"] += 1
+            self._checked_at = now
+            if version != self._champion_version:
+                logging.info(f"Champion model version changed from {self._champion_version} to {version}")
+                self._champion_version = version
+        if self._champion_version is None:
+            raise FileNotFoundError(f"No champion model is promoted in the registry at: {self.registry.backend.uri}")
+        return self._champion_version
+
+    def get(self, version: Optional[str] = None) -> VisaModel:
+        """
+        Returns the loaded model of a version, the champion by default.
+        """
+        try:
+            return self.get_with_version(version)[1]
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def get_with_version(self, version: Optional[str] = None) -> Tuple[str, VisaModel]:
+        """
+        Returns the version and the loaded model of a version, the champion by default.
+        """
+        try:
+            version = version or self.get_champion_version()
+            with self._lock:
+                if version in self._models:
+                    self._models.move_to_end(version)
+                    self.stats["hits"] += 1
+                    return version, self._models[version]
+            with self._load_lock:
+                with self._lock:
+                    if version in self._models:
+                        return version, self._models[version]
+                start_time = time.perf_counter()
+                model = self.registry.load_model(version, lazy=False)
+                logging.info(f"Loaded model version {version} in {time.perf_counter() - start_time:.3f}s")
+                with self._lock:
+                    self._models[version] = model
+                    self.stats["loads"] += 1
+                    while len(self._models) > self.max_size:
+                        evicted_version, _ = self._models.popitem(last=False)
+                        self.stats["evictions"] += 1
+                        logging.info(f"Evicted model version {evicted_version} from the model cache")
+            return version, model
+        except Exception as e:
+            raise USVisaException(e, sys) from e
@@ -0,0 +1,289 @@
+import json
+import os
+import sys
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+from visa.constants import COMPILED_TREE_ENSEMBLE_MAX_ROWS
+from visa.exception import USVisaException
+from visa.logger import logging
+
+
+class CompiledTreeEnsemble:
+    """
+    Flat, NumPy-only copy of a trained binary tree ensemble for batch prediction without the per-call overhead of
+    the XGBoost, CatBoost and sklearn predict methods.
+
+    Trees with nodes (XGBoost, sklearn forests and gradient boosting) are concatenated into node arrays of split
+    feature, threshold, interleaved left and right child, missing value direction and leaf value. Leaves point to
+    themselves, so all trees of a block of rows descend one level per step for max_depth steps.
+    CatBoost oblivious trees use one split per level, so they are kept as (tree, level) arrays of split feature,
+    border and missing value direction with the leaf values of every tree, and the leaf index of all trees is
+    computed in one step.
+
+    Missing values are routed as the library routes them whenever a block of rows holds NaN, whether or not the
+    model saw missing values in training: the learned direction of an XGBoost node, right in sklearn trees and the
+    nan_value_treatment of the CatBoost feature.
+
+    Features are cast to float32, as the libraries do, and compared with the thresholds as the library compares them.
+    """
+
+    def __init__(self, layout: str, output: str, n_features: int, base_margin: float = 0.0, **arrays):
+        """
+        :param layout: "nodes" or "oblivious"
+        :param output: "logistic" for a margin summed over the trees, "mean" for leaf probabilities averaged over the trees
+        :param n_features: Number of input features
+        :param base_margin: Margin added to the sum of the leaf values
+        :param arrays: The arrays of the layout
+        """
+        self.layout = layout
+        self.output = output
+        self.n_features = n_features
+        self.base_margin = base_margin
+        self.strict = arrays.pop("strict", False)
+        self.max_depth = arrays.pop("max_depth", 0)
+        self.scale = arrays.pop("scale", 1.0)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.max_rows = 0
+        self.n_trees = len(self.roots) if layout == "nodes" else len(self.leaf_values)
+        if layout == "nodes":
+            self.is_leaf = self.children[0::2] == np.arange(len(self.feature))
+
+    @classmethod
+    def from_nodes(cls, trees: list, output: str, n_features: int, base_margin: float = 0.0,
+                   strict: bool = False) -> "CompiledTreeEnsemble":
+        """
+        Concatenates trees given as (feature, threshold, left, right, default_left, value) arrays with -1 children at
+        the leaves into the node layout.
+        """
+        roots, offset, max_depth = [], 0, 0
+        features, thresholds, lefts, rights, default_lefts, values = [], [], [], [], [], []
+        for feature, threshold, left, right, default_left, value in trees:
+            n_nodes = len(feature)
+            node_ids = np.arange(n_nodes)
+            is_leaf = np.asarray(left) < 0
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, feature))
+            thresholds.append(np.asarray(threshold, dtype=np.float64))
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            default_lefts.append(np.asarray(default_left, dtype=bool))
+            values.append(np.where(is_leaf, value, 0.0))
+            max_depth = max(max_depth, get_tree_depth(np.asarray(left), np.asarray(right)))
+            offset += n_nodes
+        return cls("nodes", output, n_features, base_margin, strict=strict, max_depth=max_depth,
+                   roots=np.asarray(roots, dtype=np.int64),
+                   feature=np.concatenate(features).astype(np.int64),
+                   threshold=np.concatenate(thresholds),
+                   children=np.column_stack([np.concatenate(lefts), np.concatenate(rights)]).ravel().astype(np.int64),
+                   default_left=np.concatenate(default_lefts),
+                   value=np.concatenate(values).astype(np.float64))
+
+    @classmethod
+    def from_xgboost(cls, model) -> "CompiledTreeEnsemble":
+        """
+        Compiles a binary:logistic XGBClassifier from its JSON model, keeping the trees up to the best iteration when
+        it was trained with early stopping, as predict_proba does.
+        """
+        learner = json.loads(model.get_booster().save_raw(raw_format="json"))["learner"]
+        if learner["objective"]["name"] != "binary:logistic":
+            raise ValueError(f"XGBoost objective {learner['objective']['name']} can not be compiled")
+        gbtree_model = learner["gradient_booster"]["model"]
+        trees = gbtree_model["trees"]
+        try:
+            n_trees = (model.best_iteration + 1) * int(gbtree_model["gbtree_model_param"]["num_parallel_tree"])
+            trees = trees[:n_trees]
+        except AttributeError:
+            pass
+        base_score = float(learner["learner_model_param"]["base_score"])
+        # the JSON model prints the float32 thresholds in short decimal form, so they are rounded back to float32
+        return cls.from_nodes([(tree["split_indices"], np.asarray(tree["split_conditions"], dtype=np.float32),
+                                tree["left_children"], tree["right_children"], tree["default_left"],
+                                tree["split_conditions"]) for tree in trees],
+                              output="logistic", n_features=int(learner["learner_model_param"]["num_feature"]),
+                              base_margin=float(np.log(base_score / (1 - base_score))), strict=True)
+
+    @classmethod
+    def from_sklearn(cls, model) -> "CompiledTreeEnsemble":
+        """
+        Compiles a binary sklearn RandomForestClassifier, ExtraTreesClassifier or GradientBoostingClassifier with
+        the log_loss loss and the default init. Their trees do not learn a missing value direction, so missing
+        values go right, as NaN <= threshold is false.
+        """
+        from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+
+        if len(model.classes_) != 2:
+            raise ValueError("Only binary classifiers can be compiled")
+        if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+            trees = []
+            for estimator in model.estimators_:
+                tree = estimator.tree_
+                value = tree.value[:, 0, :]
+                trees.append((tree.feature, tree.threshold, tree.children_left, tree.children_right,
+                              np.zeros(tree.node_count, dtype=bool), value[:, 1] / np.maximum(value.sum(axis=1), 1e-300)))
+            return cls.from_nodes(trees, output="mean", n_features=model.n_features_in_)
+        if isinstance(model, GradientBoostingClassifier):
+            if getattr(model, "loss", "log_loss") not in ("log_loss", "deviance") or model.init not in (None, "zero"):
+                raise ValueError("Only gradient boosting with the log_loss loss and the default init can be compiled")
+            trees = [(estimator.tree_.feature, estimator.tree_.threshold, estimator.tree_.children_left,
+                      estimator.tree_.children_right, np.zeros(estimator.tree_.node_count, dtype=bool),
+                      model.learning_rate * estimator.tree_.value[:, 0, 0]) for estimator in model.estimators_[:, 0]]
+            base_margin = float(model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0, 0])
+            return cls.from_nodes(trees, output="logistic", n_features=model.n_features_in_, base_margin=base_margin)
+        raise ValueError(f"{type(model).__name__} can not be compiled")
+
+    @classmethod
+    def from_catboost(cls, model) -> "CompiledTreeEnsemble":
+        """
+        Compiles a binary CatBoostClassifier with float features and oblivious trees from its JSON model.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "model.json")
+            model.save_model(file_path, format="json")
+            with open(file_path) as file_obj:
+                catboost_model = json.load(file_obj)
+        if "oblivious_trees" not in catboost_model:
+            raise ValueError("Only CatBoost models with oblivious trees can be compiled")
+        float_features = {feature["feature_index"]: feature["flat_feature_index"]
+                          for feature in catboost_model["features_info"]["float_features"]}
+        # AsIs and AsFalse compare NaN as below every border, AsTrue as above every border
+        nan_above = {feature["feature_index"]: feature.get("nan_value_treatment") == "AsTrue"
+                     for feature in catboost_model["features_info"]["float_features"]}
+        trees = catboost_model["oblivious_trees"]
+        depth = max(len(tree["splits"]) for tree in trees)
+        split_feature = np.zeros((len(trees), depth), dtype=np.int64)
+        split_border = np.full((len(trees), depth), np.inf, dtype=np.float32)
+        split_nan_right = np.zeros((len(trees), depth), dtype=bool)
+        leaf_values = np.zeros((len(trees), 2 ** depth), dtype=np.float64)
+        for tree_index, tree in enumerate(trees):
+            for level, split in enumerate(tree["splits"]):
+                if split["split_type"] != "FloatFeature":
+                    raise ValueError(f"CatBoost split type {split['split_type']} can not be compiled")
+                split_feature[tree_index, level] = float_features[split["float_feature_index"]]
+                split_border[tree_index, level] = split["border"]
+                split_nan_right[tree_index, level] = nan_above[split["float_feature_index"]]
+            leaf_values[tree_index, :len(tree["leaf_values"])] = tree["leaf_values"]
+        scale, bias = catboost_model["scale_and_bias"]
+        return cls("oblivious", "logistic", n_features=len(float_features), base_margin=float(np.sum(bias)),
+                   scale=float(scale), max_depth=depth, split_feature=split_feature, split_border=split_border,
+                   split_nan_right=split_nan_right, leaf_weights=(1 << np.arange(depth)).astype(np.int64), leaf_values=leaf_values)
+
+    def get_margin(self, X: np.ndarray) -> np.ndarray:
+        """
+        Returns the summed or averaged leaf values of every row of a block of rows.
+        """
+        has_missing = bool(np.isnan(X).any())
+        if self.layout == "oblivious":
+            x = X[:, self.split_feature]
+            bits = x > self.split_border
+            if has_missing:
+                bits = np.where(np.isnan(x), self.split_nan_right, bits)
+            leaf_index = bits.astype(np.int64) @ self.leaf_weights
+            return self.scale * self.leaf_values[np.arange(self.n_trees), leaf_index].sum(axis=1) + self.base_margin
+        n_rows = len(X)
+        row_offsets = np.repeat(np.arange(n_rows) * X.shape[1], self.n_trees)
+        X = X.ravel()
+        node = np.tile(self.roots, n_rows)
+        active = None
+        for level in range(self.max_depth):
+            if active is None:
+                node = self.descend(X, row_offsets, node, has_missing)
+                # once most (row, tree) pairs reached a leaf, only the pairs still descending are gathered
+                if level % 4 == 3:
+                    pending = np.flatnonzero(~self.is_leaf[node])
+                    if pending.size < node.size // 2:
+                        active = pending
+            else:
+                next_node = self.descend(X, row_offsets[active], node[active], has_missing)
+                node[active] = next_node
+                active = active[~self.is_leaf[next_node]]
+            if active is not None and not active.size:
+                break
+        values = self.value[node].reshape(n_rows, self.n_trees)
+        if self.output == "mean":
+            return values.mean(axis=1)
+        return values.sum(axis=1) + self.base_margin
+
+    def descend(self, X: np.ndarray, row_offsets: np.ndarray, node: np.ndarray, has_missing: bool) -> np.ndarray:
+        """
+        Moves (row, tree) pairs one level down, given the flat features, the offset of the row of every pair in them,
+        the current node of every pair and whether the features hold NaN.
+        """
+        x = X[row_offsets + self.feature[node]]
+        go_right = x >= self.threshold[node] if self.strict else x > self.threshold[node]
+        if has_missing:
+            go_right = np.where(np.isnan(x), ~self.default_left[node], go_right)
+        return self.children[2 * node + go_right]
+
+    def predict_proba(self, X: np.ndarray, block_size: int = 1 << 21) -> np.ndarray:
+        """
+        Returns the (n, 2) class probabilities of the rows of X, traversing the trees for blocks of rows so a block
+        holds at most block_size (row, tree) nodes.
+
+        Args:
+            X (np.ndarray): The transformed features.
+            block_size (int): Maximum number of rows times trees per block.
+        Returns:
+            np.ndarray: The probabilities of class 0 and class 1.
+        """
+        try:
+            X = np.asarray(X, dtype=np.float32)
+            if X.ndim != 2 or X.shape[1] != self.n_features:
+                raise ValueError(f"Expected {self.n_features} features, got an array of shape {X.shape}")
+            block_rows = max(1, block_size // max(self.n_trees, 1))
+            margin = np.concatenate([self.get_margin(X[start:start + block_rows])
+                                     for start in range(0, len(X), block_rows)]) if len(X) else np.zeros(0)
+            positive = margin if self.output == "mean" else 1.0 / (1.0 + np.exp(-margin))
+            return np.column_stack([1.0 - positive, positive])
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Returns the class of the rows of X, 1 when its probability is above 0.5 as the libraries predict.
+        """
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int64)
+
+
+def get_tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    """
+    Returns the depth of a tree given by its child arrays, with -1 children at the leaves and the root at 0.
+    """
+    depth, level = 0, np.array([0])
+    while True:
+        children = np.concatenate([left[level], right[level]])
+        level = children[children >= 0]
+        if not len(level):
+            return depth
+        depth += 1
+
+
+def compile_tree_ensemble(model) -> Optional[CompiledTreeEnsemble]:
+    """
+    Compiles a trained tree ensemble into a CompiledTreeEnsemble, with max_rows set to the largest batch it is used
+    for by VisaModel, from the COMPILED_TREE_ENSEMBLE_MAX_ROWS entry of the library or of the sklearn class.
+
+    Args:
+        model: An XGBClassifier, CatBoostClassifier or sklearn forest or gradient boosting classifier.
+    Returns:
+        CompiledTreeEnsemble: The compiled ensemble, or None if the model can not be compiled.
+    """
+    try:
+        library = type(model).__module__.split(".")[0]
+        if library == "xgboost":
+            compiled = CompiledTreeEnsemble.from_xgboost(model)
+        elif library == "catboost":
+            compiled = CompiledTreeEnsemble.from_catboost(model)
+        elif type(model).__module__.startswith("sklearn.ensemble"):
+            compiled = CompiledTreeEnsemble.from_sklearn(model)
+        else:
+            return None
+        compiled.max_rows = COMPILED_TREE_ENSEMBLE_MAX_ROWS.get(library,
+                                                                COMPILED_TREE_ENSEMBLE_MAX_ROWS.get(type(model).__name__, 0))
+        return compiled
+    except ValueError as e:
+        logging.info(f"{type(model).__name__} is not compiled, predicting with the library: {e}")
+        return None
@@ -0,0 +1,277 @@
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple, Union
+
+from pandas import DataFrame
+
+from visa.constants import (BATCH_INFERENCE_CHECKPOINT_FILE_NAME, BATCH_INFERENCE_PREDICTIONS_DIR_NAME,
+                            BATCH_INFERENCE_REPORT_FILE_NAME, SCHEMA_FILE_PATH, TARGET_COLUMN)
+from visa.entity.artifact_entity import BatchInferenceArtifact
+from visa.entity.config_entity import BatchInferenceConfig, ModelRegistryConfig
+from visa.entity.model_registry import get_model_registry
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.inference_utils import init_inference_worker, read_checkpoint, score_chunk, write_checkpoint
+from visa.utils.model_package import read_model_package_manifest
+from visa.utils.main_utils import (get_mp_context, iter_dataframe_chunks_with_positions, read_yaml_file, write_dataframe,
+                                   write_yaml_file)
+
+
+class BatchInferencePipeline:
+    """
+    Scores a backlog of raw records from a csv, parquet or feather file or a Mongo collection in chunks. The chunks
+    are fanned out to a pool of worker processes that each load the model package once, and the predictions of
+    every chunk are written as the next numbered part file in input order, followed by a checkpoint of the chunks
+    completed so far and the input position after them. Running the pipeline again with the same output directory
+    after a failure resumes at that position with the same model, without reading the completed chunks again.
+    """
+
+    def __init__(self, input_file_path: Optional[str] = None, collection_name: Optional[str] = None,
+                 output_dir: Optional[str] = None, model_package_dir: Optional[str] = None,
+                 batch_inference_config: BatchInferenceConfig = BatchInferenceConfig(),
+                 model_registry_config: ModelRegistryConfig = ModelRegistryConfig()):
+        """
+        :param input_file_path: csv, parquet or feather file of the records to score
+        :param collection_name: Mongo collection of the records to score, instead of input_file_path
+        :param output_dir: Directory of the predictions, checkpoint and report of the run, by default named after the input
+        :param model_package_dir: Model package to score with, by default the champion of the model registry
+        :param batch_inference_config: Configuration for batch inference
+        :param model_registry_config: Configuration of the model registry holding the champion
+        """
+        try:
+            if (input_file_path is None) == (collection_name is None):
+                raise ValueError("Exactly one of input_file_path and collection_name must be given")
+            self.input_file_path = input_file_path
+            self.collection_name = collection_name
+            self.model_package_dir = model_package_dir
+            self.batch_inference_config = batch_inference_config
+            self.model_registry_config = model_registry_config
+            if output_dir is None:
+                input_name = collection_name or os.path.splitext(os.path.basename(input_file_path))[0]
+                output_dir = os.path.join(batch_inference_config.batch_inference_dir, input_name)
+            self.output_dir = output_dir
+            self.predictions_dir = os.path.join(output_dir, BATCH_INFERENCE_PREDICTIONS_DIR_NAME)
+            self.checkpoint_file_path = os.path.join(output_dir, BATCH_INFERENCE_CHECKPOINT_FILE_NAME)
+            self.inference_report_file_path = os.path.join(output_dir, BATCH_INFERENCE_REPORT_FILE_NAME)
+            self._schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def get_source(self) -> dict:
+        """
+        This function describes the input and the chunking of the run, which a resumed run must match. A file is
+        identified by its size and modification time as well, so a file replaced after a failed run is not resumed.
+
+        Output           :  dict of the input, the chunk size and the output file format
+        on Failure       :  raise exception
+        """
+        try:
+            if self.input_file_path is not None:
+                stat = os.stat(self.input_file_path)
+                source = {"input_file_path": os.path.abspath(self.input_file_path), "input_file_size": stat.st_size,
+                          "input_file_mtime_ns": stat.st_mtime_ns}
+            else:
+                source = {"collection_name": self.collection_name}
+            source.update(chunk_size=self.batch_inference_config.chunk_size,
+                          output_file_format=self.batch_inference_config.output_file_format)
+            return source
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def get_model_package(self) -> Tuple[Optional[str], str]:
+        """
+        This function returns the model package to score with: model_package_dir if given, otherwise the package of
+        the champion of the model registry.
+
+        Output           :  the registry version, None for model_package_dir, and the package directory
+        on Failure       :  raise exception
+        """
+        try:
+            if self.model_package_dir is not None:
+                return None, os.path.abspath(self.model_package_dir)
+            model_registry = get_model_registry(self.model_registry_config)
+            version = model_registry.get_champion_version()
+            if version is None:
+                raise FileNotFoundError(f"No champion model is promoted in the registry at: {model_registry.backend.uri}")
+            return version, os.path.abspath(model_registry.backend.download_version(version))
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def iter_input_chunks(self, checkpoint: dict) -> Iterator[Tuple[DataFrame, Union[str, dict]]]:
+        """
+        This function streams the input chunks after the completed chunks of the checkpoint, starting at the input
+        position of the checkpoint. A Mongo collection is read in "_id" order and resumed with a query after the last
+        "_id"; a file is resumed by seeking to the byte offset of a csv file, the row group and row of a parquet file
+        or the row of a feather file.
+
+        Output           :  Iterator of the chunks with the input position after each chunk
+        on Failure       :  raise exception
+        """
+        try:
+            chunk_size = self.batch_inference_config.chunk_size
+            if self.input_file_path is not None:
+                yield from iter_dataframe_chunks_with_positions(self.input_file_path, chunk_size,
+                                                                position=checkpoint["position"],
+                                                                schema_config=self._schema_config)
+                return
+
+            from bson import json_util
+            from bson.min_key import MinKey
+            from visa.data_access.visa_data import VisaData
+
+            after_id = json_util.loads(checkpoint["position"]) if checkpoint["position"] else MinKey()
+            for chunk in VisaData().iter_collection_chunks(self.collection_name, batch_size=chunk_size,
+                                                           after_id=after_id, keep_id=True):
+                last_id = json_util.dumps(chunk["_id"].iloc[-1])
+                yield chunk.drop(columns=["_id"]), last_id
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def start_checkpoint(self) -> dict:
+        """
+        This function returns the checkpoint to continue from: the checkpoint of an unfinished run of the same input,
+        or a new checkpoint with the model package to score with, clearing the predictions of a finished run. An
+        unfinished checkpoint without an input position, written by an earlier version, is started over.
+
+        Output           :  checkpoint dict
+        on Failure       :  raise exception
+        """
+        try:
+            source = self.get_source()
+            checkpoint = read_checkpoint(self.checkpoint_file_path)
+            if checkpoint is not None and not checkpoint["completed"] and "position" in checkpoint:
+                if checkpoint["source"] != source:
+                    raise ValueError(f"The unfinished run in {self.output_dir} scores {checkpoint['source']}, "
+                                     f"not {source}, use another output_dir")
+                logging.info(f"Resuming batch inference after chunk {checkpoint['n_chunks']} "
+                             f"and {checkpoint['n_rows']} rows with model: {checkpoint['model_package_dir']}")
+                return checkpoint
+            shutil.rmtree(self.predictions_dir, ignore_errors=True)
+            os.makedirs(self.predictions_dir)
+            model_version, model_package_dir = self.get_model_package()
+            checkpoint = {"source": source, "model_version": model_version, "model_package_dir": model_package_dir,
+                          "n_chunks": 0, "n_rows": 0, "position": None, "completed": False}
+            write_checkpoint(self.checkpoint_file_path, checkpoint)
+            return checkpoint
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def complete_chunk(self, chunk_index: int, n_rows: int, position: Union[str, dict], result: dict,
+                       checkpoint: dict) -> None:
+        """
+        This function writes the predictions of the next chunk in input order as its part file, through a temporary
+        file renamed into place, and then moves the checkpoint past the chunk, to the input position after it.
+
+        Output           :  None
+        on Failure       :  raise exception
+        """
+        try:
+            file_format = self.batch_inference_config.output_file_format
+            part_file_path = os.path.join(self.predictions_dir, f"part-{chunk_index:06d}.{file_format}")
+            temp_file_path = os.path.join(self.predictions_dir, f".tmp-part-{chunk_index:06d}.{file_format}")
+            write_dataframe(result["predictions"], temp_file_path)
+            os.replace(temp_file_path, part_file_path)
+            checkpoint.update(n_chunks=chunk_index + 1, n_rows=checkpoint["n_rows"] + n_rows, position=position)
+            write_checkpoint(self.checkpoint_file_path, checkpoint)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def run_pipeline(self) -> BatchInferenceArtifact:
+        """
+        This function runs the batch inference. At most 2 * n_workers chunks are read ahead of the chunk being
+        written, so the memory held does not depend on the size of the input.
+
+        Output           :  BatchInferenceArtifact containing the predictions directory and the counts of the run
+        on Failure       :  raise exception
+        """
+        try:
+            config = self.batch_inference_config
+            checkpoint = self.start_checkpoint()
+            n_resumed_chunks, n_resumed_rows = checkpoint["n_chunks"], checkpoint["n_rows"]
+            n_cpus = os.cpu_count() or 1
+            n_workers = n_cpus if config.n_workers == -1 else config.n_workers
+            initargs = (checkpoint["model_package_dir"], max(1, n_cpus // n_workers))
+            logging.info(f"Batch inference of {checkpoint['source']} into {self.predictions_dir} "
+                         f"with {n_workers} workers is started")
+
+            executor = None
+            if n_workers > 1:
+                executor = ProcessPoolExecutor(max_workers=n_workers, initializer=init_inference_worker,
+                                               initargs=initargs, mp_context=get_mp_context(config.mp_context, [
+                                                   "visa.utils.inference_utils",
+                                                   read_model_package_manifest(checkpoint["model_package_dir"])["learner"]["module"]]))
+            else:
+                init_inference_worker(*initargs)
+            seconds = {"reading": 0.0, "scoring": 0.0, "waiting": 0.0, "writing": 0.0}
+            start_time = time.perf_counter()
+            pending = deque()
+
+            def complete_next_chunk() -> None:
+                chunk_index, n_rows, position, future = pending.popleft()
+                wait_start_time = time.perf_counter()
+                result = future.result()
+                write_start_time = time.perf_counter()
+                seconds["waiting"] += write_start_time - wait_start_time
+                seconds["scoring"] += result["seconds"]
+                self.complete_chunk(chunk_index, n_rows, position, result, checkpoint)
+                seconds["writing"] += time.perf_counter() - write_start_time
+                elapsed = time.perf_counter() - start_time
+                n_scored_rows = checkpoint["n_rows"] - n_resumed_rows
+                logging.info(f"Scored chunk {chunk_index}: {checkpoint['n_rows']} rows in total, {n_scored_rows} rows "
+                             f"in {elapsed:.1f}s, {n_scored_rows / max(elapsed, 1e-9):.0f} rows/s")
+
+            try:
+                chunk_index, first_row = checkpoint["n_chunks"], checkpoint["n_rows"]
+                chunks = self.iter_input_chunks(checkpoint)
+                while True:
+                    read_start_time = time.perf_counter()
+                    chunk, position = next(chunks, (None, None))
+                    seconds["reading"] += time.perf_counter() - read_start_time
+                    if chunk is None:
+                        break
+                    args = (chunk, first_row, config.key_columns, (TARGET_COLUMN,), config.decision_threshold)
+                    if executor is not None:
+                        future = executor.submit(score_chunk, *args)
+                    else:
+                        future = Future()
+                        future.set_result(score_chunk(*args))
+                    pending.append((chunk_index, len(chunk), position, future))
+                    chunk_index, first_row = chunk_index + 1, first_row + len(chunk)
+                    if len(pending) >= 2 * n_workers:
+                        complete_next_chunk()
+                while pending:
+                    complete_next_chunk()
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+
+            elapsed = time.perf_counter() - start_time
+            checkpoint["completed"] = True
+            write_checkpoint(self.checkpoint_file_path, checkpoint)
+            n_scored_rows = checkpoint["n_rows"] - n_resumed_rows
+            write_yaml_file(self.inference_report_file_path, replace=True, content={
+                "source": checkpoint["source"],
+                "model_version": checkpoint["model_version"],
+                "model_package_dir": checkpoint["model_package_dir"],
+                "n_workers": n_workers,
+                "n_rows": checkpoint["n_rows"],
+                "n_chunks": checkpoint["n_chunks"],
+                "n_resumed_rows": n_resumed_rows,
+                "n_resumed_chunks": n_resumed_chunks,
+                "seconds": {"total": elapsed, **seconds},
+                "rows_per_second": n_scored_rows / max(elapsed, 1e-9),
+            })
+            batch_inference_artifact = BatchInferenceArtifact(predictions_dir=self.predictions_dir,
+                                                              model_version=checkpoint["model_version"],
+                                                              n_rows=checkpoint["n_rows"],
+                                                              n_chunks=checkpoint["n_chunks"],
+                                                              n_resumed_chunks=n_resumed_chunks,
+                                                              inference_report_file_path=self.inference_report_file_path)
+            logging.info(f"Batch inference artifact: {batch_inference_artifact}")
+            return batch_inference_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
@@ -1,18 +1,35 @@
 import sys
 from visa.exception import USVisaException
 from visa.logger import logging
+from visa.constants import SCHEMA_FILE_PATH
+from visa.utils.main_utils import wait_for_background_tasks, read_yaml_file
+from visa.utils.stage_cache import StageCache, get_config_settings
  
 from visa.components.data_ingestion import DataIngestion
 from visa.components.data_validation import DataValidation
 from visa.components.data_transformation import DataTransformation
+from visa.components.model_tuner import ModelTuner
+from visa.components.model_trainer import ModelTrainer
+from visa.components.model_evaluation import ModelEvaluation
+from visa.components.model_pusher import ModelPusher
 
 from visa.entity.config_entity import (DataIngestionConfig, 
                                        DataValidationConfig,
-                                       DataTransformationConfig)
+                                       DataTransformationConfig,
+                                       ModelTunerConfig,
+                                       ModelTrainerConfig,
+                                       ModelEvaluationConfig,
+                                       ModelPusherConfig,
+                                       StageCacheConfig)
 
 from visa.entity.artifact_entity import (DataIngestionArtifact, 
                                          DataValidationArtifact, 
-                                         DataTransformationArtifact)
+                                         DataTransformationArtifact,
+                                         ModelTunerArtifact,
+                                         ModelTrainerArtifact,
+                                         ModelEvaluationArtifact,
+                                         ModelPusherArtifact,
+                                         ClassificationMetricArtifact)
 
 
 class TrainingPipeline:
@@ -21,9 +38,32 @@ class TrainingPipeline:
             self.data_ingestion_config = DataIngestionConfig()
             self.data_validation_config = DataValidationConfig()
             self.data_transformation_config = DataTransformationConfig()
+            self.model_tuner_config = ModelTunerConfig()
+            self.model_trainer_config = ModelTrainerConfig()
+            self.model_evaluation_config = ModelEvaluationConfig()
+            self.model_pusher_config = ModelPusherConfig()
+            self.stage_cache = StageCache(stage_cache_config=StageCacheConfig())
+            self._schema_config = read_yaml_file(SCHEMA_FILE_PATH)
         except Exception as e:
             raise USVisaException(e, sys) from e
         
+    @staticmethod
+    def get_ingested_inputs(data_ingestion_artifact: DataIngestionArtifact) -> list:
+        """
+        This function returns what the stage cache hashes for the ingested data: the in-memory training and testing
+        dataframes when data ingestion handed them over, otherwise the training and testing files.
+
+        Output           :  list of DataFrames or file paths
+        on Failure       :  raise exception
+        """
+        try:
+            if data_ingestion_artifact.train_df is not None and data_ingestion_artifact.test_df is not None:
+                return [data_ingestion_artifact.train_df, data_ingestion_artifact.test_df]
+            wait_for_background_tasks()
+            return [data_ingestion_artifact.trained_file_path, data_ingestion_artifact.test_file_path]
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
     def start_data_ingestion(self) -> DataIngestionArtifact:
         """
         This function starts the data ingestion of the training pipeline and returns the 
@@ -52,8 +92,26 @@ class TrainingPipeline:
         """
         try:
             logging.info(f"Data Validation of the TrainingPipeline is started")
+            cache_key = self.stage_cache.compute_key(stage_name="data_validation",
+                                                     inputs=self.get_ingested_inputs(data_ingestion_artifact),
+                                                     config={"settings": get_config_settings(self.data_validation_config),
+                                                             "schema": self._schema_config})
+            output_file_paths = {"drift_report": self.data_validation_config.drift_report_file_path,
+                                 "validation_report": self.data_validation_config.validation_report_file_path,
+                                 "drift_baseline": self.data_validation_config.drift_baseline_file_path}
+            cached_fields = self.stage_cache.lookup(stage_name="data_validation", key=cache_key, output_file_paths=output_file_paths)
+            if cached_fields is not None:
+                return DataValidationArtifact(drift_report_file_path=self.data_validation_config.drift_report_file_path,
+                                              validation_report_file_path=self.data_validation_config.validation_report_file_path,
+                                              drift_baseline_file_path=self.data_validation_config.drift_baseline_file_path,
+                                              **cached_fields)
+
             data_validation = DataValidation(data_validation_config=self.data_validation_config, data_ingestion_artifact=data_ingestion_artifact)
             data_validation_artifact = data_validation.initiate_data_validation()
+            self.stage_cache.add(stage_name="data_validation", key=cache_key,
+                                 fields={"validation_status": data_validation_artifact.validation_status,
+                                         "message": data_validation_artifact.message},
+                                 output_file_paths=output_file_paths)
             logging.info(f"Data Validation of the TrainingPipeline is completed")
             return data_validation_artifact
         except Exception as e:
@@ -72,10 +130,44 @@ class TrainingPipeline:
         """
         try:
             logging.info(f"Data Transformation of the TrainingPipeline is started")
+            cache_key = self.stage_cache.compute_key(stage_name="data_transformation",
+                                                     inputs=self.get_ingested_inputs(data_ingestion_artifact),
+                                                     config={"settings": get_config_settings(self.data_transformation_config),
+                                                             "schema": self._schema_config,
+                                                             "validation": [data_validation_artifact.validation_status,
+                                                                            data_validation_artifact.message]})
+            output_file_paths = {"transformed_object": self.data_transformation_config.transformed_object_file_path,
+                                 "compiled_object": self.data_transformation_config.compiled_object_file_path,
+                                 "transformed_train": self.data_transformation_config.transformed_train_file_path,
+                                 "transformed_test": self.data_transformation_config.transformed_test_file_path,
+                                 "transformed_train_labels": self.data_transformation_config.transformed_train_labels_file_path,
+                                 "transformed_test_labels": self.data_transformation_config.transformed_test_labels_file_path,
+                                 "transformed_validation": self.data_transformation_config.transformed_validation_file_path,
+                                 "transformed_validation_labels": self.data_transformation_config.transformed_validation_labels_file_path,
+                                 "transformed_unresampled_train": self.data_transformation_config.transformed_unresampled_train_file_path,
+                                 "transformed_unresampled_train_labels": self.data_transformation_config.transformed_unresampled_train_labels_file_path,
+                                 "resampling_report": self.data_transformation_config.resampling_report_file_path,
+                                 "preprocessor_fit_report": self.data_transformation_config.preprocessor_fit_report_file_path}
+            cached_fields = self.stage_cache.lookup(stage_name="data_transformation", key=cache_key, output_file_paths=output_file_paths)
+            if cached_fields is not None:
+                return DataTransformationArtifact(transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
+                                                  transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
+                                                  transformed_test_file_path=self.data_transformation_config.transformed_test_file_path,
+                                                  transformed_train_labels_file_path=self.data_transformation_config.transformed_train_labels_file_path,
+                                                  transformed_test_labels_file_path=self.data_transformation_config.transformed_test_labels_file_path,
+                                                  transformed_validation_file_path=self.data_transformation_config.transformed_validation_file_path,
+                                                  transformed_validation_labels_file_path=self.data_transformation_config.transformed_validation_labels_file_path,
+                                                  transformed_unresampled_train_file_path=self.data_transformation_config.transformed_unresampled_train_file_path,
+                                                  transformed_unresampled_train_labels_file_path=self.data_transformation_config.transformed_unresampled_train_labels_file_path,
+                                                  resampling_report_file_path=self.data_transformation_config.resampling_report_file_path,
+                                                  compiled_object_file_path=self.data_transformation_config.compiled_object_file_path,
+                                                  **cached_fields)
+
             data_transformation = DataTransformation(data_ingestion_artifact=data_ingestion_artifact, 
                                                      data_validation_artifact=data_validation_artifact,
                                                      data_transformation_config=self.data_transformation_config)
             data_transformation_artifact = data_transformation.initiate_data_transformation()
+            self.stage_cache.add(stage_name="data_transformation", key=cache_key, fields={}, output_file_paths=output_file_paths)
             logging.info(f"Data Transformation of the TrainingPipeline is completed")   
             return data_transformation_artifact
         except Exception as e:
@@ -83,6 +175,134 @@ class TrainingPipeline:
         
     
         
+    def start_model_tuner(self, data_transformation_artifact: DataTransformationArtifact) -> ModelTunerArtifact:
+        """
+        This function starts the hyperparameter tuning of the training pipeline and returns the
+        artifact of model tuner containing the file path of the best params of every candidate model.
+
+        Input           :  data_transformation_artifact: DataTransformationArtifact containing the file paths of the transformed data
+        Output          :  ModelTunerArtifact containing the file paths of the best params and the tuning report
+        on Failure      :  raise exception
+        """
+        try:
+            logging.info(f"Model Tuning of the TrainingPipeline is started")
+            wait_for_background_tasks()
+            cache_key = self.stage_cache.compute_key(stage_name="model_tuner",
+                                                     inputs=[data_transformation_artifact.transformed_unresampled_train_file_path,
+                                                             data_transformation_artifact.transformed_unresampled_train_labels_file_path,
+                                                             data_transformation_artifact.resampling_report_file_path],
+                                                     config={"settings": get_config_settings(self.model_tuner_config),
+                                                             "models": read_yaml_file(self.model_tuner_config.model_config_file_path)})
+            output_file_paths = {"best_params": self.model_tuner_config.best_params_file_path,
+                                 "tuning_report": self.model_tuner_config.tuning_report_file_path}
+            cached_fields = self.stage_cache.lookup(stage_name="model_tuner", key=cache_key, output_file_paths=output_file_paths)
+            if cached_fields is not None:
+                return ModelTunerArtifact(best_params_file_path=self.model_tuner_config.best_params_file_path,
+                                          tuning_report_file_path=self.model_tuner_config.tuning_report_file_path,
+                                          **cached_fields)
+
+            model_tuner = ModelTuner(data_transformation_artifact=data_transformation_artifact,
+                                     model_tuner_config=self.model_tuner_config)
+            model_tuner_artifact = model_tuner.initiate_model_tuner()
+            self.stage_cache.add(stage_name="model_tuner", key=cache_key, fields={}, output_file_paths=output_file_paths)
+            logging.info(f"Model Tuning of the TrainingPipeline is completed")
+            return model_tuner_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def start_model_trainer(self, data_transformation_artifact: DataTransformationArtifact,
+                            model_tuner_artifact: ModelTunerArtifact) -> ModelTrainerArtifact:
+        """
+        This function starts the model training of the training pipeline and returns the
+        artifact of model trainer containing the file path of the trained model and its metrics on the test data.
+
+        Input           :  data_transformation_artifact: DataTransformationArtifact containing the file paths of the transformed data
+                         :  model_tuner_artifact: ModelTunerArtifact containing the file path of the best params
+        Output          :  ModelTrainerArtifact containing the file path of the trained model and its metric artifact
+        on Failure      :  raise exception
+        """
+        try:
+            logging.info(f"Model Training of the TrainingPipeline is started")
+            wait_for_background_tasks()
+            cache_key = self.stage_cache.compute_key(stage_name="model_trainer",
+                                                     inputs=[data_transformation_artifact.transformed_train_file_path,
+                                                             data_transformation_artifact.transformed_train_labels_file_path,
+                                                             data_transformation_artifact.transformed_test_file_path,
+                                                             data_transformation_artifact.transformed_test_labels_file_path,
+                                                             data_transformation_artifact.transformed_validation_file_path,
+                                                             data_transformation_artifact.transformed_validation_labels_file_path,
+                                                             data_transformation_artifact.transformed_object_file_path,
+                                                             data_transformation_artifact.compiled_object_file_path,
+                                                             data_transformation_artifact.resampling_report_file_path,
+                                                             model_tuner_artifact.best_params_file_path],
+                                                     config={"settings": get_config_settings(self.model_trainer_config),
+                                                             "models": read_yaml_file(self.model_trainer_config.model_config_file_path)})
+            output_file_paths = {"trained_model": self.model_trainer_config.trained_model_file_path,
+                                 "trained_model_package": self.model_trainer_config.trained_model_package_dir,
+                                 "training_report": self.model_trainer_config.training_report_file_path}
+            cached_fields = self.stage_cache.lookup(stage_name="model_trainer", key=cache_key, output_file_paths=output_file_paths)
+            if cached_fields is not None:
+                return ModelTrainerArtifact(trained_model_file_path=self.model_trainer_config.trained_model_file_path,
+                                            training_report_file_path=self.model_trainer_config.training_report_file_path,
+                                            trained_model_package_dir=self.model_trainer_config.trained_model_package_dir,
+                                            metric_artifact=ClassificationMetricArtifact(**cached_fields["metric_artifact"]))
+
+            model_trainer = ModelTrainer(data_transformation_artifact=data_transformation_artifact,
+                                         model_trainer_config=self.model_trainer_config,
+                                         model_tuner_artifact=model_tuner_artifact)
+            model_trainer_artifact = model_trainer.initiate_model_trainer()
+            self.stage_cache.add(stage_name="model_trainer", key=cache_key,
+                                 fields={"metric_artifact": model_trainer_artifact.metric_artifact.__dict__},
+                                 output_file_paths=output_file_paths)
+            logging.info(f"Model Training of the TrainingPipeline is completed")
+            return model_trainer_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def start_model_evaluation(self, data_ingestion_artifact: DataIngestionArtifact,
+                               model_trainer_artifact: ModelTrainerArtifact) -> ModelEvaluationArtifact:
+        """
+        This function starts the model evaluation of the training pipeline, comparing the trained model with the
+        deployed model. It is not cached, as its result depends on the deployed model.
+
+        Input           :  data_ingestion_artifact: DataIngestionArtifact containing the file path of the test data
+                         :  model_trainer_artifact: ModelTrainerArtifact containing the trained model
+        Output          :  ModelEvaluationArtifact containing the acceptance decision
+        on Failure      :  raise exception
+        """
+        try:
+            logging.info(f"Model Evaluation of the TrainingPipeline is started")
+            model_evaluation = ModelEvaluation(model_eval_config=self.model_evaluation_config,
+                                               data_ingestion_artifact=data_ingestion_artifact,
+                                               model_trainer_artifact=model_trainer_artifact)
+            model_evaluation_artifact = model_evaluation.initiate_model_evaluation()
+            logging.info(f"Model Evaluation of the TrainingPipeline is completed")
+            return model_evaluation_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def start_model_pusher(self, model_trainer_artifact: ModelTrainerArtifact,
+                           model_evaluation_artifact: ModelEvaluationArtifact) -> ModelPusherArtifact:
+        """
+        This function starts the model pusher of the training pipeline, publishing the accepted model to the
+        model registry. It is not cached, as it changes the registry.
+
+        Input           :  model_trainer_artifact: ModelTrainerArtifact containing the model package directory
+                         :  model_evaluation_artifact: ModelEvaluationArtifact containing the acceptance decision
+        Output          :  ModelPusherArtifact containing the published and the champion version
+        on Failure      :  raise exception
+        """
+        try:
+            logging.info(f"Model Pusher of the TrainingPipeline is started")
+            model_pusher = ModelPusher(model_trainer_artifact=model_trainer_artifact,
+                                       model_evaluation_artifact=model_evaluation_artifact,
+                                       model_pusher_config=self.model_pusher_config)
+            model_pusher_artifact = model_pusher.initiate_model_pusher()
+            logging.info(f"Model Pusher of the TrainingPipeline is completed")
+            return model_pusher_artifact
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
     def run_pipeline(self):
         """
         This function runs the entire training pipeline.
@@ -94,5 +314,18 @@ class TrainingPipeline:
             data_validation_artifact = self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact)
             data_transformation_artifact = self.start_data_transformation(data_ingestion_artifact=data_ingestion_artifact, 
                                                                           data_validation_artifact=data_validation_artifact)
+            model_tuner_artifact = self.start_model_tuner(data_transformation_artifact=data_transformation_artifact)
+            model_trainer_artifact = self.start_model_trainer(data_transformation_artifact=data_transformation_artifact,
+                                                              model_tuner_artifact=model_tuner_artifact)
+            model_evaluation_artifact = self.start_model_evaluation(data_ingestion_artifact=data_ingestion_artifact,
+                                                                    model_trainer_artifact=model_trainer_artifact)
+            if not model_evaluation_artifact.is_model_accepted:
+                logging.info(f"Trained model is not better than the deployed model")
+            else:
+                model_pusher_artifact = self.start_model_pusher(model_trainer_artifact=model_trainer_artifact,
+                                                                model_evaluation_artifact=model_evaluation_artifact)
+            wait_for_background_tasks()
+            self.stage_cache.commit()
+            self.stage_cache.write_report()
         except Exception as e:
             raise USVisaException(e, sys) from e
\ No newline at end of file
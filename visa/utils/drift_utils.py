@@ -0,0 +1,454 @@
+import sys
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from scipy.stats import chi2, kstwo
+
+from visa.exception import USVisaException
+
+
+def ks_test(reference: np.ndarray, current: np.ndarray) -> Tuple[float, float]:
+    """
+    Computes the two sample Kolmogorov-Smirnov statistic and its asymptotic p-value from the sorted samples.
+
+    Args:
+        reference (np.ndarray): The reference sample, NaN values are ignored.
+        current (np.ndarray): The current sample, NaN values are ignored.
+    Returns:
+        Tuple[float, float]: The KS statistic and p-value.
+    Raises:
+        USVisaException: If there is an error computing the test.
+    """
+    try:
+        reference = np.sort(reference[~np.isnan(reference)])
+        current = np.sort(current[~np.isnan(current)])
+        if len(reference) == 0 or len(current) == 0:
+            return 0.0, 1.0
+        values = np.concatenate([reference, current])
+        reference_cdf = np.searchsorted(reference, values, side="right") / len(reference)
+        current_cdf = np.searchsorted(current, values, side="right") / len(current)
+        statistic = float(np.max(np.abs(reference_cdf - current_cdf)))
+        effective_n = np.round(len(reference) * len(current) / (len(reference) + len(current)))
+        return statistic, float(kstwo.sf(statistic, effective_n))
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def chi_square_test(reference_counts: np.ndarray, current_counts: np.ndarray) -> Tuple[float, float]:
+    """
+    Computes the chi-square goodness of fit of the current category counts against the reference frequencies.
+    A category that is absent from the reference but present in the current counts gives a p-value of 0.
+
+    Args:
+        reference_counts (np.ndarray): Counts per category of the reference data.
+        current_counts (np.ndarray): Counts per category of the current data, aligned with reference_counts.
+    Returns:
+        Tuple[float, float]: The chi-square statistic and p-value.
+    Raises:
+        USVisaException: If there is an error computing the test.
+    """
+    try:
+        reference_counts = np.asarray(reference_counts, dtype=np.float64)
+        current_counts = np.asarray(current_counts, dtype=np.float64)
+        if reference_counts.sum() == 0 or current_counts.sum() == 0:
+            return 0.0, 1.0
+        expected = reference_counts / reference_counts.sum() * current_counts.sum()
+        observed_in_reference = expected > 0
+        if np.any(current_counts[~observed_in_reference] > 0):
+            return float("inf"), 0.0
+        statistic = float(np.sum((current_counts[observed_in_reference] - expected[observed_in_reference]) ** 2
+                                 / expected[observed_in_reference]))
+        dof = max(int(observed_in_reference.sum()) - 1, 1)
+        return statistic, float(chi2.sf(statistic, dof))
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def population_stability_index(reference_counts: np.ndarray, current_counts: np.ndarray, epsilon: float = 1e-4) -> float:
+    """
+    Computes the population stability index between two aligned count vectors, flooring empty bins at epsilon.
+
+    Args:
+        reference_counts (np.ndarray): Counts per category or bin of the reference data.
+        current_counts (np.ndarray): Counts per category or bin of the current data.
+        epsilon (float, optional): Minimum share of a bin. Defaults to 1e-4.
+    Returns:
+        float: The population stability index.
+    Raises:
+        USVisaException: If there is an error computing the index.
+    """
+    try:
+        reference_counts = np.asarray(reference_counts, dtype=np.float64)
+        current_counts = np.asarray(current_counts, dtype=np.float64)
+        if reference_counts.sum() == 0 or current_counts.sum() == 0:
+            return 0.0
+        reference_share = np.maximum(reference_counts / reference_counts.sum(), epsilon)
+        current_share = np.maximum(current_counts / current_counts.sum(), epsilon)
+        return float(np.sum((current_share - reference_share) * np.log(current_share / reference_share)))
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def get_aligned_counts(reference: pd.Series, current: pd.Series) -> Tuple[list, np.ndarray, np.ndarray]:
+    """
+    Counts the values of two categorical series over the union of their categories.
+
+    Args:
+        reference (pd.Series): The reference column.
+        current (pd.Series): The current column.
+    Returns:
+        Tuple[list, np.ndarray, np.ndarray]: The categories and the reference and current counts per category.
+    Raises:
+        USVisaException: If there is an error counting the values.
+    """
+    try:
+        counts = pd.concat([reference.value_counts(sort=False), current.value_counts(sort=False)], axis=1).fillna(0)
+        return counts.index.tolist(), counts.iloc[:, 0].to_numpy(), counts.iloc[:, 1].to_numpy()
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def is_column_drifted(test_name: str, statistic: float, p_value: float, small_sample: bool, thresholds: dict) -> bool:
+    """
+    Decides whether a column drifted. Small samples use the p-value of the test, large samples use the effect size,
+    the KS statistic for numerical columns and the PSI for categorical columns, as p-values flag negligible
+    differences once samples get large.
+
+    Args:
+        test_name (str): "ks" or "psi".
+        statistic (float): The KS statistic or PSI.
+        p_value (float): The p-value of the KS or chi-square test.
+        small_sample (bool): Whether the reference sample is small.
+        thresholds (dict): "p_value", "ks_statistic" and "psi" thresholds.
+    Returns:
+        bool: Whether the column drifted.
+    """
+    if small_sample:
+        return bool(p_value < thresholds["p_value"])
+    if test_name == "ks":
+        return bool(statistic > thresholds["ks_statistic"])
+    return bool(statistic > thresholds["psi"])
+
+
+def compute_drift_report(reference_df: DataFrame, current_df: DataFrame, numerical_columns: list, categorical_columns: list,
+                         thresholds: dict, drift_share: float = 0.5, small_sample_size: int = 1000) -> dict:
+    """
+    Computes the drift of every column between a reference and a current DataFrame straight from the column values:
+    KS for numerical columns and chi-square with PSI for categorical columns. The dataset drifts when the share of
+    drifted columns reaches drift_share.
+
+    Args:
+        reference_df (DataFrame): The reference data, e.g. the training data.
+        current_df (DataFrame): The current data.
+        numerical_columns (list): Columns compared as numbers.
+        categorical_columns (list): Columns compared as categories.
+        thresholds (dict): "p_value", "ks_statistic" and "psi" thresholds.
+        drift_share (float, optional): Share of drifted columns above which the dataset drifts. Defaults to 0.5.
+        small_sample_size (int, optional): Sample size up to which p-values decide the drift. Defaults to 1000.
+    Returns:
+        dict: The per column drift results and the dataset drift decision.
+    Raises:
+        USVisaException: If there is an error computing the drift.
+    """
+    try:
+        small_sample = len(reference_df) <= small_sample_size
+        features = {}
+        for column in numerical_columns:
+            if column not in reference_df.columns or column not in current_df.columns:
+                continue
+            statistic, p_value = ks_test(reference_df[column].to_numpy(np.float64), current_df[column].to_numpy(np.float64))
+            features[column] = {"feature_type": "num", "stattest_name": "ks", "statistic": statistic, "p_value": p_value,
+                                "drift_detected": is_column_drifted("ks", statistic, p_value, small_sample, thresholds)}
+
+        for column in categorical_columns:
+            if column not in reference_df.columns or column not in current_df.columns:
+                continue
+            _, reference_counts, current_counts = get_aligned_counts(reference_df[column], current_df[column])
+            _, p_value = chi_square_test(reference_counts, current_counts)
+            statistic = population_stability_index(reference_counts, current_counts)
+            features[column] = {"feature_type": "cat", "stattest_name": "chi_square/psi", "statistic": statistic,
+                                "p_value": p_value,
+                                "drift_detected": is_column_drifted("psi", statistic, p_value, small_sample, thresholds)}
+
+        return summarize_drift(features, drift_share)
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def summarize_drift(features: dict, drift_share: float) -> dict:
+    """
+    Builds the drift report from the per column results. The dataset drifts when the share of drifted columns
+    reaches drift_share.
+
+    Args:
+        features (dict): Per column drift results with a "drift_detected" flag.
+        drift_share (float): Share of drifted columns above which the dataset drifts.
+    Returns:
+        dict: The per column drift results and the dataset drift decision.
+    """
+    n_features = len(features)
+    n_drifted_features = sum(feature["drift_detected"] for feature in features.values())
+    share_drifted_features = n_drifted_features / n_features if n_features else 0.0
+    return {
+        "features": features,
+        "n_features": n_features,
+        "n_drifted_features": n_drifted_features,
+        "share_drifted_features": share_drifted_features,
+        "dataset_drift": bool(n_features > 0 and share_drifted_features >= drift_share),
+    }
+
+
+def get_symlog_bin_edges(low: float, high: float, n_bins: int) -> np.ndarray:
+    """
+    Returns n_bins + 1 bin edges between low and high evenly spaced on a symmetric log scale, so bins are narrow near
+    zero and widen proportionally for large magnitudes, which keeps the relative resolution of skewed columns such as
+    wages and company sizes roughly constant.
+
+    Args:
+        low (float): Lower edge of the first bin.
+        high (float): Upper edge of the last bin.
+        n_bins (int): Number of bins.
+    Returns:
+        np.ndarray: The bin edges.
+    """
+    symlog_edges = np.linspace(np.sign(low) * np.log1p(abs(low)), np.sign(high) * np.log1p(abs(high)), n_bins + 1)
+    return np.sign(symlog_edges) * np.expm1(np.abs(symlog_edges))
+
+
+class NumericalSketch:
+    """
+    Mergeable summary of a numerical column: a fixed-bin histogram with an underflow and an overflow bin, the null
+    count and the count, mean and sum of squared deviations maintained with Chan's parallel update.
+    Sketches built on the same bin edges can be merged in any order and give the same result as one sketch of all rows.
+    """
+
+    def __init__(self, bin_edges: np.ndarray):
+        self.bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        self.bin_counts = np.zeros(len(self.bin_edges) + 1, dtype=np.int64)
+        self.n_null = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def _combine_moments(self, count: int, mean: float, m2: float) -> None:
+        total = self.count + count
+        if total == 0:
+            return
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    def update(self, values: np.ndarray) -> "NumericalSketch":
+        values = np.asarray(values, dtype=np.float64)
+        is_null = np.isnan(values)
+        values = values[~is_null]
+        self.n_null += int(is_null.sum())
+        if len(values) == 0:
+            return self
+        self.bin_counts += np.bincount(np.searchsorted(self.bin_edges, values, side="right"), minlength=len(self.bin_counts))
+        self._combine_moments(len(values), float(values.mean()), float(((values - values.mean()) ** 2).sum()))
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        return self
+
+    def merge(self, other: "NumericalSketch") -> "NumericalSketch":
+        if not np.array_equal(self.bin_edges, other.bin_edges):
+            raise ValueError("Numerical sketches can only be merged when they share the same bin edges")
+        self.bin_counts += other.bin_counts
+        self.n_null += other.n_null
+        self._combine_moments(other.count, other.mean, other.m2)
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Approximates the q-th quantile by linear interpolation inside its bin, within the width of one bin."""
+        if self.count == 0:
+            return float("nan")
+        edges = np.concatenate([[self.minimum], np.clip(self.bin_edges, self.minimum, self.maximum), [self.maximum]])
+        cumulative = np.concatenate([[0], np.cumsum(self.bin_counts)]) / self.count
+        return float(np.interp(q, cumulative, edges))
+
+    def to_dict(self) -> dict:
+        return {"type": "num", "bin_edges": self.bin_edges.tolist(), "bin_counts": self.bin_counts.tolist(),
+                "n_null": self.n_null, "count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": float(self.minimum), "max": float(self.maximum)}
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "NumericalSketch":
+        sketch = cls(content["bin_edges"])
+        sketch.bin_counts = np.asarray(content["bin_counts"], dtype=np.int64)
+        sketch.n_null, sketch.count, sketch.mean, sketch.m2 = content["n_null"], content["count"], content["mean"], content["m2"]
+        sketch.minimum, sketch.maximum = content["min"], content["max"]
+        return sketch
+
+
+class CategoricalSketch:
+    """
+    Mergeable summary of a categorical column: the frequency of every category and the null count.
+    """
+
+    def __init__(self):
+        self.category_counts: Dict[str, int] = {}
+        self.n_null = 0
+
+    def _add_counts(self, category_counts: Dict[str, int]) -> None:
+        for category, count in category_counts.items():
+            if count:
+                self.category_counts[category] = self.category_counts.get(category, 0) + int(count)
+
+    def update(self, values: pd.Series) -> "CategoricalSketch":
+        self.n_null += int(values.isna().sum())
+        value_counts = values.value_counts(sort=False)
+        self._add_counts(dict(zip(value_counts.index.astype(str), value_counts.to_numpy())))
+        return self
+
+    def merge(self, other: "CategoricalSketch") -> "CategoricalSketch":
+        self._add_counts(other.category_counts)
+        self.n_null += other.n_null
+        return self
+
+    @property
+    def count(self) -> int:
+        return sum(self.category_counts.values())
+
+    def to_dict(self) -> dict:
+        return {"type": "cat", "category_counts": dict(self.category_counts), "n_null": self.n_null}
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "CategoricalSketch":
+        sketch = cls()
+        sketch.category_counts = {str(category): int(count) for category, count in content["category_counts"].items()}
+        sketch.n_null = content["n_null"]
+        return sketch
+
+
+class DatasetSketch:
+    """
+    Mergeable per column summary of a dataset used as a compact drift baseline.
+    Numerical columns get a NumericalSketch on symlog bins spanning the schema range of the column, categorical
+    columns a CategoricalSketch. The sketch can be updated chunk by chunk and sketches of partitions can be merged.
+    """
+
+    def __init__(self, numerical_columns: list = (), categorical_columns: list = (), ranges: Optional[dict] = None,
+                 n_bins: int = 256, default_range: Tuple[float, float] = (-1e9, 1e9)):
+        ranges = ranges or {}
+        self.n_rows = 0
+        self.sketches: Dict[str, Union[NumericalSketch, CategoricalSketch]] = {}
+        for column in numerical_columns:
+            low = ranges.get(column, {}).get("min", default_range[0])
+            high = ranges.get(column, {}).get("max", default_range[1])
+            self.sketches[column] = NumericalSketch(get_symlog_bin_edges(low, high, n_bins))
+        for column in categorical_columns:
+            self.sketches[column] = CategoricalSketch()
+
+    def update(self, dataframe: DataFrame) -> "DatasetSketch":
+        for column, sketch in self.sketches.items():
+            if column not in dataframe.columns:
+                continue
+            if isinstance(sketch, NumericalSketch):
+                sketch.update(dataframe[column].to_numpy(np.float64, na_value=np.nan))
+            else:
+                sketch.update(dataframe[column])
+        self.n_rows += len(dataframe)
+        return self
+
+    def merge(self, other: "DatasetSketch") -> "DatasetSketch":
+        for column, sketch in other.sketches.items():
+            if column in self.sketches:
+                self.sketches[column].merge(sketch)
+            else:
+                self.sketches[column] = sketch
+        self.n_rows += other.n_rows
+        return self
+
+    def empty_like(self) -> "DatasetSketch":
+        """Returns an empty sketch with the same columns and bin edges, ready to summarise a batch to compare against this one."""
+        sketch = DatasetSketch()
+        for column, column_sketch in self.sketches.items():
+            sketch.sketches[column] = NumericalSketch(column_sketch.bin_edges) if isinstance(column_sketch, NumericalSketch) \
+                else CategoricalSketch()
+        return sketch
+
+    def to_dict(self) -> dict:
+        return {"n_rows": self.n_rows, "columns": {column: sketch.to_dict() for column, sketch in self.sketches.items()}}
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "DatasetSketch":
+        sketch = cls()
+        sketch.n_rows = content["n_rows"]
+        for column, column_content in content["columns"].items():
+            sketch_class = NumericalSketch if column_content["type"] == "num" else CategoricalSketch
+            sketch.sketches[column] = sketch_class.from_dict(column_content)
+        return sketch
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[DataFrame], **kwargs) -> "DatasetSketch":
+        sketch = cls(**kwargs)
+        for chunk in chunks:
+            sketch.update(chunk)
+        return sketch
+
+
+def compute_sketch_drift_report(reference_sketch: DatasetSketch, current_sketch: DatasetSketch, thresholds: dict,
+                                drift_share: float = 0.5, small_sample_size: int = 1000) -> dict:
+    """
+    Computes the same drift report as compute_drift_report from two dataset sketches built on the same bin edges.
+    The KS statistic of numerical columns is evaluated at the bin edges, so it is exact up to the width of one bin.
+
+    Args:
+        reference_sketch (DatasetSketch): The baseline sketch, e.g. of the training data.
+        current_sketch (DatasetSketch): The sketch of the current batch.
+        thresholds (dict): "p_value", "ks_statistic" and "psi" thresholds.
+        drift_share (float, optional): Share of drifted columns above which the dataset drifts. Defaults to 0.5.
+        small_sample_size (int, optional): Sample size up to which p-values decide the drift. Defaults to 1000.
+    Returns:
+        dict: The per column drift results and the dataset drift decision.
+    Raises:
+        USVisaException: If there is an error computing the drift.
+    """
+    try:
+        small_sample = reference_sketch.n_rows <= small_sample_size
+        features = {}
+        for column, reference in reference_sketch.sketches.items():
+            current = current_sketch.sketches.get(column)
+            if current is None or current.count == 0:
+                continue
+            if isinstance(reference, NumericalSketch):
+                if reference.count == 0:
+                    continue
+                reference_cdf = np.cumsum(reference.bin_counts) / reference.count
+                current_cdf = np.cumsum(current.bin_counts) / current.count
+                statistic = float(np.max(np.abs(reference_cdf - current_cdf)))
+                p_value = float(kstwo.sf(statistic, np.round(reference.count * current.count / (reference.count + current.count))))
+                features[column] = {"feature_type": "num", "stattest_name": "ks", "statistic": statistic, "p_value": p_value,
+                                    "drift_detected": is_column_drifted("ks", statistic, p_value, small_sample, thresholds)}
+            else:
+                categories = list(reference.category_counts) + \
+                    [category for category in current.category_counts if category not in reference.category_counts]
+                reference_counts = np.array([reference.category_counts.get(category, 0) for category in categories])
+                current_counts = np.array([current.category_counts.get(category, 0) for category in categories])
+                _, p_value = chi_square_test(reference_counts, current_counts)
+                statistic = population_stability_index(reference_counts, current_counts)
+                features[column] = {"feature_type": "cat", "stattest_name": "chi_square/psi", "statistic": statistic,
+                                    "p_value": p_value,
+                                    "drift_detected": is_column_drifted("psi", statistic, p_value, small_sample, thresholds)}
+
+        return summarize_drift(features, drift_share)
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
@@ -0,0 +1,184 @@
+import sys
+from typing import Dict
+
+import numpy as np
+
+from visa.exception import USVisaException
+
+
+def get_score_bins(scores: np.ndarray, n_bins: int) -> np.ndarray:
+    """
+    Returns the histogram bin of every predicted probability. Bin k holds the scores in (k / n_bins, (k + 1) / n_bins],
+    so a score is above the threshold k / n_bins exactly when its bin is at least k, the same strict comparison as
+    predict of the classifiers.
+
+    Args:
+        scores (np.ndarray): The predicted probabilities of the positive class.
+        n_bins (int): The number of bins of [0, 1].
+    Returns:
+        np.ndarray: The int64 bin of every score.
+    """
+    return np.clip(np.ceil(np.asarray(scores, dtype=np.float64) * n_bins).astype(np.int64) - 1, 0, n_bins - 1)
+
+
+class StreamingBinaryMetrics:
+    """
+    Accumulates the scores of a binary classifier batch by batch into a (label, score bin) count histogram, from
+    which ROC-AUC and the precision, recall and F1 at every threshold are computed in one vectorized pass. Only the
+    histogram is held, so the number of rows does not change the memory used.
+    """
+
+    def __init__(self, n_bins: int, decision_threshold: float = 0.5):
+        self.n_bins = n_bins
+        self.decision_bin = int(round(decision_threshold * n_bins))
+        self.histogram = np.zeros((2, n_bins), dtype=np.int64)
+
+    def update(self, labels: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """
+        Adds a batch to the histogram and returns the 0/1 predictions of the batch at the decision threshold.
+        """
+        bins = get_score_bins(scores, self.n_bins)
+        labels = np.asarray(labels, dtype=np.int64)
+        self.histogram += np.bincount(labels * self.n_bins + bins, minlength=2 * self.n_bins).reshape(2, self.n_bins)
+        return (bins >= self.decision_bin).astype(np.int64)
+
+
+def get_histogram_metrics(histogram: np.ndarray, thresholds: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Computes ROC-AUC and the precision, recall and F1 at every threshold from (label, score bin) count histograms.
+    Leading axes are kept, so the metrics of all bootstrap resamples are computed at once.
+
+    ROC-AUC counts the pairs of a positive and a negative with the positive in a higher bin, and pairs in the same
+    bin as half, which is exact whenever no negative and positive share a bin.
+
+    Args:
+        histogram (np.ndarray): Counts of shape (..., 2, n_bins), negatives first.
+        thresholds (np.ndarray): The thresholds, multiples of 1 / n_bins.
+    Returns:
+        dict: roc_auc of shape (...) and precision, recall and f1 of shape (..., n_thresholds).
+    """
+    try:
+        histogram = np.asarray(histogram, dtype=np.float64)
+        n_bins = histogram.shape[-1]
+        negatives, positives = histogram[..., 0, :], histogram[..., 1, :]
+        n_negatives, n_positives = negatives.sum(axis=-1), positives.sum(axis=-1)
+
+        negatives_below = np.cumsum(negatives, axis=-1) - negatives
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roc_auc = (positives * (negatives_below + 0.5 * negatives)).sum(axis=-1) / (n_positives * n_negatives)
+
+        threshold_bins = np.clip(np.round(np.asarray(thresholds) * n_bins).astype(np.int64), 0, n_bins - 1)
+        true_positives = np.flip(np.cumsum(np.flip(positives, axis=-1), axis=-1), axis=-1)[..., threshold_bins]
+        false_positives = np.flip(np.cumsum(np.flip(negatives, axis=-1), axis=-1), axis=-1)[..., threshold_bins]
+        false_negatives = n_positives[..., None] - true_positives
+        return {"roc_auc": roc_auc,
+                "precision": safe_divide(true_positives, true_positives + false_positives),
+                "recall": safe_divide(true_positives, true_positives + false_negatives),
+                "f1": safe_divide(2 * true_positives, 2 * true_positives + false_positives + false_negatives)}
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """
+    Returns numerator / denominator with 0 where the denominator is 0, as sklearn's zero_division=0.
+    """
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape),
+                     where=np.asarray(denominator) != 0)
+
+
+def resample_counts(counts: np.ndarray, n_resamples: int, random_state: int = 42) -> np.ndarray:
+    """
+    Draws bootstrap resamples of the rows summarised by a count array. Resampling n rows with replacement is a
+    multinomial draw over the cells with the cell frequencies as probabilities, so all resamples are one NumPy call
+    whose cost depends on the number of cells and not on the number of rows.
+
+    Args:
+        counts (np.ndarray): Counts of any shape.
+        n_resamples (int): The number of bootstrap resamples.
+        random_state (int): Seed of the random generator.
+    Returns:
+        np.ndarray: The resampled counts of shape (n_resamples, *counts.shape).
+    """
+    try:
+        counts = np.asarray(counts, dtype=np.int64)
+        n_rows = int(counts.sum())
+        random_generator = np.random.default_rng(random_state)
+        resampled = random_generator.multinomial(n_rows, counts.ravel() / max(n_rows, 1), size=n_resamples)
+        return resampled.reshape((n_resamples,) + counts.shape)
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def get_confidence_interval(values: np.ndarray, confidence_level: float) -> list:
+    """
+    Returns the percentile bootstrap confidence interval [low, high] of the resampled values along the first axis.
+    """
+    alpha = 1.0 - confidence_level
+    low, high = np.nanquantile(values, [alpha / 2, 1 - alpha / 2], axis=0)
+    return [np.asarray(low).tolist(), np.asarray(high).tolist()]
+
+
+def get_paired_f1_difference(paired_counts: np.ndarray, n_resamples: int, confidence_level: float,
+                             random_state: int = 42) -> dict:
+    """
+    Computes the F1 difference of two models evaluated on the same rows, and its paired bootstrap confidence
+    interval, from the (label, first prediction, second prediction) 2x2x2 count table at the decision threshold.
+    Resampling the rows of the table keeps the pairing of the predictions of both models.
+
+    Args:
+        paired_counts (np.ndarray): Counts of shape (2, 2, 2) indexed by label, first and second prediction.
+        n_resamples (int): The number of bootstrap resamples.
+        confidence_level (float): The confidence level of the interval.
+        random_state (int): Seed of the random generator.
+    Returns:
+        dict: The difference of the first F1 minus the second F1 and its confidence interval.
+    """
+    try:
+        def get_f1(counts: np.ndarray, model_axis: int) -> np.ndarray:
+            counts = counts.sum(axis=-1 if model_axis == 0 else -2)
+            true_positives, false_negatives, false_positives = counts[..., 1, 1], counts[..., 1, 0], counts[..., 0, 1]
+            return safe_divide(2 * true_positives, 2 * true_positives + false_positives + false_negatives)
+
+        paired_counts = np.asarray(paired_counts, dtype=np.float64)
+        resampled = resample_counts(paired_counts, n_resamples, random_state).astype(np.float64)
+        difference = float(get_f1(paired_counts, 0) - get_f1(paired_counts, 1))
+        resampled_difference = get_f1(resampled, 0) - get_f1(resampled, 1)
+        return {"difference": difference,
+                "confidence_interval": get_confidence_interval(resampled_difference, confidence_level)}
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def get_metric_report(metrics: StreamingBinaryMetrics, thresholds: np.ndarray, n_resamples: int,
+                      confidence_level: float, random_state: int = 42) -> dict:
+    """
+    Returns the ROC-AUC and the precision, recall and F1 at the decision threshold and at every threshold of a model,
+    with bootstrap confidence intervals from resamples of its count histogram.
+
+    Args:
+        metrics (StreamingBinaryMetrics): The accumulated histogram of the model.
+        thresholds (np.ndarray): The thresholds of the threshold table.
+        n_resamples (int): The number of bootstrap resamples.
+        confidence_level (float): The confidence level of the intervals.
+        random_state (int): Seed of the random generator.
+    Returns:
+        dict: The metric report.
+    """
+    try:
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        all_thresholds = np.append(thresholds, metrics.decision_bin / metrics.n_bins)
+        point = get_histogram_metrics(metrics.histogram, all_thresholds)
+        resampled = get_histogram_metrics(resample_counts(metrics.histogram, n_resamples, random_state), all_thresholds)
+        report = {"n_rows": int(metrics.histogram.sum()),
+                  "roc_auc": float(point["roc_auc"]),
+                  "roc_auc_confidence_interval": get_confidence_interval(resampled["roc_auc"], confidence_level)}
+        for name in ("f1", "precision", "recall"):
+            report[f"{name}_score"] = float(point[name][-1])
+            report[f"{name}_score_confidence_interval"] = [bound[-1] for bound in
+                                                           get_confidence_interval(resampled[name], confidence_level)]
+        report["thresholds"] = {float(threshold): {name: float(point[name][index]) for name in ("f1", "precision", "recall")}
+                                for index, threshold in enumerate(thresholds)}
+        return report
+    except Exception as e:
+        raise USVisaException(e, sys) from e
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Optional
+
+import numpy as np
+from pandas import DataFrame
+
+from visa.entity.estimator import TargetValueMapping
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.model_package import load_model_package
+
+
+_inference_worker_state = {}
+
+
+def init_inference_worker(package_dir: str, n_threads: int) -> None:
+    """
+    Initializer of the inference worker processes: loads the model package once per worker, with its arrays memory
+    mapped so the workers share their pages, and limits the threads of learners with an n_jobs parameter, so the
+    workers do not oversubscribe the CPUs.
+    """
+    model = load_model_package(package_dir, lazy=False)
+    learner = model.trained_model_object
+    if "n_jobs" in getattr(learner, "get_params", dict)():
+        learner.set_params(n_jobs=n_threads)
+    _inference_worker_state.update(model=model, labels=TargetValueMapping().reverse_mapping())
+    logging.info(f"Inference worker {os.getpid()} loaded the model package: {package_dir}")
+
+
+def score_chunk(chunk: DataFrame, first_row: int, key_columns: tuple, drop_columns: tuple,
+                decision_threshold: float) -> dict:
+    """
+    Scores a chunk of raw records with the model of the worker. Runs in an inference worker.
+
+    Args:
+        chunk (DataFrame): The raw records.
+        first_row (int): Position of the first record of the chunk in the input.
+        key_columns (tuple): Input columns copied to the output when present, such as case_id.
+        drop_columns (tuple): Input columns left out of the features when present, such as the target.
+        decision_threshold (float): Probability above which a record is predicted as the positive class.
+    Returns:
+        dict: The predictions DataFrame, with the row number, the key columns, the probability of the positive
+        class and the predicted label, and the scoring seconds.
+    """
+    start_time = time.perf_counter()
+    features = chunk.drop(columns=[column for column in drop_columns if column in chunk.columns])
+    probability = _inference_worker_state["model"].predict_proba(features)
+    labels = _inference_worker_state["labels"]
+    predictions = {"row_number": np.arange(first_row, first_row + len(chunk), dtype=np.int64)}
+    for column in key_columns:
+        if column in chunk.columns:
+            predictions[column] = chunk[column].to_numpy()
+    predictions["probability"] = probability
+    predictions["prediction"] = np.where(probability > decision_threshold, labels[1], labels[0])
+    return {"predictions": DataFrame(predictions), "seconds": time.perf_counter() - start_time}
+
+
+def read_checkpoint(file_path: str) -> Optional[dict]:
+    """
+    Reads the checkpoint of a batch inference run, None if there is none.
+    """
+    try:
+        with open(file_path) as file_obj:
+            return json.load(file_obj)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(file_path: str, checkpoint: dict) -> None:
+    """
+    Replaces the checkpoint of a batch inference run atomically, by writing a temporary file, syncing it to disk
+    and renaming it over the checkpoint.
+
+    Args:
+        file_path (str): The checkpoint file.
+        checkpoint (dict): JSON serialisable checkpoint.
+    Raises:
+        USVisaException: If the checkpoint cannot be written.
+    """
+    try:
+        temp_file_path = f"{file_path}.tmp-{uuid.uuid4().hex}"
+        with open(temp_file_path, "w") as file_obj:
+            json.dump(checkpoint, file_obj, indent=2)
+            file_obj.flush()
+            os.fsync(file_obj.fileno())
+        os.replace(temp_file_path, file_path)
+    except Exception as e:
+        raise USVisaException(e, sys) from e
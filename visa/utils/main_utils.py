@@ -3,13 +3,25 @@ import pandas as pd
 import dill
 import yaml
 from pandas import DataFrame
+import io
 import sys
 import os
+import multiprocessing
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple, Union
+from scipy import sparse
 
+from visa.constants import SCHEMA_CATEGORY_MAX_UNIQUE_RATIO
 from visa.logger import logging 
 from visa.exception import USVisaException
 
 
+_background_executor = None
+_background_futures = []
+
+
 def read_yaml_file(file_path: str) -> dict:
     """
     Reads a YAML file and returns its contents as a dictionary.
@@ -70,39 +82,72 @@ def load_object(file_path: str) -> object:
         raise USVisaException(e, sys) from e
     
     
-def save_numpy_array_data(file_path: str, array: np.ndarray) -> None:
+def save_numpy_array_data(file_path: str, array: Union[np.ndarray, sparse.spmatrix]) -> None:
     """
-    Saves a NumPy array to a file.
+    Saves a NumPy array to a file. Sparse matrices are saved in CSR format as an uncompressed .npz archive.
     
     Args:
         file_path (str): The path to the file where the array will be saved.
-        array (np.ndarray): The NumPy array to be saved.
+        array (Union[np.ndarray, sparse.spmatrix]): The NumPy array or sparse matrix to be saved.
     Raises:
         USVisaException: If there is an error saving the NumPy array to the file.
     """
     try:
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path, "wb") as file_obj:
-            np.save(file_obj, array)
+            if sparse.issparse(array):
+                sparse.save_npz(file_obj, array.tocsr(), compressed=False)
+            else:
+                np.save(file_obj, array)
             
     except Exception as e:
         raise USVisaException(e, sys) from e
     
     
-def load_numpy_array_data(file_path: str) -> np.ndarray:
+def load_numpy_array_data(file_path: str, mmap_mode: Optional[str] = None) -> Union[np.ndarray, sparse.csr_matrix]:
     """
-    Loads a NumPy array from a file.
+    Loads a NumPy array from a file. The format is detected from the file content, so .npy arrays and .npz sparse
+    matrices are both understood.
     
     Args:
-        file_path (str): The path to the file containing the saved NumPy array. 
+        file_path (str): The path to the file containing the saved NumPy array or sparse matrix.
+        mmap_mode (Optional[str], optional): "r" maps a .npy file read-only instead of reading it, so processes loading
+            the same file share its pages. Sparse matrices are always read. Defaults to None.
     Returns:
-        np.ndarray: The loaded NumPy array.
+        Union[np.ndarray, sparse.csr_matrix]: The loaded NumPy array or CSR matrix.
     Raises:
         USVisaException: If there is an error loading the NumPy array from the file.
     """
     try:
-        with open(file_path, "rb") as file_obj:
-            return np.load(file_obj)
+        if zipfile.is_zipfile(file_path):
+            return sparse.load_npz(file_path).tocsr()
+        return np.load(file_path, mmap_mode=mmap_mode)
+        
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+    
+    
+def load_transformed_data(features_file_path: str, labels_file_path: str,
+                          mmap_mode: Optional[str] = "r") -> Tuple[Union[np.ndarray, sparse.csr_matrix], np.ndarray]:
+    """
+    Loads the aligned features and labels files written by data transformation.
+    
+    Args:
+        features_file_path (str): The path to the features file.
+        labels_file_path (str): The path to the labels file.
+        mmap_mode (Optional[str], optional): Memory map mode of np.load. Defaults to "r".
+    Returns:
+        Tuple[Union[np.ndarray, sparse.csr_matrix], np.ndarray]: The dense or sparse features and the labels.
+    Raises:
+        USVisaException: If the files are not aligned or cannot be loaded.
+    """
+    try:
+        features = load_numpy_array_data(features_file_path, mmap_mode=mmap_mode)
+        labels = load_numpy_array_data(labels_file_path, mmap_mode=mmap_mode)
+        if features.shape[0] != labels.shape[0]:
+            raise ValueError(f"Features file: {features_file_path} has {features.shape[0]} rows but labels file: "
+                             f"{labels_file_path} has {labels.shape[0]}")
+        return features, labels
         
     except Exception as e:
         raise USVisaException(e, sys) from e
@@ -145,4 +190,458 @@ def drop_columns(df: DataFrame, columns: list) -> DataFrame:
         
         return df
     except Exception as e:
-        raise USVisaException(e, sys) from e
\ No newline at end of file
+        raise USVisaException(e, sys) from e
+
+def get_file_format(file_path: str) -> str:
+    """
+    Returns the artifact file format of a path from its extension.
+
+    Args:
+        file_path (str): The path to the data file.
+    Returns:
+        str: One of "csv", "parquet" or "feather".
+    Raises:
+        USVisaException: If the extension is not a supported file format.
+    """
+    try:
+        file_format = os.path.splitext(file_path)[1].lstrip(".").lower()
+        if file_format not in ("csv", "parquet", "feather"):
+            raise Exception(f"Unsupported file format: [{file_format}] for file: {file_path}")
+        return file_format
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def get_schema_dtypes(schema_config: dict) -> dict:
+    """
+    Returns the dtypes of the columns declared in the schema config.
+
+    Args:
+        schema_config (dict): The contents of config/schema.yaml.
+    Returns:
+        dict: Mapping of column name to its declared dtype, "category" or "int".
+    """
+    return {column: dtype for item in schema_config["columns"] for column, dtype in item.items()}
+
+
+def apply_schema_dtypes(df: DataFrame, schema_config: dict, log_report: bool = True) -> DataFrame:
+    """
+    Compacts a DataFrame to the dtypes declared in the schema config.
+    Categorical columns become pandas category with the fixed category set of their "domains" entry, followed by
+    any value outside of it so that nothing is lost. Categorical columns without a domain become pandas category
+    unless more than SCHEMA_CATEGORY_MAX_UNIQUE_RATIO of their values are distinct, such as identifiers, which are
+    kept as strings. Numerical columns are downcast to the smallest integer or float width that holds their values
+    exactly.
+
+    Args:
+        df (DataFrame): The DataFrame to be compacted, it is modified in place.
+        schema_config (dict): The contents of config/schema.yaml.
+        log_report (bool, optional): Whether to log the memory saved per column. Defaults to True.
+    Returns:
+        DataFrame: The compacted DataFrame.
+    Raises:
+        USVisaException: If there is an error converting the columns.
+    """
+    try:
+        domains = schema_config.get("domains", {})
+        memory_report = {}
+        for column, dtype in get_schema_dtypes(schema_config).items():
+            if column not in df.columns:
+                continue
+            before = df[column].memory_usage(index=False, deep=True)
+            if dtype == "category":
+                if column in domains:
+                    categories = list(domains[column])
+                    unknown = pd.Index(df[column].dropna().unique()).difference(categories)
+                    df[column] = pd.Categorical(df[column], categories=categories + sorted(unknown))
+                elif df[column].nunique() > SCHEMA_CATEGORY_MAX_UNIQUE_RATIO * len(df):
+                    if isinstance(df[column].dtype, pd.CategoricalDtype):
+                        df[column] = df[column].astype(object)
+                elif not isinstance(df[column].dtype, pd.CategoricalDtype):
+                    df[column] = df[column].astype("category")
+            else:
+                values = pd.to_numeric(df[column], errors="coerce")
+                if values.notna().all() and (values % 1 == 0).all():
+                    values = pd.to_numeric(values.astype(np.int64), downcast="integer")
+                else:
+                    float32_values = values.astype(np.float32)
+                    if np.array_equal(float32_values.to_numpy(np.float64), values.to_numpy(np.float64), equal_nan=True):
+                        values = float32_values
+                df[column] = values
+            after = df[column].memory_usage(index=False, deep=True)
+            memory_report[column] = (str(df[column].dtype), int(before), int(after))
+
+        if log_report:
+            for column, (dtype, before, after) in memory_report.items():
+                logging.info(f"Column: {column} compacted to {dtype}, memory: {before} -> {after} bytes, saved: {before - after} bytes")
+            saved = sum(before - after for _, before, after in memory_report.values())
+            logging.info(f"Schema dtype compaction saved {saved} bytes in total")
+        return df
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def read_dataframe(file_path: str, columns: list = None, schema_config: dict = None) -> DataFrame:
+    """
+    Reads a DataFrame from a csv, parquet or feather file, chosen by the file extension.
+    Columnar formats keep the dtypes they were written with and only read the requested columns.
+
+    Args:
+        file_path (str): The path to the data file.
+        columns (list, optional): The columns to read. Defaults to all columns.
+        schema_config (dict, optional): Schema config used to compact the loaded columns with apply_schema_dtypes.
+    Returns:
+        DataFrame: The loaded DataFrame.
+    Raises:
+        USVisaException: If there is an error reading the file.
+    """
+    try:
+        file_format = get_file_format(file_path)
+        if file_format == "parquet":
+            df = pd.read_parquet(file_path, columns=columns)
+        elif file_format == "feather":
+            df = pd.read_feather(file_path, columns=columns)
+        else:
+            dtypes = None
+            if schema_config is not None:
+                dtypes = {column: "category" for column in schema_config.get("domains", {})}
+            df = pd.read_csv(file_path, usecols=columns, dtype=dtypes)
+
+        if schema_config is not None:
+            df = apply_schema_dtypes(df, schema_config)
+        return df
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def iter_dataframe_chunks(file_path: str, chunk_size: int, columns: list = None,
+                          schema_config: dict = None) -> Iterator[DataFrame]:
+    """
+    Reads a csv, parquet or feather file as DataFrame chunks of at most chunk_size rows, so only one chunk is held in
+    memory. Parquet is read batch by batch, feather is memory mapped and sliced, csv is read with chunksize.
+
+    Args:
+        file_path (str): The path to the data file.
+        chunk_size (int): The maximum number of rows of a chunk.
+        columns (list, optional): The columns to read. Defaults to all columns.
+        schema_config (dict, optional): Schema config used to compact each chunk with apply_schema_dtypes, which also
+            gives every chunk the same fixed category sets.
+    Yields:
+        DataFrame: The next chunk.
+    Raises:
+        USVisaException: If there is an error reading the file.
+    """
+    try:
+        file_format = get_file_format(file_path)
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            chunks = (batch.to_pandas() for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=columns))
+        elif file_format == "feather":
+            import pyarrow as pa
+
+            table = pa.ipc.open_file(pa.memory_map(file_path)).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            chunks = (table.slice(offset, chunk_size).to_pandas() for offset in range(0, table.num_rows, chunk_size))
+        else:
+            dtypes = None
+            if schema_config is not None:
+                dtypes = {column: "category" for column in schema_config.get("domains", {})}
+            chunks = pd.read_csv(file_path, usecols=columns, dtype=dtypes, chunksize=chunk_size)
+
+        for chunk in chunks:
+            yield apply_schema_dtypes(chunk, schema_config, log_report=False) if schema_config is not None else chunk
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def iter_dataframe_chunks_with_positions(file_path: str, chunk_size: int, position: Optional[dict] = None,
+                                         columns: list = None,
+                                         schema_config: dict = None) -> Iterator[Tuple[DataFrame, dict]]:
+    """
+    Reads a csv, parquet or feather file as DataFrame chunks of at most chunk_size rows, like iter_dataframe_chunks,
+    together with the position in the file after every chunk, and starts reading at such a position, so a resumed
+    run seeks past the rows it has consumed instead of reading them again. The position of a csv file is the byte
+    offset of the next record, of a parquet file the row group holding the next row and the row within it, and of
+    a feather file, which is memory mapped, the next row.
+
+    Args:
+        file_path (str): The path to the data file.
+        chunk_size (int): The maximum number of rows of a chunk.
+        position (dict, optional): Position to start reading at, as yielded with an earlier chunk. Defaults to the
+            start of the file.
+        columns (list, optional): The columns to read. Defaults to all columns.
+        schema_config (dict, optional): Schema config used to compact each chunk with apply_schema_dtypes.
+    Yields:
+        Tuple[DataFrame, dict]: The next chunk and the position after it.
+    Raises:
+        USVisaException: If there is an error reading the file.
+    """
+    try:
+        file_format = get_file_format(file_path)
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(file_path)
+            group_first_rows = np.cumsum([0] + [parquet_file.metadata.row_group(group).num_rows
+                                                for group in range(parquet_file.num_row_groups)])
+            row_group, n_skipped_rows = (position["row_group"], position["row"]) if position else (0, 0)
+            next_row = int(group_first_rows[row_group]) + n_skipped_rows
+            batches = parquet_file.iter_batches(batch_size=chunk_size, columns=columns,
+                                                row_groups=range(row_group, parquet_file.num_row_groups)) \
+                if row_group < parquet_file.num_row_groups else iter(())
+
+            def iter_chunks():
+                nonlocal n_skipped_rows, next_row
+                for batch in batches:
+                    if n_skipped_rows >= batch.num_rows:
+                        n_skipped_rows -= batch.num_rows
+                        continue
+                    batch, n_skipped_rows = batch.slice(n_skipped_rows), 0
+                    next_row += batch.num_rows
+                    next_group = int(np.searchsorted(group_first_rows, next_row, side="right")) - 1
+                    yield batch.to_pandas(), {"row_group": next_group, "row": next_row - int(group_first_rows[next_group])}
+            chunks = iter_chunks()
+        elif file_format == "feather":
+            import pyarrow as pa
+
+            table = pa.ipc.open_file(pa.memory_map(file_path)).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            chunks = ((table.slice(offset, chunk_size).to_pandas(), {"row": min(offset + chunk_size, table.num_rows)})
+                      for offset in range((position or {}).get("row", 0), table.num_rows, chunk_size))
+        else:
+            dtypes = None
+            if schema_config is not None:
+                dtypes = {column: "category" for column in schema_config.get("domains", {})}
+
+            def iter_chunks():
+                with open(file_path, "rb") as file_obj:
+                    header = file_obj.readline()
+                    if position:
+                        file_obj.seek(position["byte_offset"])
+                    byte_offset = file_obj.tell()
+                    while True:
+                        data = b"".join(islice(file_obj, chunk_size))
+                        if not data:
+                            return
+                        # a quoted value may hold line breaks, so the chunk is extended until its quotes are balanced
+                        while data.count(b'"') % 2:
+                            line = file_obj.readline()
+                            if not line:
+                                break
+                            data += line
+                        byte_offset += len(data)
+                        yield (pd.read_csv(io.BytesIO(header + data), usecols=columns, dtype=dtypes),
+                               {"byte_offset": byte_offset})
+            chunks = iter_chunks()
+
+        for chunk, chunk_position in chunks:
+            if schema_config is not None:
+                chunk = apply_schema_dtypes(chunk, schema_config, log_report=False)
+            yield chunk, chunk_position
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def write_dataframe(df: DataFrame, file_path: str) -> None:
+    """
+    Writes a DataFrame to a csv, parquet or feather file, chosen by the file extension.
+
+    Args:
+        df (DataFrame): The DataFrame to be written.
+        file_path (str): The path to the data file.
+    Raises:
+        USVisaException: If there is an error writing the file.
+    """
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        file_format = get_file_format(file_path)
+        if file_format == "parquet":
+            df.to_parquet(file_path, index=False)
+        elif file_format == "feather":
+            df.reset_index(drop=True).to_feather(file_path)
+        else:
+            df.to_csv(file_path, index=False, header=True)
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+class DataFrameChunkWriter:
+    """
+    Writes DataFrame chunks one after another into a single csv, parquet or feather file.
+    Parquet chunks are written as row groups with the arrow schema of the first chunk, csv chunks are
+    appended, and feather chunks are combined when the writer is closed as the format cannot be appended to.
+    """
+
+    def __init__(self, file_path: str):
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            self.file_path = file_path
+            self.file_format = get_file_format(file_path)
+            self.n_rows = 0
+            self._parquet_writer = None
+            self._feather_tables = []
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def write(self, chunk: DataFrame) -> None:
+        try:
+            if self.file_format == "csv":
+                chunk.to_csv(self.file_path, index=False, mode="w" if self.n_rows == 0 else "a", header=self.n_rows == 0)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if self._parquet_writer is None and not self._feather_tables:
+                    self._schema = pa.schema([
+                        field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                        if pa.types.is_dictionary(field.type) else field
+                        for field in table.schema
+                    ]).remove_metadata()
+                table = table.cast(self._schema)
+                if self.file_format == "parquet":
+                    if self._parquet_writer is None:
+                        self._parquet_writer = pq.ParquetWriter(self.file_path, self._schema)
+                    self._parquet_writer.write_table(table)
+                else:
+                    self._feather_tables.append(table)
+            self.n_rows += len(chunk)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def close(self) -> None:
+        try:
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+            if self._feather_tables:
+                import pyarrow as pa
+                import pyarrow.feather as feather
+
+                feather.write_feather(pa.concat_tables(self._feather_tables).unify_dictionaries().combine_chunks(), self.file_path)
+                self._feather_tables = []
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StratifiedReservoirSampler:
+    """
+    Uniform sample without replacement of a stream of DataFrame chunks, stratified on a label column.
+    Every row gets a random priority and each class keeps the sample_size rows of lowest priority seen so far,
+    which is a uniform sample of that class however the stream is chunked. sample() then takes from every class
+    its share of sample_size in proportion to the class counts of the whole stream.
+    """
+
+    def __init__(self, sample_size: int, stratify_column: str, random_state: int = 42):
+        try:
+            self.sample_size = sample_size
+            self.stratify_column = stratify_column
+            self.n_rows = 0
+            self._random_generator = np.random.default_rng(random_state)
+            self._class_counts = {}
+            self._reservoirs = {}
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def update(self, chunk: DataFrame) -> None:
+        try:
+            priorities = self._random_generator.random(len(chunk))
+            labels = chunk[self.stratify_column].to_numpy()
+            for label in pd.unique(labels):
+                is_label = labels == label
+                self._class_counts[label] = self._class_counts.get(label, 0) + int(is_label.sum())
+                rows, row_priorities = chunk[is_label], priorities[is_label]
+                if label in self._reservoirs:
+                    reservoir_rows, reservoir_priorities = self._reservoirs[label]
+                    rows = pd.concat([reservoir_rows, rows])
+                    row_priorities = np.concatenate([reservoir_priorities, row_priorities])
+                if len(rows) > self.sample_size:
+                    kept = np.argpartition(row_priorities, self.sample_size)[:self.sample_size]
+                    rows, row_priorities = rows.iloc[kept], row_priorities[kept]
+                self._reservoirs[label] = (rows, row_priorities)
+            self.n_rows += len(chunk)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def sample(self) -> DataFrame:
+        try:
+            frames = []
+            for label, (rows, row_priorities) in self._reservoirs.items():
+                n_class_rows = max(1, round(self.sample_size * self._class_counts[label] / self.n_rows))
+                frames.append(rows.iloc[np.argsort(row_priorities)[:n_class_rows]])
+            return pd.concat(frames)
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+
+def run_in_background(func, *args, **kwargs) -> Future:
+    """
+    Runs a function, typically an artifact write, on a background thread so it is off the critical path.
+    Call wait_for_background_tasks before anything reads the result back from disk.
+
+    Args:
+        func: The function to run.
+        *args, **kwargs: The arguments passed to the function.
+    Returns:
+        Future: The future of the background task.
+    Raises:
+        USVisaException: If the task cannot be submitted.
+    """
+    global _background_executor
+    try:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="artifact_writer")
+        future = _background_executor.submit(func, *args, **kwargs)
+        _background_futures.append(future)
+        return future
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def wait_for_background_tasks() -> None:
+    """
+    Blocks until every task started with run_in_background has finished.
+
+    Raises:
+        USVisaException: If any of the background tasks failed.
+    """
+    try:
+        while _background_futures:
+            _background_futures.pop(0).result()
+        logging.info("All background artifact writes are completed")
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def get_mp_context(mp_context: str, preload_modules: List[str]) -> multiprocessing.context.BaseContext:
+    """
+    Returns the multiprocessing context of a start method for worker processes. With "forkserver" the modules the
+    workers run are imported once in the server process, so the workers forked from it start without importing
+    pandas, sklearn or the learner libraries again. The server is started by the first pool of the process, later
+    preload lists have no effect.
+
+    Args:
+        mp_context (str): Start method: "forkserver", "spawn" or "fork".
+        preload_modules (List[str]): Modules the worker processes import.
+    Returns:
+        multiprocessing.context.BaseContext: The context.
+    """
+    context = multiprocessing.get_context(mp_context)
+    if mp_context == "forkserver":
+        context.set_forkserver_preload(sorted(set(preload_modules)))
+    return context
@@ -0,0 +1,212 @@
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+from visa.constants import (MODEL_PACKAGE_FORMAT_VERSION, MODEL_PACKAGE_LEARNER_FILE_NAME, MODEL_PACKAGE_MANIFEST_FILE_NAME,
+                            MODEL_PACKAGE_PREPROCESSOR_FILE_NAME)
+from visa.entity.estimator import CompiledPreprocessor, VisaModel
+from visa.exception import USVisaException
+from visa.logger import logging
+
+
+def get_learner_format(learner: object) -> str:
+    """
+    Returns the file format a learner is packaged in: the native UBJSON model of XGBoost, the native cbm model of
+    CatBoost, and a joblib pickle with its arrays stored uncompressed, so they can be memory mapped, otherwise.
+    """
+    module = type(learner).__module__
+    if module.startswith("xgboost"):
+        return "ubj"
+    if module.startswith("catboost"):
+        return "cbm"
+    return "joblib"
+
+
+def save_learner(learner: object, file_path: str, learner_format: str) -> None:
+    """
+    Saves a learner in the given package file format.
+    """
+    if learner_format == "ubj":
+        learner.save_model(file_path)
+    elif learner_format == "cbm":
+        learner.save_model(file_path, format="cbm")
+    else:
+        import joblib
+
+        joblib.dump(learner, file_path)
+
+
+def load_learner(file_path: str, learner_manifest: dict, mmap_mode: Optional[str] = "r") -> object:
+    """
+    Loads a learner saved by save_learner. The arrays of joblib learners, such as the node arrays of sklearn trees,
+    are memory mapped with mmap_mode, so processes loading the same package share their pages.
+    """
+    if learner_manifest["format"] == "joblib":
+        import joblib
+
+        return joblib.load(file_path, mmap_mode=mmap_mode)
+    learner_class = getattr(importlib.import_module(learner_manifest["module"]), learner_manifest["class"])
+    learner = learner_class()
+    if learner_manifest["format"] == "cbm":
+        learner.load_model(file_path, format="cbm")
+    else:
+        learner.load_model(file_path)
+    return learner
+
+
+class LazyLearner:
+    """
+    Stands in for the learner of a model package and loads it on first use, so loading a package only reads its
+    manifest and maps its preprocessor arrays.
+    """
+
+    def __init__(self, file_path: str, learner_manifest: dict, mmap_mode: Optional[str] = "r"):
+        self.file_path = file_path
+        self.learner_manifest = learner_manifest
+        self.mmap_mode = mmap_mode
+        self.learner = None
+
+    def load(self) -> object:
+        if self.learner is None:
+            start_time = time.perf_counter()
+            self.learner = load_learner(self.file_path, self.learner_manifest, self.mmap_mode)
+            logging.info(f"Loaded {self.learner_manifest['class']} learner from: {self.file_path} "
+                         f"in {time.perf_counter() - start_time:.3f}s")
+        return self.learner
+
+    def __getattr__(self, name: str):
+        if name.startswith("__") or name in ("file_path", "learner_manifest", "mmap_mode", "learner"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+
+def get_file_sha256(file_path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as file_obj:
+        for block in iter(lambda: file_obj.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def save_model_package(model: VisaModel, package_dir: str, metadata: Optional[dict] = None) -> dict:
+    """
+    Saves a VisaModel as a model package directory of three parts: the parameters of its compiled preprocessor as
+    one float64 .npy array with the slice of every parameter in the manifest, its learner in the native format of
+    the library, and a small JSON manifest. The package is written to a temporary directory and renamed into place.
+
+    Args:
+        model (VisaModel): The model to package.
+        package_dir (str): The package directory, replaced if it exists.
+        metadata (dict, optional): Extra JSON serialisable information to keep in the manifest.
+    Returns:
+        dict: The manifest.
+    Raises:
+        USVisaException: If there is an error saving the package.
+    """
+    try:
+        compiled_preprocessor = model.compiled_preprocessing_object
+        if compiled_preprocessor is None:
+            compiled_preprocessor = CompiledPreprocessor(model.preprocessing_object)
+        learner = model.trained_model_object
+        if isinstance(learner, LazyLearner):
+            learner = learner.load()
+
+        temp_package_dir = f"{package_dir.rstrip(os.sep)}.tmp"
+        shutil.rmtree(temp_package_dir, ignore_errors=True)
+        os.makedirs(temp_package_dir)
+
+        arrays, preprocessor_manifest = compiled_preprocessor.get_state()
+        slices, offset = {}, 0
+        for name, array in arrays.items():
+            slices[name] = [offset, offset + len(array)]
+            offset += len(array)
+        np.save(os.path.join(temp_package_dir, MODEL_PACKAGE_PREPROCESSOR_FILE_NAME),
+                np.concatenate(list(arrays.values())) if arrays else np.zeros(0))
+        preprocessor_manifest["file"] = MODEL_PACKAGE_PREPROCESSOR_FILE_NAME
+        preprocessor_manifest["arrays"] = slices
+
+        learner_format = get_learner_format(learner)
+        learner_file_name = f"{MODEL_PACKAGE_LEARNER_FILE_NAME}.{learner_format}"
+        save_learner(learner, os.path.join(temp_package_dir, learner_file_name), learner_format)
+
+        manifest = {
+            "format_version": MODEL_PACKAGE_FORMAT_VERSION,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "learner": {"format": learner_format, "file": learner_file_name,
+                        "module": type(learner).__module__, "class": type(learner).__name__},
+            "preprocessor": preprocessor_manifest,
+            "files": {file_name: get_file_sha256(os.path.join(temp_package_dir, file_name))
+                      for file_name in (MODEL_PACKAGE_PREPROCESSOR_FILE_NAME, learner_file_name)},
+            "metadata": metadata or {},
+        }
+        with open(os.path.join(temp_package_dir, MODEL_PACKAGE_MANIFEST_FILE_NAME), "w") as file_obj:
+            json.dump(manifest, file_obj, indent=2)
+
+        shutil.rmtree(package_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(os.path.abspath(package_dir)), exist_ok=True)
+        os.rename(temp_package_dir, package_dir)
+        logging.info(f"Saved model package of {manifest['learner']['class']} to: {package_dir}")
+        return manifest
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def read_model_package_manifest(package_dir: str) -> dict:
+    """
+    Reads the manifest of a model package and checks its format version.
+    """
+    try:
+        with open(os.path.join(package_dir, MODEL_PACKAGE_MANIFEST_FILE_NAME)) as file_obj:
+            manifest = json.load(file_obj)
+        if manifest["format_version"] > MODEL_PACKAGE_FORMAT_VERSION:
+            raise ValueError(f"Model package format version {manifest['format_version']} is newer than the supported "
+                             f"version {MODEL_PACKAGE_FORMAT_VERSION}")
+        return manifest
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def load_model_package(package_dir: str, lazy: bool = True, mmap_mode: Optional[str] = "r",
+                       verify: bool = False) -> VisaModel:
+    """
+    Loads a model package saved by save_model_package as a VisaModel scoring with the compiled preprocessor.
+    The preprocessor arrays are memory mapped with mmap_mode, and with lazy the learner is only loaded on its
+    first use.
+
+    Args:
+        package_dir (str): The package directory.
+        lazy (bool): Whether to defer loading the learner to its first use.
+        mmap_mode (str, optional): Memory map mode of the arrays, None to read them into memory.
+        verify (bool): Whether to check the sha256 of the package files against the manifest first.
+    Returns:
+        VisaModel: The model, with preprocessing_object None.
+    Raises:
+        USVisaException: If the package is invalid or can not be loaded.
+    """
+    try:
+        manifest = read_model_package_manifest(package_dir)
+        if verify:
+            for file_name, sha256 in manifest["files"].items():
+                if get_file_sha256(os.path.join(package_dir, file_name)) != sha256:
+                    raise ValueError(f"Model package file {file_name} does not match its sha256 in the manifest")
+
+        preprocessor_manifest = manifest["preprocessor"]
+        buffer = np.load(os.path.join(package_dir, preprocessor_manifest["file"]), mmap_mode=mmap_mode)
+        arrays = {name: buffer[start:stop] for name, (start, stop) in preprocessor_manifest["arrays"].items()}
+        compiled_preprocessor = CompiledPreprocessor.from_state(arrays, preprocessor_manifest)
+
+        learner_file_path = os.path.join(package_dir, manifest["learner"]["file"])
+        learner = LazyLearner(learner_file_path, manifest["learner"], mmap_mode)
+        if not lazy:
+            learner = learner.load()
+        return VisaModel(preprocessing_object=None, trained_model_object=learner,
+                         compiled_preprocessing_object=compiled_preprocessor)
+    except Exception as e:
+        raise USVisaException(e, sys) from e
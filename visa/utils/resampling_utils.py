@@ -0,0 +1,143 @@
+import sys
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from imblearn.combine import SMOTEENN
+from imblearn.over_sampling import SMOTE
+from imblearn.under_sampling import EditedNearestNeighbours, RandomUnderSampler
+from sklearn import config_context
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import NearestNeighbors
+
+from visa.exception import USVisaException
+
+
+RESAMPLING_STRATEGIES = ("smoteenn", "smote", "random_under", "class_weight", "none")
+
+
+def get_resampler(strategy: str, n_jobs: Optional[int] = None, nn_algorithm: str = "kd_tree", k_neighbors: int = 5,
+                  enn_neighbors: int = 3, random_state: int = 42):
+    """
+    Returns the imblearn resampler of a resampling strategy. The neighbour searches of SMOTE and ENN are given
+    NearestNeighbors estimators with n_jobs, so the kneighbors queries are split into chunks processed in parallel,
+    and with nn_algorithm, as the brute force search sklearn picks by default for more than 15 features grows
+    quadratically with the rows while a kd-tree returns the same neighbours in close to linear time on this data.
+
+    Args:
+        strategy (str): "smoteenn", "smote" or "random_under".
+        n_jobs (Optional[int], optional): Number of parallel jobs of the neighbour queries. Defaults to None.
+        nn_algorithm (str, optional): Algorithm of the exact neighbour searches. Defaults to "kd_tree".
+        k_neighbors (int, optional): Neighbours SMOTE interpolates between. Defaults to 5.
+        enn_neighbors (int, optional): Neighbours ENN votes with. Defaults to 3.
+        random_state (int, optional): Seed of the synthetic samples. Defaults to 42.
+    Returns:
+        The resampler.
+    Raises:
+        USVisaException: If the strategy has no resampler.
+    """
+    try:
+        smote = SMOTE(sampling_strategy="minority", random_state=random_state,
+                      k_neighbors=NearestNeighbors(n_neighbors=k_neighbors + 1, algorithm=nn_algorithm, n_jobs=n_jobs))
+        if strategy == "smoteenn":
+            enn = EditedNearestNeighbours(sampling_strategy="all", n_jobs=n_jobs,
+                                          n_neighbors=NearestNeighbors(n_neighbors=enn_neighbors + 1, algorithm=nn_algorithm,
+                                                                       n_jobs=n_jobs))
+            return SMOTEENN(sampling_strategy="minority", random_state=random_state, smote=smote, enn=enn)
+        if strategy == "smote":
+            return smote
+        if strategy == "random_under":
+            return RandomUnderSampler(random_state=random_state)
+        raise ValueError(f"Resampling strategy: {strategy} has no resampler, expected one of {RESAMPLING_STRATEGIES}")
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def compute_class_weights(target: np.ndarray) -> dict:
+    """
+    Computes balanced class weights, n_samples / (n_classes * class_count), as used by class_weight="balanced".
+
+    Args:
+        target (np.ndarray): The target labels.
+    Returns:
+        dict: Mapping of class label to weight.
+    """
+    classes, counts = np.unique(target, return_counts=True)
+    return {classes[i].item(): float(len(target) / (len(classes) * counts[i])) for i in range(len(classes))}
+
+
+def resample(strategy: str, features: np.ndarray, target: np.ndarray, n_jobs: Optional[int] = None,
+             nn_algorithm: str = "kd_tree", working_memory: Optional[int] = None,
+             random_state: int = 42) -> Tuple[np.ndarray, np.ndarray, Optional[dict]]:
+    """
+    Applies a resampling strategy. "class_weight" and "none" return the data unchanged, "class_weight" together with
+    the balanced class weights the model should be trained with. Sparse features stay in CSR and are searched with
+    brute force, as the sklearn neighbour trees do not accept sparse input.
+
+    Args:
+        strategy (str): One of RESAMPLING_STRATEGIES.
+        features (np.ndarray): The transformed features.
+        target (np.ndarray): The target labels.
+        n_jobs (Optional[int], optional): Number of parallel jobs of the neighbour queries. Defaults to None.
+        nn_algorithm (str, optional): Algorithm of the exact neighbour searches. Defaults to "kd_tree".
+        working_memory (Optional[int], optional): Memory in MiB of each chunk of pairwise distances. Defaults to None.
+        random_state (int, optional): Seed of the resampler. Defaults to 42.
+    Returns:
+        Tuple[np.ndarray, np.ndarray, Optional[dict]]: The resampled features, target and the class weights.
+    Raises:
+        USVisaException: If there is an error resampling the data.
+    """
+    try:
+        if strategy == "none":
+            return features, target, None
+        if strategy == "class_weight":
+            return features, target, compute_class_weights(target)
+        if sparse.issparse(features):
+            nn_algorithm = "brute"
+        with config_context(working_memory=working_memory):
+            features, target = get_resampler(strategy, n_jobs=n_jobs, nn_algorithm=nn_algorithm,
+                                               random_state=random_state).fit_resample(features, target)
+        return features, target, None
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def estimate_resampling_seconds(strategy: str, features: np.ndarray, target: np.ndarray, pilot_rows: int,
+                                n_jobs: Optional[int] = None, nn_algorithm: str = "kd_tree", random_state: int = 42) -> float:
+    """
+    Estimates the time a resampling strategy takes on the full data. The strategy is timed on stratified pilot
+    samples of pilot_rows / 2 and pilot_rows rows, the growth exponent of the time with the rows is measured from
+    the two pilots and bounded to [1, 2], and the time of the larger pilot is extrapolated to all rows. Data of at most
+    twice pilot_rows rows is not estimated, as the pilots would take about as long as resampling it.
+
+    Args:
+        strategy (str): One of RESAMPLING_STRATEGIES.
+        features (np.ndarray): The transformed features.
+        target (np.ndarray): The target labels.
+        pilot_rows (int): Rows of the larger pilot sample.
+        n_jobs (Optional[int], optional): Number of parallel jobs of the neighbour queries. Defaults to None.
+        nn_algorithm (str, optional): Algorithm of the exact neighbour searches. Defaults to "kd_tree".
+        random_state (int, optional): Seed of the pilot samples and resampler. Defaults to 42.
+    Returns:
+        float: The estimated seconds.
+    Raises:
+        USVisaException: If there is an error timing the pilots.
+    """
+    try:
+        if strategy in ("class_weight", "none") or len(target) <= 2 * pilot_rows:
+            return 0.0
+        pilot_seconds = []
+        for n_rows in (pilot_rows // 2, pilot_rows):
+            pilot_features, _, pilot_target, _ = train_test_split(features, target, train_size=n_rows,
+                                                                  stratify=target, random_state=random_state)
+            start_time = time.perf_counter()
+            resample(strategy, pilot_features, pilot_target, n_jobs=n_jobs, nn_algorithm=nn_algorithm, random_state=random_state)
+            pilot_seconds.append(time.perf_counter() - start_time)
+        cost_exponent = float(np.clip(np.log2(pilot_seconds[1] / max(pilot_seconds[0], 1e-9)), 1.0, 2.0))
+        return pilot_seconds[1] * (len(target) / pilot_rows) ** cost_exponent
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
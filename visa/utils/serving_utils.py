@@ -0,0 +1,164 @@
+import asyncio
+import sys
+import time
+from concurrent.futures import Executor
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from visa.entity.config_entity import ModelRegistryConfig
+from visa.entity.estimator import TargetValueMapping
+from visa.entity.model_registry import ModelCache, get_model_registry
+from visa.exception import USVisaException
+from visa.logger import logging
+
+
+_serving_worker_state = {}
+
+
+class InvalidRecordError(ValueError):
+    """
+    Raised by predict_batch when a record can not be scored because of its values, such as an unknown category or
+    a missing column, so the service answers the request with a client error.
+    """
+
+
+def init_serving_worker(model_registry_config: ModelRegistryConfig) -> None:
+    """
+    Initializer of the serving workers, the serving process itself for a thread executor: opens the model cache of
+    the registry once, so every batch is scored with the current champion without loading it again.
+    """
+    registry = get_model_registry(model_registry_config)
+    _serving_worker_state.update(model_cache=ModelCache(registry, max_size=model_registry_config.cache_size,
+                                                        check_interval=model_registry_config.check_interval),
+                                 labels=TargetValueMapping().reverse_mapping())
+
+
+def predict_batch(records: List[dict], decision_threshold: float) -> Tuple[str, List[Tuple[str, float]]]:
+    """
+    Scores a batch of raw records with the champion model in one call. Runs in a serving worker.
+
+    Args:
+        records (List[dict]): The raw records.
+        decision_threshold (float): Probability above which a record is predicted as the positive class.
+    Returns:
+        Tuple[str, List[Tuple[str, float]]]: The model version and the predicted label and the probability of the
+        positive class of every record.
+    Raises:
+        InvalidRecordError: If a record can not be scored because of its values.
+        RuntimeError: If scoring fails otherwise. USVisaException can not be pickled back from a process executor.
+    """
+    version, model = _serving_worker_state["model_cache"].get_with_version()
+    try:
+        probability = model.predict_proba(records)
+    except Exception as e:
+        cause = e
+        while isinstance(cause, USVisaException) and cause.__cause__ is not None:
+            cause = cause.__cause__
+        if isinstance(cause, (ValueError, KeyError)):
+            raise InvalidRecordError(str(cause)) from None
+        raise RuntimeError(str(e)) from None
+    labels = _serving_worker_state["labels"]
+    predictions = np.where(probability > decision_threshold, labels[1], labels[0])
+    return version, list(zip(predictions.tolist(), probability.tolist()))
+
+
+class MicroBatcher:
+    """
+    Pools concurrent single-record requests of an asyncio server into batches. Requests wait in an asyncio queue
+    and a batch is flushed to predict_fn as soon as it holds max_batch_size records, or max_wait seconds after its
+    first record arrived. predict_fn runs in an executor, so the event loop keeps accepting requests while a batch
+    is scored, and the requests arriving meanwhile form the next batch. A batch only waits for more records when
+    the previous batch held more than one, so a lone request on an idle server is not delayed by max_wait.
+    With max_batch_size 1 every request is scored on its own.
+    """
+
+    def __init__(self, predict_fn: Callable, executor: Executor, max_batch_size: int, max_wait: float,
+                 n_flushers: int = 1):
+        """
+        :param predict_fn: Function scoring a list of records, returning the model version and one result per record
+        :param executor: Thread or process executor predict_fn runs in
+        :param max_batch_size: Maximum number of records of a batch
+        :param max_wait: Maximum seconds the first record of a batch waits for more records
+        :param n_flushers: Number of batches scored at the same time, the number of workers of the executor
+        """
+        self.predict_fn = predict_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.n_flushers = n_flushers
+        self._queue = None
+        self._tasks = []
+        self._last_batch_size = 0
+        self.stats = {"requests": 0, "batches": 0, "max_batch_size": 0}
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self.flush_batches()) for _ in range(self.n_flushers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def predict(self, record: dict) -> Tuple[str, object]:
+        """
+        Queues a record and returns the model version and its result once its batch is scored.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future))
+        return await future
+
+    async def get_batch(self) -> list:
+        """
+        Waits for the first queued request and collects more until the batch is full or max_wait has passed.
+        """
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + (self.max_wait if self._last_batch_size > 1 else 0.0)
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def score_batch(self, batch: list) -> None:
+        """
+        Scores a batch in the executor and resolves the futures of its requests. A batch failing because of one
+        invalid record, such as an unknown category, is scored again record by record, so only that request fails,
+        with the InvalidRecordError of predict_fn. Other failures are raised as USVisaException.
+        """
+        try:
+            version, results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.predict_fn, [record for record, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                for item in batch:
+                    await self.score_batch([item])
+                return
+            logging.info(f"Scoring a record failed: {e}")
+            error = e if isinstance(e, InvalidRecordError) else USVisaException(e, sys)
+            if not batch[0][1].done():
+                batch[0][1].set_exception(error)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result((version, result))
+
+    async def flush_batches(self) -> None:
+        while True:
+            batch = [(record, future) for record, future in await self.get_batch() if not future.done()]
+            self._last_batch_size = len(batch)
+            if not batch:
+                continue
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(batch))
+            await self.score_batch(batch)
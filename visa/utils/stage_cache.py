@@ -0,0 +1,238 @@
+import functools
+import hashlib
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+from pandas import DataFrame
+
+from visa.entity.config_entity import StageCacheConfig
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.main_utils import read_yaml_file, write_yaml_file
+
+
+MANIFEST_FILE_NAME = "manifest.yaml"
+
+
+def get_config_settings(config: object) -> dict:
+    """
+    Returns the plain settings of a config entity, leaving out the run specific directories and file paths.
+
+    Args:
+        config (object): A config entity such as DataTransformationConfig.
+    Returns:
+        dict: Mapping of setting name to its value.
+    """
+    return {name: getattr(config, name) for name in dir(config)
+            if not name.startswith("_") and not name.endswith(("_dir", "_path"))
+            and isinstance(getattr(config, name), (bool, int, float, str, list, tuple))}
+
+
+@functools.lru_cache(maxsize=None)
+def get_package_source_hash() -> str:
+    """
+    Returns a hash of the source code of the whole visa package, so a change to any module the stages import,
+    directly or through other modules, invalidates the cached outputs.
+
+    Returns:
+        str: Hex digest over the relative path and contents of every .py file of the package.
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    hasher = hashlib.sha256()
+    source_file_paths = sorted(os.path.join(dir_path, file_name) for dir_path, _, file_names in os.walk(package_dir)
+                               for file_name in file_names if file_name.endswith(".py"))
+    for source_file_path in source_file_paths:
+        hasher.update(os.path.relpath(source_file_path, package_dir).encode())
+        with open(source_file_path, "rb") as file_obj:
+            hasher.update(hashlib.sha256(file_obj.read()).digest())
+    return hasher.hexdigest()
+
+
+def link_or_copy(source_file_path: str, file_path: str) -> None:
+    """
+    Hard links a file of the run to another path of the run, falling back to a copy across file systems.
+    """
+    try:
+        os.link(source_file_path, file_path)
+    except OSError:
+        shutil.copy2(source_file_path, file_path)
+
+
+class StageCache:
+    """
+    Content addressed cache of pipeline stage outputs.
+    A stage is keyed by a hash of its input data, the config it runs with and the source code of the visa package,
+    so a rerun with byte-identical inputs reuses the stored outputs instead of recomputing them.
+    Outputs are copied into the cache and back into a run, so no run file shares its inode with a cache entry and a
+    run that rewrites its artifacts can not corrupt the cache.
+    Entries are evicted least recently used first once the cache grows beyond max_size_bytes.
+    """
+
+    def __init__(self, stage_cache_config: StageCacheConfig = StageCacheConfig()):
+        try:
+            self.stage_cache_config = stage_cache_config
+            self.report: Dict[str, dict] = {}
+            self._pending_entries: List[tuple] = []
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    @staticmethod
+    def _hash_file(file_path: str, hasher) -> None:
+        with open(file_path, "rb") as file_obj:
+            for block in iter(lambda: file_obj.read(1 << 20), b""):
+                hasher.update(block)
+
+    @staticmethod
+    def _hash_dataframe(dataframe: DataFrame, hasher) -> None:
+        hasher.update(repr(list(zip(dataframe.columns, map(str, dataframe.dtypes)))).encode())
+        hasher.update(pd.util.hash_pandas_object(dataframe, index=False).values.tobytes())
+
+    def compute_key(self, stage_name: str, inputs: list, config: dict) -> str:
+        """
+        This function computes the cache key of a stage, including the source code of the visa package.
+        Input           :  inputs: DataFrames or file paths the stage reads, config: settings and schema/model sections
+                           the stage depends on
+        Output          :  hex digest of the key
+        on Failure      :  raise exception
+        """
+        try:
+            hasher = hashlib.sha256(stage_name.encode())
+            for stage_input in inputs:
+                if isinstance(stage_input, DataFrame):
+                    self._hash_dataframe(stage_input, hasher)
+                else:
+                    self._hash_file(stage_input, hasher)
+            hasher.update(repr(sorted(config.items())).encode())
+            hasher.update(get_package_source_hash().encode())
+            return hasher.hexdigest()
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def _entry_dir(self, stage_name: str, key: str) -> str:
+        return os.path.join(self.stage_cache_config.stage_cache_dir, stage_name, key)
+
+    def lookup(self, stage_name: str, key: str, output_file_paths: Dict[str, str]) -> Optional[dict]:
+        """
+        This function restores copies of the cached outputs of a stage into the current run.
+        Input           :  output_file_paths: mapping of output name to the path it is expected at in this run
+        Output          :  the cached artifact fields on a hit, None on a miss
+        on Failure      :  raise exception
+        """
+        try:
+            entry_dir = self._entry_dir(stage_name, key)
+            manifest_file_path = os.path.join(entry_dir, MANIFEST_FILE_NAME)
+            if not self.stage_cache_config.enabled or not os.path.exists(manifest_file_path):
+                self.report[stage_name] = {"key": key, "status": "miss"}
+                logging.info(f"Stage cache miss for stage: {stage_name} with key: {key}")
+                return None
+
+            manifest = read_yaml_file(manifest_file_path)
+            for name, file_path in output_file_paths.items():
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                cached_file_path = os.path.join(entry_dir, manifest["files"][name])
+                if os.path.isdir(cached_file_path):
+                    shutil.rmtree(file_path, ignore_errors=True)
+                    shutil.copytree(cached_file_path, file_path)
+                else:
+                    shutil.copy2(cached_file_path, file_path)
+            os.utime(manifest_file_path)
+
+            self.report[stage_name] = {"key": key, "status": "hit"}
+            logging.info(f"Stage cache hit for stage: {stage_name} with key: {key}, reused outputs from: {entry_dir}")
+            return manifest["fields"]
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def add(self, stage_name: str, key: str, fields: dict, output_file_paths: Dict[str, str]) -> None:
+        """
+        This function registers the outputs of a stage that missed the cache. They are copied into the cache by
+        commit once the background artifact writes of the run have completed.
+        Output          :  None
+        on Failure      :  raise exception
+        """
+        try:
+            if self.stage_cache_config.enabled:
+                self._pending_entries.append((stage_name, key, fields, output_file_paths))
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def commit(self) -> None:
+        """
+        This function copies the registered stage outputs into the cache and evicts the least recently used
+        entries while the cache is larger than max_size_bytes.
+        Output          :  None
+        on Failure      :  raise exception
+        """
+        try:
+            while self._pending_entries:
+                stage_name, key, fields, output_file_paths = self._pending_entries.pop(0)
+                entry_dir = self._entry_dir(stage_name, key)
+                temp_entry_dir = f"{entry_dir}.tmp"
+                shutil.rmtree(temp_entry_dir, ignore_errors=True)
+                os.makedirs(temp_entry_dir)
+                files = {}
+                for name, file_path in output_file_paths.items():
+                    files[name] = name + os.path.splitext(file_path)[1]
+                    if os.path.isdir(file_path):
+                        shutil.copytree(file_path, os.path.join(temp_entry_dir, files[name]))
+                    else:
+                        shutil.copy2(file_path, os.path.join(temp_entry_dir, files[name]))
+                write_yaml_file(os.path.join(temp_entry_dir, MANIFEST_FILE_NAME),
+                                content={"stage": stage_name, "key": key, "fields": fields, "files": files,
+                                         "created_at": time.strftime("%Y-%m-%d %H:%M:%S")})
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.rename(temp_entry_dir, entry_dir)
+                logging.info(f"Stored outputs of stage: {stage_name} in stage cache at: {entry_dir}")
+            self.evict()
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def evict(self) -> None:
+        """
+        This function removes the least recently used cache entries until the cache fits in max_size_bytes.
+        Output          :  None
+        on Failure      :  raise exception
+        """
+        try:
+            cache_dir = self.stage_cache_config.stage_cache_dir
+            if not os.path.isdir(cache_dir):
+                return
+            entries = []
+            for stage_name in os.listdir(cache_dir):
+                for key in os.listdir(os.path.join(cache_dir, stage_name)):
+                    entry_dir = os.path.join(cache_dir, stage_name, key)
+                    manifest_file_path = os.path.join(entry_dir, MANIFEST_FILE_NAME)
+                    if not os.path.exists(manifest_file_path):
+                        continue
+                    size = sum(os.path.getsize(os.path.join(dir_path, file_name))
+                               for dir_path, _, file_names in os.walk(entry_dir) for file_name in file_names)
+                    entries.append((os.path.getmtime(manifest_file_path), size, entry_dir))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, entry_dir in sorted(entries):
+                if total_size <= self.stage_cache_config.max_size_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total_size -= size
+                logging.info(f"Evicted stage cache entry: {entry_dir}")
+        except Exception as e:
+            raise USVisaException(e, sys) from e
+
+    def write_report(self) -> dict:
+        """
+        This function writes the cache hits and misses of the current run.
+        Output          :  the report as a dictionary
+        on Failure      :  raise exception
+        """
+        try:
+            statuses = [stage["status"] for stage in self.report.values()]
+            report = {"stages": self.report, "hits": statuses.count("hit"), "misses": statuses.count("miss")}
+            write_yaml_file(self.stage_cache_config.report_file_path, content=report, replace=True)
+            logging.info(f"Stage cache hits: {report['hits']}, misses: {report['misses']}")
+            return report
+        except Exception as e:
+            raise USVisaException(e, sys) from e
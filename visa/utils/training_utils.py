@@ -0,0 +1,361 @@
+import importlib
+import os
+import resource
+import sys
+import time
+import traceback
+from typing import List, Optional
+
+import numpy as np
+from sklearn.metrics import f1_score, precision_score, recall_score
+from sklearn.utils.validation import has_fit_parameter
+
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.main_utils import get_mp_context, load_transformed_data, read_yaml_file, save_object, write_yaml_file
+
+
+WARM_START_STEPS = 10
+
+
+def get_model_candidates(model_config: dict, time_budget: float, early_stopping_rounds: int) -> List[dict]:
+    """
+    Reads the candidate models of the model_selection section of model.yaml. Every module_<i> entry names the class,
+    its module and constructor params, can override the default time_budget and early_stopping_rounds and can declare
+    the search_param_grid of the model tuner.
+
+    Args:
+        model_config (dict): The contents of model.yaml.
+        time_budget (float): Default training seconds of a candidate.
+        early_stopping_rounds (int): Default rounds without improvement of the validation loss before stopping.
+    Returns:
+        List[dict]: The candidates with name, class, module, params, time_budget, early_stopping_rounds and
+        search_param_grid.
+    Raises:
+        USVisaException: If the model config has no candidates.
+    """
+    try:
+        model_selection = (model_config or {}).get("model_selection") or {}
+        if not model_selection:
+            raise ValueError("model.yaml has no candidate models under model_selection")
+        candidates = []
+        for key, entry in model_selection.items():
+            candidates.append({
+                "name": entry.get("name", entry["class"]),
+                "class": entry["class"],
+                "module": entry["module"],
+                "params": dict(entry.get("params") or {}),
+                "time_budget": float(entry.get("time_budget", time_budget)),
+                "early_stopping_rounds": int(entry.get("early_stopping_rounds", early_stopping_rounds)),
+                "search_param_grid": dict(entry.get("search_param_grid") or {}),
+            })
+        names = [candidate["name"] for candidate in candidates]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Candidate model names are not unique: {names}, give duplicated classes a name")
+        return candidates
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def build_estimator(candidate: dict, n_threads: int):
+    """
+    Instantiates the estimator of a candidate. Unless the params set it, the estimator is limited to n_threads threads
+    through n_jobs or thread_count, so parallel candidates do not oversubscribe the CPUs.
+
+    Args:
+        candidate (dict): A candidate of get_model_candidates.
+        n_threads (int): Threads available to the candidate.
+    Returns:
+        The unfitted estimator.
+    """
+    estimator_class = getattr(importlib.import_module(candidate["module"]), candidate["class"])
+    estimator = estimator_class(**candidate["params"])
+    parameters = estimator.get_params()
+    for thread_parameter in ("n_jobs", "thread_count"):
+        if thread_parameter in parameters and thread_parameter not in candidate["params"]:
+            estimator.set_params(**{thread_parameter: n_threads})
+    return estimator
+
+
+def fit_estimator(estimator, features: np.ndarray, target: np.ndarray, validation_features: np.ndarray,
+                  validation_target: np.ndarray, time_budget: float, early_stopping_rounds: int,
+                  sample_weight: Optional[np.ndarray] = None) -> dict:
+    """
+    Fits an estimator within a time budget, with early stopping on the validation data where the learner supports it:
+    XGBoost and CatBoost stop on the validation loss and a callback that ends training once the budget is spent,
+    sklearn gradient boosting stops through n_iter_no_change and a fit monitor, and warm-startable ensembles such as
+    random forests are grown in WARM_START_STEPS steps until they are complete or out of time. Other estimators are
+    fitted in one call and only bounded by the hard limit of the worker process.
+
+    Args:
+        estimator: The unfitted estimator.
+        features (np.ndarray): The training features.
+        target (np.ndarray): The training labels.
+        validation_features (np.ndarray): The validation features of early stopping.
+        validation_target (np.ndarray): The validation labels of early stopping.
+        time_budget (float): Training seconds, 0 for no budget.
+        early_stopping_rounds (int): Rounds without improvement before stopping, 0 to disable early stopping.
+        sample_weight (Optional[np.ndarray], optional): Weights of the training rows. Defaults to None.
+    Returns:
+        dict: How the training stopped, "completed", "early_stopping" or "time_budget", and the number of
+        boosting rounds or trees fitted when the estimator has them.
+    """
+    start_time = time.perf_counter()
+    deadline = start_time + time_budget if time_budget else float("inf")
+    fit_params = {}
+    if sample_weight is not None and has_fit_parameter(estimator, "sample_weight"):
+        fit_params["sample_weight"] = sample_weight
+    module_name = type(estimator).__module__.split(".")[0]
+    parameters = estimator.get_params()
+    training = {"stopped_by": "completed"}
+
+    if module_name == "xgboost":
+        import xgboost
+
+        class TimeBudget(xgboost.callback.TrainingCallback):
+            def after_iteration(self, model, epoch, evals_log) -> bool:
+                return time.perf_counter() > deadline
+
+        estimator.set_params(callbacks=[TimeBudget()], early_stopping_rounds=early_stopping_rounds or None)
+        estimator.fit(features, target, eval_set=[(validation_features, validation_target)], verbose=False, **fit_params)
+        estimator.set_params(callbacks=None)
+        n_rounds = estimator.get_booster().num_boosted_rounds()
+        training["n_rounds"] = int(n_rounds)
+        if early_stopping_rounds and n_rounds < parameters.get("n_estimators") and estimator.best_iteration < n_rounds - 1:
+            training["stopped_by"] = "early_stopping"
+        if time.perf_counter() > deadline:
+            training["stopped_by"] = "time_budget"
+
+    elif module_name == "catboost":
+        class TimeBudget:
+            def after_iteration(self, info) -> bool:
+                return time.perf_counter() <= deadline
+
+        estimator.fit(features, target, eval_set=(validation_features, validation_target),
+                      early_stopping_rounds=early_stopping_rounds or None, callbacks=[TimeBudget()], **fit_params)
+        n_rounds = estimator.tree_count_
+        training["n_rounds"] = int(n_rounds)
+        if early_stopping_rounds and n_rounds < estimator.get_all_params()["iterations"]:
+            training["stopped_by"] = "early_stopping"
+        if time.perf_counter() > deadline:
+            training["stopped_by"] = "time_budget"
+
+    elif "n_iter_no_change" in parameters:
+        if early_stopping_rounds and parameters["n_iter_no_change"] is None:
+            estimator.set_params(n_iter_no_change=early_stopping_rounds)
+
+        def monitor(iteration, model, local_variables) -> bool:
+            return time.perf_counter() > deadline
+
+        if has_fit_parameter(estimator, "monitor"):
+            fit_params["monitor"] = monitor
+        estimator.fit(features, target, **fit_params)
+        if hasattr(estimator, "n_estimators_"):
+            training["n_rounds"] = int(estimator.n_estimators_)
+            if estimator.n_estimators_ < parameters["n_estimators"]:
+                training["stopped_by"] = "time_budget" if time.perf_counter() > deadline else "early_stopping"
+
+    elif "warm_start" in parameters and "n_estimators" in parameters:
+        n_estimators = parameters["n_estimators"]
+        steps = np.unique(np.linspace(0, n_estimators, WARM_START_STEPS + 1).astype(int)[1:])
+        estimator.set_params(warm_start=True)
+        for n_step_estimators in steps:
+            estimator.set_params(n_estimators=int(n_step_estimators))
+            estimator.fit(features, target, **fit_params)
+            if time.perf_counter() > deadline and n_step_estimators < n_estimators:
+                training["stopped_by"] = "time_budget"
+                break
+        estimator.set_params(warm_start=False)
+        training["n_rounds"] = int(len(estimator.estimators_))
+
+    else:
+        estimator.fit(features, target, **fit_params)
+        if time.perf_counter() > deadline:
+            training["stopped_by"] = "time_budget"
+
+    return training
+
+
+def get_sample_weight(target: np.ndarray, class_weight: Optional[dict]) -> Optional[np.ndarray]:
+    """
+    Returns the weight of every row from the weights of the classes, or None without class weights.
+
+    Args:
+        target (np.ndarray): The labels.
+        class_weight (Optional[dict]): Mapping of class label to weight.
+    Returns:
+        Optional[np.ndarray]: The row weights.
+    """
+    if not class_weight:
+        return None
+    weights = np.zeros(max(class_weight) + 1, dtype=np.float64)
+    for label, weight in class_weight.items():
+        weights[label] = weight
+    return weights[target]
+
+
+def get_classification_scores(target: np.ndarray, predicted: np.ndarray) -> dict:
+    """
+    Computes the f1, precision and recall scores of the positive class.
+
+    Args:
+        target (np.ndarray): The true labels.
+        predicted (np.ndarray): The predicted labels.
+    Returns:
+        dict: The f1_score, precision_score and recall_score.
+    """
+    return {"f1_score": float(f1_score(target, predicted, zero_division=0)),
+            "precision_score": float(precision_score(target, predicted, zero_division=0)),
+            "recall_score": float(recall_score(target, predicted, zero_division=0))}
+
+
+def get_process_cpu_seconds(pid: int) -> Optional[float]:
+    """
+    Returns the user and system CPU seconds a running process has used, read from /proc, or None where it is not
+    available.
+
+    Args:
+        pid (int): The process id.
+    Returns:
+        Optional[float]: The CPU seconds.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as stat_file:
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def train_candidate(candidate: dict, features_file_path: str, labels_file_path: str, validation_features_file_path: str,
+                    validation_labels_file_path: str, test_features_file_path: str, test_labels_file_path: str,
+                    model_file_path: str, result_file_path: str, n_threads: int, class_weight: Optional[dict] = None) -> None:
+    """
+    Worker process entry point: trains a candidate on the transformed training files, stopping early and scoring it on
+    the validation files, scores it on the testing files and writes the fitted model to model_file_path and its result
+    to result_file_path. The files are opened as read-only memory maps and passed whole, never indexed by rows, so all
+    workers share the page cache of one copy of the data instead of each holding a private copy.
+
+    Args:
+        candidate (dict): A candidate of get_model_candidates.
+        features_file_path (str): The transformed training features file.
+        labels_file_path (str): The transformed training labels file.
+        validation_features_file_path (str): The transformed validation features file, held out before resampling.
+        validation_labels_file_path (str): The transformed validation labels file.
+        test_features_file_path (str): The transformed testing features file.
+        test_labels_file_path (str): The transformed testing labels file.
+        model_file_path (str): Where the fitted model is saved.
+        result_file_path (str): Where the result yaml is written.
+        n_threads (int): Threads available to the candidate.
+        class_weight (Optional[dict], optional): Weights of the classes, as written by the resampling report.
+    """
+    start_time = time.perf_counter()
+    start_usage = resource.getrusage(resource.RUSAGE_SELF)
+    result = {"name": candidate["name"], "class": candidate["class"], "n_threads": n_threads,
+              "time_budget": candidate["time_budget"]}
+    try:
+        features, target = load_transformed_data(features_file_path, labels_file_path, mmap_mode="r")
+        validation_features, validation_target = load_transformed_data(validation_features_file_path,
+                                                                       validation_labels_file_path, mmap_mode="r")
+        target = np.asarray(target)
+        validation_target = np.asarray(validation_target)
+        sample_weight = get_sample_weight(target, class_weight)
+        estimator = build_estimator(candidate, n_threads=n_threads)
+        fit_start_time = time.perf_counter()
+        result.update(fit_estimator(estimator, features, target, validation_features, validation_target,
+                                    time_budget=candidate["time_budget"],
+                                    early_stopping_rounds=candidate["early_stopping_rounds"], sample_weight=sample_weight))
+        result["fit_seconds"] = time.perf_counter() - fit_start_time
+        result["validation"] = get_classification_scores(validation_target, estimator.predict(validation_features))
+        test_features, test_target = load_transformed_data(test_features_file_path, test_labels_file_path, mmap_mode="r")
+        result["test"] = get_classification_scores(np.asarray(test_target), estimator.predict(test_features))
+        save_object(model_file_path, estimator)
+        result["status"] = "completed"
+    except Exception:
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc(limit=5)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    result["cpu_seconds"] = usage.ru_utime + usage.ru_stime - start_usage.ru_utime - start_usage.ru_stime
+    result["wall_seconds"] = time.perf_counter() - start_time
+    result["cpu_utilization"] = result["cpu_seconds"] / max(result["wall_seconds"], 1e-9)
+    write_yaml_file(result_file_path, content=result, replace=True)
+
+
+def train_candidates_in_parallel(candidates: List[dict], features_file_path: str, labels_file_path: str,
+                                 validation_features_file_path: str, validation_labels_file_path: str,
+                                 test_features_file_path: str, test_labels_file_path: str, output_dir: str,
+                                 n_workers: int, class_weight: Optional[dict] = None,
+                                 hard_time_limit_factor: float = 1.5, mp_context: str = "forkserver") -> List[dict]:
+    """
+    Trains the candidates at the same time in up to n_workers worker processes, each given an equal share of the CPUs
+    as threads. A worker still running hard_time_limit_factor times its time budget after it started, such as an
+    estimator that cannot stop early, is killed and its candidate reported as "killed".
+
+    Args:
+        candidates (List[dict]): The candidates of get_model_candidates.
+        features_file_path (str): The transformed training features file.
+        labels_file_path (str): The transformed training labels file.
+        validation_features_file_path (str): The transformed validation features file.
+        validation_labels_file_path (str): The transformed validation labels file.
+        test_features_file_path (str): The transformed testing features file.
+        test_labels_file_path (str): The transformed testing labels file.
+        output_dir (str): Directory of the candidate models and results.
+        n_workers (int): Number of worker processes, -1 for one per CPU.
+        class_weight (Optional[dict], optional): Weights of the classes, as written by the resampling report.
+        hard_time_limit_factor (float, optional): Multiple of the time budget after which a worker is killed.
+        mp_context (str, optional): Start method of the worker processes. Defaults to "forkserver", which forks the
+            workers from a clean single-threaded server process rather than from the caller, whose BLAS, OpenMP and
+            logging threads may hold locks at the time of the fork; the arguments are file paths either way.
+    Returns:
+        List[dict]: The result of every candidate, in the order of candidates, with its model_file_path.
+    Raises:
+        USVisaException: If the workers cannot be started.
+    """
+    try:
+        n_cpus = os.cpu_count() or 1
+        n_workers = min(len(candidates), n_cpus if n_workers == -1 else n_workers)
+        n_threads = max(1, n_cpus // n_workers)
+        context = get_mp_context(mp_context, [__name__] + [candidate["module"] for candidate in candidates])
+        os.makedirs(output_dir, exist_ok=True)
+        pending = list(candidates)
+        running = {}
+        results = {}
+        while pending or running:
+            while pending and len(running) < n_workers:
+                candidate = pending.pop(0)
+                model_file_path = os.path.join(output_dir, f"{candidate['name']}.pkl")
+                result_file_path = os.path.join(output_dir, f"{candidate['name']}.yaml")
+                process = context.Process(target=train_candidate, name=f"model_trainer_{candidate['name']}",
+                                          args=(candidate, features_file_path, labels_file_path, validation_features_file_path,
+                                                validation_labels_file_path, test_features_file_path, test_labels_file_path,
+                                                model_file_path, result_file_path, n_threads, class_weight))
+                process.start()
+                running[candidate["name"]] = (process, time.perf_counter(), candidate, model_file_path, result_file_path)
+                logging.info(f"Started training {candidate['name']} with {n_threads} threads in process {process.pid}")
+            time.sleep(0.05)
+            for name, (process, start_time, candidate, model_file_path, result_file_path) in list(running.items()):
+                elapsed = time.perf_counter() - start_time
+                if process.is_alive() and candidate["time_budget"] and elapsed > candidate["time_budget"] * hard_time_limit_factor:
+                    cpu_seconds = get_process_cpu_seconds(process.pid)
+                    process.kill()
+                    process.join()
+                    results[name] = {"name": name, "class": candidate["class"], "status": "killed", "n_threads": n_threads,
+                                     "time_budget": candidate["time_budget"], "wall_seconds": elapsed, "cpu_seconds": cpu_seconds}
+                    logging.info(f"Killed training {name} after {elapsed:.1f}s, over its time budget of {candidate['time_budget']}s")
+                elif not process.is_alive():
+                    process.join()
+                    if os.path.exists(result_file_path):
+                        results[name] = read_yaml_file(result_file_path)
+                    else:
+                        results[name] = {"name": name, "class": candidate["class"], "status": "failed",
+                                         "error": f"worker exited with code {process.exitcode}", "wall_seconds": elapsed}
+                    logging.info(f"Finished training {name} with status {results[name]['status']} in {elapsed:.1f}s")
+                else:
+                    continue
+                results[name]["model_file_path"] = model_file_path
+                del running[name]
+        return [results[candidate["name"]] for candidate in candidates]
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
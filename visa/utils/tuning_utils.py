@@ -0,0 +1,328 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+from visa.exception import USVisaException
+from visa.logger import logging
+from visa.utils.main_utils import (get_mp_context, load_transformed_data, read_yaml_file, save_numpy_array_data,
+                                   write_yaml_file)
+from visa.utils.resampling_utils import resample
+from visa.utils.training_utils import build_estimator, fit_estimator, get_classification_scores, get_sample_weight
+
+
+FOLD_CACHE_MANIFEST_FILE_NAME = "folds.yaml"
+
+_trial_worker_state = {}
+
+
+def get_fold_cache(features_file_path: str, labels_file_path: str, cache_dir: str, n_folds: int,
+                   resampling_strategy: str = "none", resampling_n_jobs: Optional[int] = None,
+                   nn_algorithm: str = "kd_tree", working_memory: Optional[int] = None,
+                   random_state: int = 42) -> Dict[str, object]:
+    """
+    Returns the stratified CV folds of the transformed training data before resampling, written to disk once as
+    contiguous blocks. The training rows of every fold are resampled with the strategy of data transformation inside
+    the fold, so no synthetic row of a validation row leaks into its training rows, then shuffled, so the first n rows
+    of a block are a random subsample of n rows as used by the reduced resources of successive halving. Trials read
+    their rows as slices of memory maps of the blocks and never index the data by rows. The folds are keyed by a hash
+    of the data files and the split and resampling settings, so they are built once and reused by every trial and by
+    later searches over the same data.
+
+    Args:
+        features_file_path (str): The transformed training features file before resampling.
+        labels_file_path (str): The transformed training labels file before resampling.
+        cache_dir (str): Directory of the fold caches.
+        n_folds (int): Number of folds.
+        resampling_strategy (str, optional): Resampling strategy applied to the training rows of every fold.
+            Defaults to "none".
+        resampling_n_jobs (Optional[int], optional): Number of parallel jobs of the neighbour queries. Defaults to None.
+        nn_algorithm (str, optional): Algorithm of the exact neighbour searches. Defaults to "kd_tree".
+        working_memory (Optional[int], optional): Memory in MiB of each chunk of pairwise distances. Defaults to None.
+        random_state (int, optional): Seed of the split, the resampling and the shuffling. Defaults to 42.
+    Returns:
+        Dict[str, object]: The key of the folds, the fewest training rows of a fold and the paths of the training and
+        validation features and labels of every fold.
+    Raises:
+        USVisaException: If the folds cannot be computed or written.
+    """
+    try:
+        hasher = hashlib.sha256(f"{n_folds}|{random_state}|{resampling_strategy}|{nn_algorithm}".encode())
+        for file_path in (features_file_path, labels_file_path):
+            with open(file_path, "rb") as file_obj:
+                for block in iter(lambda: file_obj.read(1 << 20), b""):
+                    hasher.update(block)
+        key = hasher.hexdigest()[:16]
+        fold_dir = os.path.join(cache_dir, key)
+        manifest_file_path = os.path.join(fold_dir, FOLD_CACHE_MANIFEST_FILE_NAME)
+        if os.path.exists(manifest_file_path):
+            logging.info(f"Reusing the cached folds: {fold_dir}")
+            return get_fold_cache_from_manifest(fold_dir, key)
+
+        features, labels = load_transformed_data(features_file_path, labels_file_path, mmap_mode="r")
+        random_generator = np.random.default_rng(random_state)
+        temp_dir = f"{fold_dir}.tmp{os.getpid()}"
+        os.makedirs(temp_dir, exist_ok=True)
+        extension = ".npz" if sparse.issparse(features) else ".npy"
+        splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+        manifest = {"folds": []}
+        for i, (train_index, validation_index) in enumerate(splitter.split(np.zeros(len(labels)), labels)):
+            train_features, train_labels, _ = resample(resampling_strategy, features[train_index],
+                                                       np.asarray(labels[train_index]), n_jobs=resampling_n_jobs,
+                                                       nn_algorithm=nn_algorithm, working_memory=working_memory,
+                                                       random_state=random_state)
+            order = random_generator.permutation(len(train_labels))
+            fold = {"train": f"fold_{i}_train{extension}", "train_labels": f"fold_{i}_train_labels.npy",
+                    "validation": f"fold_{i}_validation{extension}", "validation_labels": f"fold_{i}_validation_labels.npy"}
+            for name, array in (("train", train_features[order]), ("train_labels", np.asarray(train_labels)[order]),
+                                ("validation", features[validation_index]), ("validation_labels", labels[validation_index])):
+                save_numpy_array_data(os.path.join(temp_dir, fold[name]), array=array)
+            manifest["folds"].append(dict(fold, n_train_rows=int(len(train_labels))))
+            logging.info(f"Cached fold {i}: {len(train_index)} training rows resampled with {resampling_strategy} to "
+                         f"{len(train_labels)}, {len(validation_index)} validation rows")
+        write_yaml_file(os.path.join(temp_dir, FOLD_CACHE_MANIFEST_FILE_NAME), content=manifest, replace=True)
+        if os.path.exists(fold_dir):
+            shutil.rmtree(temp_dir)
+        else:
+            os.replace(temp_dir, fold_dir)
+        logging.info(f"Cached {n_folds} folds of {len(labels)} rows: {fold_dir}")
+        return get_fold_cache_from_manifest(fold_dir, key)
+
+    except Exception as e:
+        raise USVisaException(e, sys) from e
+
+
+def get_fold_cache_from_manifest(fold_dir: str, key: str) -> Dict[str, object]:
+    """
+    Returns the fold cache of get_fold_cache from the manifest of its directory.
+    """
+    manifest = read_yaml_file(os.path.join(fold_dir, FOLD_CACHE_MANIFEST_FILE_NAME))
+    folds = [{name: os.path.join(fold_dir, fold[name]) for name in ("train", "train_labels", "validation", "validation_labels")}
+             for fold in manifest["folds"]]
+    return {"key": key, "folds": folds, "n_train_rows": min(fold["n_train_rows"] for fold in manifest["folds"])}
+
+
+def get_trial_key(candidate: dict, params: dict, resource: int, fold: int, fold_key: str) -> str:
+    """
+    Returns the checkpoint key of a trial, a hash of the estimator, its params, the resource, the fold and the folds.
+    """
+    trial = {"module": candidate["module"], "class": candidate["class"], "params": params, "resource": resource,
+             "fold": fold, "folds": fold_key, "early_stopping_rounds": candidate["early_stopping_rounds"]}
+    return hashlib.sha256(json.dumps(trial, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_checkpoint(checkpoint_file_path: str) -> Dict[str, dict]:
+    """
+    Reads the finished trials of a search checkpoint, one json line per trial. A line cut off by an interruption
+    is ignored.
+
+    Args:
+        checkpoint_file_path (str): The checkpoint file.
+    Returns:
+        Dict[str, dict]: Mapping of trial key to the trial result.
+    """
+    trials = {}
+    if os.path.exists(checkpoint_file_path):
+        with open(checkpoint_file_path) as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    trial = json.loads(line)
+                    trials[trial["key"]] = trial
+                except (json.JSONDecodeError, KeyError):
+                    continue
+    return trials
+
+
+def init_trial_worker(class_weight: Optional[dict]) -> None:
+    """
+    Initializer of the trial worker processes: keeps the class weights the trials are fitted with.
+    """
+    _trial_worker_state.update(class_weight=class_weight)
+
+
+def run_trial(trial: dict) -> dict:
+    """
+    Fits a configuration on the first resource rows of the training block of a fold and scores it on the validation
+    block of the fold. The blocks are opened as read-only memory maps and sliced, so the workers share the page cache
+    of the blocks and a trial only holds the copy of its rows the estimator makes for fitting. Sparse blocks are read
+    whole. Runs in a trial worker.
+
+    Args:
+        trial (dict): The candidate, params, resource, fold block files and key of the trial.
+    Returns:
+        dict: The trial with its f1 score and fit seconds.
+    """
+    start_time = time.perf_counter()
+    features, target = load_transformed_data(trial["train_file_path"], trial["train_labels_file_path"], mmap_mode="r")
+    validation_features, validation_target = load_transformed_data(trial["validation_file_path"],
+                                                                   trial["validation_labels_file_path"], mmap_mode="r")
+    train_target = np.asarray(target[:trial["resource"]])
+    validation_target = np.asarray(validation_target)
+    sample_weight = get_sample_weight(train_target, _trial_worker_state["class_weight"])
+    candidate = dict(trial["candidate"], params=dict(trial["candidate"]["params"], **trial["params"]))
+    estimator = build_estimator(candidate, n_threads=trial["n_threads"])
+    fit_estimator(estimator, features[:trial["resource"]], train_target, validation_features, validation_target,
+                  time_budget=0, early_stopping_rounds=candidate["early_stopping_rounds"], sample_weight=sample_weight)
+    score = get_classification_scores(validation_target, estimator.predict(validation_features))["f1_score"]
+    return {"key": trial["key"], "config": trial["config"], "resource": trial["resource"], "fold": trial["fold"],
+            "score": score, "seconds": time.perf_counter() - start_time}
+
+
+class SuccessiveHalvingSearch:
+    """
+    Successive halving and Hyperband search over the parameter grid of a candidate model. A bracket evaluates its
+    configurations with CV on a small subsample of the rows, keeps the best 1 / factor of them and repeats with
+    factor times the rows until the last configurations are evaluated on all rows. Hyperband runs several brackets
+    trading the number of configurations against their starting resources.
+    Every finished trial is appended to the checkpoint before the next one is awaited, and trials found in the
+    checkpoint are not run again, so an interrupted search resumes where it stopped.
+    """
+
+    def __init__(self, candidate: dict, param_grid: dict, fold_cache: dict, min_resources: int,
+                 factor: int, max_configurations: int, method: str, run_trials: Callable[[List[dict]], List[dict]],
+                 checkpoint_trials: Dict[str, dict], n_threads: int = 1, random_state: int = 42):
+        self.candidate = candidate
+        self.configurations = list(ParameterGrid(param_grid))
+        self.fold_cache = fold_cache
+        self.max_resources = fold_cache["n_train_rows"]
+        self.min_resources = min(min_resources, self.max_resources)
+        self.factor = factor
+        self.max_configurations = max_configurations
+        self.method = method
+        self.run_trials = run_trials
+        self.checkpoint_trials = checkpoint_trials
+        self.n_threads = n_threads
+        self.random_generator = np.random.default_rng(random_state)
+        self.n_trials = 0
+        self.n_resumed_trials = 0
+
+    def get_brackets(self) -> List[tuple]:
+        """
+        Returns the (number of configurations, starting resources) of the brackets of the search. The rung counts are
+        found with integer loops rather than float logarithms, and the starting resources are rounded up, so a bracket
+        of k halvings reaches max_resources on exactly its k-th increase.
+        """
+        if self.method == "successive_halving":
+            n_configurations = min(len(self.configurations), self.max_configurations)
+            n_halvings = 0
+            while self.factor ** n_halvings < n_configurations:
+                n_halvings += 1
+            return [(n_configurations, max(self.min_resources, -(-self.max_resources // self.factor ** n_halvings)))]
+        if self.method == "hyperband":
+            s_max = 0
+            while self.min_resources * self.factor ** (s_max + 1) <= self.max_resources:
+                s_max += 1
+            return [(min(len(self.configurations), math.ceil((s_max + 1) / (s + 1) * self.factor ** s)),
+                     -(-self.max_resources // self.factor ** s)) for s in range(s_max, -1, -1)]
+        raise ValueError(f"Search method: {self.method} is not one of successive_halving, hyperband")
+
+    def evaluate(self, config_ids: List[int], resource: int) -> Dict[int, float]:
+        """
+        Returns the mean CV score of the configurations at a resource, running the trials not in the checkpoint.
+        """
+        trials, scores = [], {config_id: [] for config_id in config_ids}
+        for config_id in config_ids:
+            for fold_index, fold in enumerate(self.fold_cache["folds"]):
+                key = get_trial_key(self.candidate, dict(self.candidate["params"], **self.configurations[config_id]),
+                                    resource, fold_index, self.fold_cache["key"])
+                if key in self.checkpoint_trials:
+                    scores[config_id].append(self.checkpoint_trials[key]["score"])
+                    self.n_resumed_trials += 1
+                    continue
+                trials.append({"key": key, "candidate": self.candidate, "params": self.configurations[config_id],
+                               "config": config_id, "resource": resource, "fold": fold_index, "n_threads": self.n_threads,
+                               "train_file_path": fold["train"], "train_labels_file_path": fold["train_labels"],
+                               "validation_file_path": fold["validation"],
+                               "validation_labels_file_path": fold["validation_labels"]})
+        for result in self.run_trials(trials):
+            scores[result["config"]].append(result["score"])
+            self.checkpoint_trials[result["key"]] = result
+        self.n_trials += len(trials)
+        return {config_id: float(np.mean(config_scores)) for config_id, config_scores in scores.items()}
+
+    def search(self) -> dict:
+        """
+        Runs the brackets and returns the best configuration on all rows with the rungs of every bracket.
+        """
+        best_params, best_score, brackets = None, -np.inf, []
+        for n_configurations, resource in self.get_brackets():
+            config_ids = sorted(self.random_generator.choice(len(self.configurations), size=n_configurations,
+                                                             replace=False).tolist())
+            rungs = []
+            while True:
+                scores = self.evaluate(config_ids, resource)
+                ranked = sorted(config_ids, key=lambda config_id: scores[config_id], reverse=True)
+                rungs.append({"resource": resource, "n_configurations": len(config_ids),
+                              "best_score": scores[ranked[0]], "best_params": dict(self.configurations[ranked[0]])})
+                if len(config_ids) == 1 or resource >= self.max_resources:
+                    break
+                config_ids = ranked[:max(1, math.ceil(len(config_ids) / self.factor))]
+                resource *= self.factor
+                if resource > self.max_resources:
+                    resource = self.max_resources
+            brackets.append({"rungs": rungs})
+            if rungs[-1]["best_score"] > best_score:
+                best_params, best_score = dict(self.configurations[ranked[0]]), rungs[-1]["best_score"]
+        return {"best_params": best_params, "best_score": best_score, "brackets": brackets,
+                "n_trials": self.n_trials, "n_resumed_trials": self.n_resumed_trials}
+
+
+class TrialRunner:
+    """
+    Runs trials in parallel in a pool of worker processes, appending every finished trial to the checkpoint file as it
+    completes. With one worker the trials run in the calling process.
+    """
+
+    def __init__(self, checkpoint_file_path: str, n_workers: int, class_weight: Optional[dict] = None,
+                 mp_context: str = "forkserver", preload_modules: Optional[List[str]] = None):
+        self.checkpoint_file_path = checkpoint_file_path
+        self.n_workers = (os.cpu_count() or 1) if n_workers == -1 else n_workers
+        self.initargs = (class_weight,)
+        self.mp_context = mp_context
+        self.preload_modules = [__name__] + list(preload_modules or [])
+        self.executor = None
+
+    def __enter__(self) -> "TrialRunner":
+        os.makedirs(os.path.dirname(self.checkpoint_file_path), exist_ok=True)
+        self.checkpoint_file = open(self.checkpoint_file_path, "a")
+        if self.n_workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=init_trial_worker,
+                                                initargs=self.initargs,
+                                                mp_context=get_mp_context(self.mp_context, self.preload_modules))
+        else:
+            init_trial_worker(*self.initargs)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        self.checkpoint_file.close()
+
+    def checkpoint(self, result: dict) -> None:
+        """
+        Appends a finished trial to the checkpoint file and syncs it to disk.
+        """
+        self.checkpoint_file.write(json.dumps(result) + "\n")
+        self.checkpoint_file.flush()
+        os.fsync(self.checkpoint_file.fileno())
+
+    def __call__(self, trials: List[dict]) -> List[dict]:
+        results = []
+        if self.executor is None:
+            for trial in trials:
+                results.append(run_trial(trial))
+                self.checkpoint(results[-1])
+            return results
+        for future in as_completed([self.executor.submit(run_trial, trial) for trial in trials]):
+            results.append(future.result())
+            self.checkpoint(results[-1])
+        return results